@@ -0,0 +1,139 @@
+"""
+Сравнение затрат процесса приложения на отдачу файлов в разных режимах FILE_DOWNLOAD_MODE
+
+Скрипт запускает uvicorn в отдельном процессе с минимальным приложением, которое
+отдает один и тот же файл через create_file_response (без аутентификации и базы
+данных), скачивает его указанное число раз и выводит время и процессорное время
+процесса приложения (по /proc/<pid>/stat) на каждый гигабайт отданных данных.
+В режимах x-accel-redirect и x-sendfile тело файла отдает прокси-сервер, поэтому
+приложение отправляет только заголовки. Режим starlette отдает файл исходным
+FileResponse и служит точкой отсчета для режима direct:
+
+    python -m benchmarks.bench_download_modes --size-mib 256 --requests 20 \
+        --modes starlette direct x-accel-redirect
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_FILE_ENV: str = "BENCH_DOWNLOAD_FILE"
+BENCH_MODE_ENV: str = "BENCH_DOWNLOAD_MODE"
+
+
+def create_app():
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import FileResponse
+    from starlette.routing import Route
+
+    from src.api.responses import create_file_response
+    from src.services.storage import local_storage_backend
+
+    file_path: str = os.environ[BENCH_FILE_ENV]
+    mode: str = os.environ[BENCH_MODE_ENV]
+
+    async def download(request: Request):
+        if mode == "starlette":
+            return FileResponse(path=file_path, filename=os.path.basename(file_path))
+        return create_file_response(
+            storage=local_storage_backend, key=file_path, filename=os.path.basename(file_path)
+        )
+
+    return Starlette(routes=[Route("/download", download)])
+
+
+def get_process_cpu_time(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as stat_file:
+        fields: list[str] = stat_file.read().rsplit(")", 1)[1].split()
+    user_ticks, system_ticks = int(fields[11]), int(fields[12])
+    return (user_ticks + system_ticks) / os.sysconf("SC_CLK_TCK")
+
+
+async def wait_until_ready(client: httpx.AsyncClient) -> None:
+    for _ in range(100):
+        try:
+            await client.head("/download")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Application did not start")
+
+
+async def measure(mode: str, file_path: str, args: argparse.Namespace) -> None:
+    env: dict[str, str] = {
+        **os.environ,
+        BENCH_FILE_ENV: file_path,
+        BENCH_MODE_ENV: mode,
+        "FILE_DOWNLOAD_MODE": "direct" if mode == "starlette" else mode,
+        "UPLOADS_DIR": os.path.dirname(file_path),
+    }
+    server: subprocess.Popen = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.bench_download_modes:create_app",
+            "--factory", "--port", str(args.port), "--log-level", "warning",
+        ],
+        env=env,
+    )
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None) as client:
+            await wait_until_ready(client)
+            cpu_started: float = get_process_cpu_time(server.pid)
+            started: float = time.perf_counter()
+            served_bytes: int = 0
+
+            async def download() -> None:
+                nonlocal served_bytes
+                async with client.stream("GET", "/download") as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_raw():
+                        served_bytes += len(chunk)
+
+            for start in range(0, args.requests, args.concurrency):
+                await asyncio.gather(*(
+                    download() for _ in range(min(args.concurrency, args.requests - start))
+                ))
+
+            elapsed: float = time.perf_counter() - started
+            cpu_time: float = get_process_cpu_time(server.pid) - cpu_started
+    finally:
+        server.terminate()
+        server.wait()
+
+    logical_gib: float = args.requests * os.path.getsize(file_path) / 1024 ** 3
+    print(f"{mode}:")
+    print(f"  requests:         {args.requests}")
+    print(f"  elapsed:          {elapsed:.2f} s")
+    print(f"  bytes via Python: {served_bytes / 1024 ** 2:.1f} MiB")
+    print(f"  app CPU time:     {cpu_time:.2f} s")
+    print(f"  app CPU per GiB:  {cpu_time / logical_gib:.3f} s")
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        file_path: str = os.path.join(directory, "bench.bin")
+        with open(file_path, "wb") as file:
+            for _ in range(args.size_mib):
+                file.write(os.urandom(1024 * 1024))
+
+        for mode in args.modes:
+            await measure(mode, file_path, args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mib", type=int, default=256)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--modes", nargs="+", default=["direct", "x-accel-redirect"],
+        choices=["starlette", "direct", "x-accel-redirect", "x-sendfile"],
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+"""
+Задержка event loop'а при операциях с файловой системой на медленном диске
+
+Скрипт подменяет os.stat, os.makedirs, os.mkdir и os.remove версиями, которые
+перед вызовом засыпают на --latency-ms миллисекунд (как медленная сетевая
+файловая система), и выполняет --operations операций (создание каталога,
+запись, проверка и удаление файла) с --concurrency параллельными задачами.
+Одновременно корутина-пульс раз в миллисекунду замеряет, насколько позже
+запланированного она просыпается: это время, на которое event loop был
+недоступен для остальных запросов. В режиме inline операции выполняются прямо
+в event loop'е, в режиме file-ops - через пул src.services.file_ops:
+
+    python -m benchmarks.bench_event_loop_lag --latency-ms 20 --operations 200 \
+        --modes inline file-ops
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from src.services import file_ops
+
+SLOW_FUNCTIONS: tuple[str, ...] = ("stat", "makedirs", "mkdir", "remove")
+PULSE_INTERVAL: float = 0.001
+
+
+@contextmanager
+def slow_filesystem(latency: float) -> Iterator[None]:
+    originals: dict[str, Callable] = {name: getattr(os, name) for name in SLOW_FUNCTIONS}
+
+    def make_slow(function: Callable) -> Callable:
+        def slow_function(*args, **kwargs):
+            time.sleep(latency)
+            return function(*args, **kwargs)
+        return slow_function
+
+    for name, function in originals.items():
+        setattr(os, name, make_slow(function))
+    try:
+        yield
+    finally:
+        for name, function in originals.items():
+            setattr(os, name, function)
+
+
+def write_file(file_path: str) -> None:
+    with open(file_path, "wb") as file:
+        file.write(b"benchmark")
+
+
+async def inline_operation(file_path: str) -> None:
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    write_file(file_path)
+    os.stat(file_path)
+    os.remove(file_path)
+    await asyncio.sleep(0)
+
+
+async def file_ops_operation(file_path: str) -> None:
+    await file_ops.make_dirs([os.path.dirname(file_path)])
+    await file_ops.run(write_file, file_path)
+    await file_ops.stat(file_path)
+    await file_ops.remove_if_exists(file_path)
+
+
+async def pulse(stopped: asyncio.Event) -> list[float]:
+    lags: list[float] = []
+    while not stopped.is_set():
+        started: float = time.perf_counter()
+        await asyncio.sleep(PULSE_INTERVAL)
+        lags.append(time.perf_counter() - started - PULSE_INTERVAL)
+    return lags
+
+
+async def measure(mode: str, directory: str, args: argparse.Namespace) -> None:
+    operation: Callable = inline_operation if mode == "inline" else file_ops_operation
+    queue: asyncio.Queue = asyncio.Queue()
+    for number in range(args.operations):
+        queue.put_nowait(os.path.join(directory, mode, str(number % 50), f"{number}.bin"))
+
+    async def worker() -> None:
+        while not queue.empty():
+            await operation(queue.get_nowait())
+
+    stopped: asyncio.Event = asyncio.Event()
+    pulse_task: asyncio.Task = asyncio.create_task(pulse(stopped))
+    await asyncio.sleep(PULSE_INTERVAL)
+
+    started: float = time.perf_counter()
+    with slow_filesystem(args.latency_ms / 1000):
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed: float = time.perf_counter() - started
+
+    stopped.set()
+    lags: list[float] = await pulse_task
+    p99_lag: float = statistics.quantiles(lags, n=100, method="inclusive")[98]
+
+    print(f"{mode}:")
+    print(f"  operations:    {args.operations}")
+    print(f"  elapsed:       {elapsed:.2f} s ({args.operations / elapsed:.1f} ops/s)")
+    print(f"  loop lag mean: {statistics.mean(lags) * 1000:.1f} ms")
+    print(f"  loop lag p99:  {p99_lag * 1000:.1f} ms")
+    print(f"  loop lag max:  {max(lags) * 1000:.1f} ms")
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.modes:
+            await measure(mode, directory, args)
+    file_ops.file_ops_executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--operations", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--modes", nargs="+", default=["inline", "file-ops"], choices=["inline", "file-ops"])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,47 @@
+"""
+Нагрузочный тест обработчика /api/file/file-info (запросов в секунду)
+
+Запускается против работающего экземпляра приложения, в котором уже существует
+пользователь с хотя бы одним файлом. Для сравнения "до/после" скрипт запускается
+на двух версиях приложения с одинаковыми параметрами:
+
+    python -m benchmarks.bench_file_info --base-url http://localhost:8000 \
+        --email user@example.com --password 'Some_password1234' \
+        --file-id <uuid> --requests 5000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+
+import httpx
+
+from benchmarks.common import login, print_report, run_load
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits: httpx.Limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits) as client:
+        headers: dict[str, str] = await login(client, args.email, args.password)
+
+        async def request() -> httpx.Response:
+            return await client.get(
+                "/api/file/file-info", params={"file_id": args.file_id}, headers=headers
+            )
+
+        await run_load(request, total_requests=args.warmup, concurrency=args.concurrency)
+        elapsed, latencies, errors = await run_load(
+            request, total_requests=args.requests, concurrency=args.concurrency
+        )
+        print_report("GET /api/file/file-info", elapsed, latencies, errors)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--file-id", required=True)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""
+Задержка обработчика /api/file/file-info во время массового входа пользователей
+
+Скрипт одновременно запускает поток запросов к /api/auth/login (bcrypt на сервере)
+и поток запросов к /api/file/file-info, после чего выводит p50/p99 задержек обоих
+потоков. Пока хеширование паролей выполнялось прямо в event loop'е, p99 file-info
+росла вместе с интенсивностью входа; при выносе хеширования в пул потоков она
+должна оставаться близкой к значению без нагрузки:
+
+    python -m benchmarks.bench_login_storm --base-url http://localhost:8000 \
+        --email user@example.com --password 'Some_password1234' \
+        --file-id <uuid> --logins 500 --login-concurrency 50
+"""
+
+import argparse
+import asyncio
+
+import httpx
+
+from benchmarks.common import login, print_report, run_load
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits: httpx.Limits = httpx.Limits(
+        max_connections=args.login_concurrency + args.concurrency
+    )
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        headers: dict[str, str] = await login(client, args.email, args.password)
+
+        async def login_request() -> httpx.Response:
+            return await client.post(
+                "/api/auth/login", data={"username": args.email, "password": args.password}
+            )
+
+        async def file_info_request() -> httpx.Response:
+            return await client.get(
+                "/api/file/file-info", params={"file_id": args.file_id}, headers=headers
+            )
+
+        baseline = await run_load(
+            file_info_request, total_requests=args.requests, concurrency=args.concurrency
+        )
+        print_report("GET /api/file/file-info (idle)", *baseline)
+
+        storm, under_storm = await asyncio.gather(
+            run_load(login_request, total_requests=args.logins, concurrency=args.login_concurrency),
+            run_load(file_info_request, total_requests=args.requests, concurrency=args.concurrency),
+        )
+        print_report("POST /api/auth/login (storm)", *storm)
+        print_report("GET /api/file/file-info (during storm)", *under_storm)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--file-id", required=True)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--login-concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
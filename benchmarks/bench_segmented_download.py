@@ -0,0 +1,105 @@
+"""
+Сравнение скорости загрузки файла одним потоком и параллельными частями
+
+Скрипт поднимает локальный HTTP-сервер с поддержкой запросов диапазонов,
+который искусственно ограничивает скорость каждого соединения (задержка после
+отправки каждого блока, как у источника с большим RTT), и загружает с него один
+и тот же файл загрузчиком воркера с разным количеством частей:
+
+    python -m benchmarks.bench_segmented_download --size-mib 32 --segments 1 4 8
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.services.downloader import Downloader
+
+BLOCK_SIZE: int = 64 * 1024
+
+
+def create_server(content: bytes, latency: float) -> ThreadingHTTPServer:
+    class RangeRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_HEAD(self) -> None:
+            self._send_headers(200, 0, len(content) - 1)
+
+        def do_GET(self) -> None:
+            start, end = 0, len(content) - 1
+            status: int = 200
+            range_header: str = self.headers.get("Range", "")
+            if range_header.startswith("bytes="):
+                first, last = range_header.removeprefix("bytes=").split("-")
+                start, end = int(first), int(last) if last else len(content) - 1
+                status = 206
+
+            self._send_headers(status, start, end)
+            for offset in range(start, end + 1, BLOCK_SIZE):
+                self.wfile.write(content[offset:min(offset + BLOCK_SIZE, end + 1)])
+                time.sleep(latency)
+
+        def _send_headers(self, status: int, start: int, end: int) -> None:
+            self.send_response(status)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("ETag", '"benchmark"')
+            self.send_header("Content-Length", str(end - start + 1))
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(content)}")
+            self.end_headers()
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+
+
+async def measure(url: str, file_path: str, segments: int, size: int) -> float:
+    downloader: Downloader = Downloader(
+        max_concurrency=1,
+        chunk_size=BLOCK_SIZE,
+        segments=segments,
+        segment_threshold=1,
+    )
+    try:
+        started: float = time.perf_counter()
+        state = await downloader.download(file_url=url, file_path=file_path)
+        elapsed: float = time.perf_counter() - started
+    finally:
+        await downloader.close()
+
+    assert state.downloaded_bytes == size
+    return elapsed
+
+
+async def main(args: argparse.Namespace) -> None:
+    size: int = args.size_mib * 1024 * 1024
+    server: ThreadingHTTPServer = create_server(os.urandom(size), args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url: str = f"http://127.0.0.1:{server.server_address[1]}/file.bin"
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            for segments in args.segments:
+                elapsed: float = await measure(
+                    url, os.path.join(directory, f"{segments}.bin"), segments, size
+                )
+                print(
+                    f"segments={segments:<3} {elapsed:6.2f} s  "
+                    f"{args.size_mib / elapsed:8.2f} MiB/s"
+                )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mib", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="задержка после каждого блока в 64 KiB, секунд")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 4, 8])
+    asyncio.run(main(parser.parse_args()))
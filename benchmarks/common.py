@@ -0,0 +1,63 @@
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable
+
+import httpx
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> dict[str, str]:
+    response: httpx.Response = await client.post(
+        "/api/auth/login", data={"username": email, "password": password}
+    )
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run_load(
+        request: Callable[[], Awaitable[httpx.Response]],
+        total_requests: int,
+        concurrency: int,
+) -> tuple[float, list[float], int]:
+    """
+    Выполняет total_requests запросов с указанной степенью параллелизма и
+    возвращает общее время, список задержек (в секундах) и число ошибок
+    """
+
+    latencies: list[float] = []
+    errors: int = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total_requests):
+        queue.put_nowait(None)
+
+    async def worker() -> None:
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            started: float = time.perf_counter()
+            try:
+                response: httpx.Response = await request()
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started: float = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, errors
+
+
+def percentile(values: list[float], percent: float) -> float:
+    ordered: list[float] = sorted(values)
+    index: int = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def print_report(title: str, elapsed: float, latencies: list[float], errors: int) -> None:
+    print(f"{title}:")
+    print(f"  requests:    {len(latencies)} ({errors} errors)")
+    print(f"  elapsed:     {elapsed:.2f} s")
+    print(f"  throughput:  {len(latencies) / elapsed:.1f} req/s")
+    print(f"  latency p50: {statistics.median(latencies) * 1000:.1f} ms")
+    print(f"  latency p99: {percentile(latencies, 99) * 1000:.1f} ms")
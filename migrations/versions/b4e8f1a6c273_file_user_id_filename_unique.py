@@ -0,0 +1,38 @@
+"""file user_id filename unique
+
+Revision ID: b4e8f1a6c273
+Revises: a7c3e9d1b254
+Create Date: 2026-10-17 15:03:17.204816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e8f1a6c273'
+down_revision: Union[str, None] = 'a7c3e9d1b254'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_file_user_id_filename',
+            'file',
+            ['user_id', 'filename'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'uq_file_user_id_filename',
+            table_name='file',
+            postgresql_concurrently=True,
+        )
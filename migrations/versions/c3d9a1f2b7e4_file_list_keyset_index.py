@@ -0,0 +1,38 @@
+"""file list keyset index
+
+Revision ID: c3d9a1f2b7e4
+Revises: 45065dea4bf9
+Create Date: 2026-10-17 10:12:41.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d9a1f2b7e4'
+down_revision: Union[str, None] = '45065dea4bf9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_file_user_id_uploaded_at_file_id',
+            'file',
+            ['user_id', 'uploaded_at', 'file_id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_file_user_id_uploaded_at_file_id',
+            table_name='file',
+            postgresql_concurrently=True,
+        )
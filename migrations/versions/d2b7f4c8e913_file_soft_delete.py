@@ -0,0 +1,69 @@
+"""file soft delete
+
+Revision ID: d2b7f4c8e913
+Revises: c8f2e5a9d416
+Create Date: 2026-10-17 17:48:12.640295
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7f4c8e913'
+down_revision: Union[str, None] = 'c8f2e5a9d416'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('file', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_file_deleted_at',
+            'file',
+            ['deleted_at'],
+            postgresql_where=sa.text('deleted_at IS NOT NULL'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'uq_file_user_id_filename_active',
+            'file',
+            ['user_id', 'filename'],
+            unique=True,
+            postgresql_where=sa.text('deleted_at IS NULL'),
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'uq_file_user_id_filename',
+            table_name='file',
+            postgresql_concurrently=True,
+        )
+    op.execute('ALTER INDEX uq_file_user_id_filename_active RENAME TO uq_file_user_id_filename')
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM file WHERE deleted_at IS NOT NULL")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_file_user_id_filename_all',
+            'file',
+            ['user_id', 'filename'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'uq_file_user_id_filename',
+            table_name='file',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_file_deleted_at',
+            table_name='file',
+            postgresql_concurrently=True,
+        )
+    op.execute('ALTER INDEX uq_file_user_id_filename_all RENAME TO uq_file_user_id_filename')
+    op.drop_column('file', 'deleted_at')
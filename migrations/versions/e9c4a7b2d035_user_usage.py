@@ -0,0 +1,42 @@
+"""user usage
+
+Revision ID: e9c4a7b2d035
+Revises: d2b7f4c8e913
+Create Date: 2026-10-17 19:05:41.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e9c4a7b2d035'
+down_revision: Union[str, None] = 'd2b7f4c8e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'user_usage',
+        sa.Column('user_id', sa.Uuid(), nullable=False),
+        sa.Column('file_count', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('total_bytes', sa.BigInteger(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.user_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.execute(
+        """
+        INSERT INTO user_usage (user_id, file_count, total_bytes)
+        SELECT user_id, count(*), coalesce(sum(size), 0)
+        FROM file
+        WHERE status = 'completed' AND deleted_at IS NULL
+        GROUP BY user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_usage')
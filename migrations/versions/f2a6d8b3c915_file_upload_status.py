@@ -0,0 +1,28 @@
+"""file upload status
+
+Revision ID: f2a6d8b3c915
+Revises: e5b7c2d4f108
+Create Date: 2026-10-17 13:05:12.418276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a6d8b3c915'
+down_revision: Union[str, None] = 'e5b7c2d4f108'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Уже существующие файлы считаются загруженными, новые создаются в статусе pending
+    op.add_column('file', sa.Column('status', sa.String(length=16), server_default='completed', nullable=False))
+    op.alter_column('file', 'status', server_default='pending')
+
+
+def downgrade() -> None:
+    op.drop_column('file', 'status')
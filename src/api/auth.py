@@ -23,6 +23,9 @@ async def register(
     В случае, если пользователь с таким номером, username или почтой уже существует, возникает
     исключение с кодом 409
 
+    В случае, если сервер перегружен запросами на регистрацию и вход, возникает
+    исключение с кодом 503
+
     В противном случае происходит регистрация пользователя
     """
 
@@ -54,6 +57,9 @@ async def login(
 
     В случае, если пользователь ввел неверные данные, возникает исключение с кодом 401
 
+    В случае, если сервер перегружен запросами на регистрацию и вход, возникает
+    исключение с кодом 503
+
     В противном случае обработчик возвращает access token, который необходимо будет передавать с последующими запросами
     в заголовке вида Authorization: Bearer "значение токена", и refresh token, необходимый для обновления имеющего
     относительно короткий срок службы access token'а через обработчик refresh_token
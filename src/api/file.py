@@ -1,14 +1,40 @@
 from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from sqlalchemy.exc import IntegrityError
-from starlette.responses import JSONResponse, FileResponse
+from starlette.requests import ClientDisconnect
+from starlette.responses import JSONResponse, StreamingResponse
 
+from src.api.responses import create_file_response, get_content_disposition
 from src.database.models import User, File
 from src.dependencies import get_file_service, get_current_user
-from src.schemas.schemas import UploadFileSchema, FileInfoSchema, BasicFileInfoSchema
-from src.services.services import FileService
+from src.schemas.schemas import (
+    UploadFileSchema,
+    CreateUploadSessionSchema,
+    BatchUploadFileSchema,
+    BatchUploadResultSchema,
+    BatchDeleteFileSchema,
+    BatchDeleteResultSchema,
+    FileInfoSchema,
+    FileListSchema,
+    FileStatusSchema,
+    StorageUsageSchema,
+    SignedDownloadUrlSchema,
+)
+from src.services import security
+from src.services.blob_store import BlobStore
+from src.services.security import InvalidDownloadTokenError
+from src.services.services import FileService, FileNotReadyError
+from src.services.storage import StorageBackend, local_storage_backend
+from src.services.upload_sessions import (
+    UploadOffsetMismatchError,
+    UploadSession,
+    UploadSessionLockedError,
+    UploadSessionNotFoundError,
+)
+from src.services.zip_stream import ZipEntry, stream_zip
+from src.settings import project_settings
 
 file_router: APIRouter = APIRouter(
     prefix="/file",
@@ -30,6 +56,9 @@ async def upload_file(
 
     В случае, если данный пользователь уже имеет файл с таким названием, возникает
     исключение с кодом 409
+
+    В случае, если загрузка превысит квоту пользователя, возникает исключение
+    с кодом 413
     """
 
     try:
@@ -45,12 +74,272 @@ async def upload_file(
         )
 
 
+@file_router.put("/upload-stream")
+async def upload_file_stream(
+    filename: str,
+    request: Request,
+    user: User = Depends(get_current_user),
+    service: FileService = Depends(get_file_service)
+) -> JSONResponse:
+    """
+    Обработчик, позволяющий загрузить файл на сервер напрямую: содержимое файла
+    передается в теле запроса как есть (без multipart) и записывается на диск
+    по мере получения, поэтому размер файла не ограничен объемом памяти
+
+    На вход подается название файла (без пути), под которым файл будет сохранен
+
+    В случае, если данный пользователь уже имеет файл с таким названием, возникает
+    исключение с кодом 409
+
+    В случае, если название файла некорректно или передача была прервана,
+    возникает исключение с кодом 400
+
+    В случае, если загрузка превысит квоту пользователя, возникает исключение
+    с кодом 413
+    """
+
+    content_length: str = request.headers.get("Content-Length", "")
+    try:
+        file_id, size = await service.upload_file_stream(
+            user=user,
+            filename=filename,
+            stream=request.stream(),
+            total_bytes=int(content_length) if content_length.isdigit() else None,
+        )
+        return JSONResponse(
+            status_code=status.HTTP_201_CREATED,
+            content={"message": "File uploaded", "file_id": str(file_id), "size": size}
+        )
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This file is already uploaded"
+        )
+    except ClientDisconnect:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload was interrupted"
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+
+
+upload_session_not_found_exception: HTTPException = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="Upload session does not exist or has expired"
+)
+
+upload_session_locked_exception: HTTPException = HTTPException(
+    status_code=status.HTTP_423_LOCKED,
+    detail="Upload session is being written or finalized by another request"
+)
+
+
+def _get_offset_mismatch_exception(exc: UploadOffsetMismatchError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=str(exc),
+        headers={"Upload-Offset": str(exc.offset)}
+    )
+
+
+@file_router.post("/uploads", status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    body: CreateUploadSessionSchema,
+    request: Request,
+    user: User = Depends(get_current_user),
+    service: FileService = Depends(get_file_service)
+) -> JSONResponse:
+    """
+    Обработчик, создающий сессию загрузки файла по частям
+
+    На вход подается название файла (без пути) и его размер в байтах. Части
+    файла передаются запросами PATCH /uploads/{file_id}, текущее смещение можно
+    узнать запросом HEAD /uploads/{file_id}, после передачи всех частей загрузку
+    необходимо завершить запросом POST /uploads/{file_id}/finalize
+
+    Сессия, в которую не передавались данные дольше UPLOAD_SESSION_TTL_SECONDS,
+    удаляется вместе с загруженными частями
+
+    В случае, если данный пользователь уже имеет файл с таким названием, возникает
+    исключение с кодом 409
+
+    В случае, если загрузка превысит квоту пользователя, возникает исключение
+    с кодом 413
+    """
+
+    try:
+        file_id: UUID = await service.create_upload_session(
+            user=user, filename=body.filename, size=body.size
+        )
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This file is already uploaded"
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+
+    return JSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content={"file_id": str(file_id), "offset": 0},
+        headers={
+            "Location": str(request.url_for("get_upload_offset", file_id=str(file_id))),
+            "Upload-Offset": "0",
+        }
+    )
+
+
+@file_router.head("/uploads/{file_id}")
+async def get_upload_offset(
+    file_id: UUID,
+    user: User = Depends(get_current_user),
+    service: FileService = Depends(get_file_service)
+) -> Response:
+    """
+    Обработчик, возвращающий в заголовках Upload-Offset и Upload-Length текущее
+    смещение и полный размер загружаемого по частям файла
+
+    В случае, если сессии загрузки не существует, возникает исключение с кодом 404
+    """
+
+    try:
+        session: UploadSession = await service.get_upload_session(file_id=file_id, user=user)
+    except UploadSessionNotFoundError:
+        raise upload_session_not_found_exception
+
+    return Response(
+        status_code=status.HTTP_200_OK,
+        headers={
+            "Upload-Offset": str(session.offset),
+            "Upload-Length": str(session.size),
+            "Cache-Control": "no-store",
+        }
+    )
+
+
+@file_router.patch("/uploads/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_chunk(
+    file_id: UUID,
+    request: Request,
+    upload_offset: int = Header(alias="Upload-Offset", ge=0),
+    user: User = Depends(get_current_user),
+    service: FileService = Depends(get_file_service)
+) -> Response:
+    """
+    Обработчик, записывающий часть файла, переданную в теле запроса, начиная
+    со смещения из заголовка Upload-Offset. Новое смещение возвращается
+    в заголовке Upload-Offset
+
+    В случае, если смещение не совпадает с текущим, возникает исключение
+    с кодом 409, а текущее смещение передается в заголовке Upload-Offset
+
+    В случае, если часть выходит за пределы объявленного размера файла,
+    возникает исключение с кодом 400
+
+    В случае, если в это время в сессию записывается другая часть, возникает
+    исключение с кодом 423
+    """
+
+    try:
+        offset: int = await service.write_upload_chunk(
+            file_id=file_id, user=user, offset=upload_offset, stream=request.stream()
+        )
+    except UploadSessionNotFoundError:
+        raise upload_session_not_found_exception
+    except UploadOffsetMismatchError as exc:
+        raise _get_offset_mismatch_exception(exc)
+    except UploadSessionLockedError:
+        raise upload_session_locked_exception
+    except ClientDisconnect:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload was interrupted"
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset)})
+
+
+@file_router.post("/uploads/{file_id}/finalize")
+async def finalize_upload(
+    file_id: UUID,
+    user: User = Depends(get_current_user),
+    service: FileService = Depends(get_file_service)
+) -> JSONResponse:
+    """
+    Обработчик, завершающий загрузку файла по частям
+
+    В случае, если переданы еще не все части файла, возникает исключение
+    с кодом 409, а текущее смещение передается в заголовке Upload-Offset
+
+    В случае, если загрузка уже завершается другим запросом или в нее
+    записывается часть файла, возникает исключение с кодом 423
+    """
+
+    try:
+        size: int = await service.finalize_upload(file_id=file_id, user=user)
+    except UploadSessionNotFoundError:
+        raise upload_session_not_found_exception
+    except UploadOffsetMismatchError as exc:
+        raise _get_offset_mismatch_exception(exc)
+    except UploadSessionLockedError:
+        raise upload_session_locked_exception
+
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"message": "File uploaded", "file_id": str(file_id), "size": size}
+    )
+
+
+@file_router.post("/upload-batch", response_model=BatchUploadResultSchema)
+async def upload_files(
+    body: BatchUploadFileSchema,
+    user: User = Depends(get_current_user),
+    service: FileService = Depends(get_file_service)
+) -> BatchUploadResultSchema:
+    """
+    Обработчик, отвечающий за загрузку пакета файлов в фоновом режиме.
+
+    На вход подается список url (не более FILE_BATCH_UPLOAD_MAX_SIZE), с которых
+    на сервер будет производиться скачивание файлов
+
+    Файлы, которые уже загружены пользователем (или повторяются в пакете), не
+    прерывают загрузку остальных: для них в ответе возвращается ошибка, для
+    остальных файлов - их id
+
+    В случае, если файлы пакета превысят квоту пользователя, возникает исключение
+    с кодом 413
+    """
+
+    files: list[dict] = await service.upload_files(
+        user=user, file_urls=[str(file_url) for file_url in body.file_urls]
+    )
+    started: int = sum(1 for file in files if file.get("file_id") is not None)
+
+    return BatchUploadResultSchema(
+        started=started,
+        conflicts=len(files) - started,
+        files=files,
+    )
+
+
 @file_router.get("/download")
 async def download_file(
         file_id: UUID,
         user: User = Depends(get_current_user),
         service: FileService = Depends(get_file_service)
-) -> FileResponse:
+) -> Response:
     """
     Обработчик, отвечающий за скачивание пользователем файлов, которые были
     загружены им на сервер
@@ -59,42 +348,202 @@ async def download_file(
 
     В случае, если файла с таким id у пользователя нет, возникает исключение с кодом 404
 
-    В противном случае файл возвращается пользователю в качестве ответа
+    В случае, если загрузка файла на сервер еще не завершена или завершилась
+    ошибкой, возникает исключение с кодом 409
+
+    В противном случае файл возвращается пользователю в качестве ответа. Поддерживаются
+    запросы диапазонов (Range, If-Range) с ответами 206 и 416 и условные запросы
+    (If-None-Match, If-Modified-Since) с ответом 304
+
+    Небольшие часто скачиваемые файлы отдаются из кеша в памяти процесса
+
+    Если FILE_DOWNLOAD_MODE равен x-accel-redirect или x-sendfile, ответ содержит
+    только заголовки, а сам файл отправляет прокси-сервер
     """
 
     try:
-        file_path, filename = await service.download_file(file_id=file_id, user=user)
-        return FileResponse(
-            path=file_path,
-            filename=filename
+        storage, key, filename, content_hash = await service.download_file(file_id=file_id, user=user)
+        return create_file_response(
+            storage=storage,
+            key=key,
+            filename=filename,
+            content_hash=content_hash,
+            cache_key=str(file_id)
+        )
+    except FileNotReadyError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc)
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(exc)
+        )
+
+
+@file_router.post("/download-url", response_model=SignedDownloadUrlSchema)
+async def create_download_url(
+        file_id: UUID,
+        request: Request,
+        expires_in: int = Query(
+            default=project_settings.SIGNED_DOWNLOAD_URL_TTL_SECONDS,
+            ge=1,
+            le=project_settings.SIGNED_DOWNLOAD_URL_MAX_TTL_SECONDS
+        ),
+        user: User = Depends(get_current_user),
+        service: FileService = Depends(get_file_service)
+) -> SignedDownloadUrlSchema:
+    """
+    Обработчик, создающий подписанную ссылку на скачивание файла, действующую
+    expires_in секунд. По ссылке файл может скачать кто угодно без аутентификации,
+    а сервер проверяет только подпись, не обращаясь к базе данных, поэтому
+    ссылку можно раздавать через CDN
+
+    Ссылка продолжает действовать до истечения срока, даже если файл был удален,
+    пока его содержимое остается на сервере
+
+    В случае, если файла с таким id у пользователя нет, возникает исключение с кодом 404
+
+    В случае, если загрузка файла на сервер еще не завершена или завершилась
+    ошибкой, возникает исключение с кодом 409
+    """
+
+    try:
+        token, expires_at = await service.create_download_token(
+            file_id=file_id, user=user, expires_in=expires_in
+        )
+    except FileNotReadyError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(exc)
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(exc)
+        )
+
+    return SignedDownloadUrlSchema(
+        url=str(request.url_for("download_signed_file").include_query_params(token=token)),
+        expires_at=expires_at,
+    )
+
+
+@file_router.get("/signed-download")
+async def download_signed_file(token: str) -> Response:
+    """
+    Обработчик, отдающий файл по подписанной ссылке, созданной /file/download-url.
+    Аутентификация и обращения к базе данных не выполняются
+
+    В случае, если подпись неверна или срок действия ссылки истек, возникает
+    исключение с кодом 403
+
+    В случае, если файл отсутствует на сервере, возникает исключение с кодом 404
+    """
+
+    try:
+        file: dict = security.verify_download_token(token=token)
+    except (InvalidDownloadTokenError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired download link"
+        )
+
+    storage: StorageBackend = (
+        BlobStore.get_storage(volume=file["volume"])
+        if file["content_hash"] is not None else local_storage_backend
+    )
+    if await storage.stat(key=file["storage_key"]) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found on server"
         )
+
+    return create_file_response(
+        storage=storage,
+        key=file["storage_key"],
+        filename=file["filename"],
+        content_hash=file["content_hash"],
+        cache_key=file["file_id"]
+    )
+
+
+@file_router.get("/download-archive")
+async def download_archive(
+        file_id: Optional[list[UUID]] = Query(default=None),
+        user: User = Depends(get_current_user),
+        service: FileService = Depends(get_file_service)
+) -> StreamingResponse:
+    """
+    Обработчик, позволяющий скачать несколько файлов одним ZIP-архивом
+
+    На вход подаются id файлов (параметр file_id можно повторять). Если они не
+    переданы, в архив попадают все загруженные файлы пользователя
+
+    Архив формируется по мере отправки и не сохраняется на сервере, поэтому
+    его размер заранее неизвестен и не ограничен (используется формат ZIP64).
+    Файлы добавляются без сжатия
+
+    В случае, если у пользователя нет ни одного из указанных загруженных файлов
+    (или хотя бы один из них отсутствует на сервере), возникает исключение с кодом 404
+    """
+
+    try:
+        entries: list[ZipEntry] = await service.get_archive_entries(user=user, file_ids=file_id)
     except ValueError as exc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(exc)
         )
 
+    return StreamingResponse(
+        stream_zip(entries=entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": get_content_disposition("files.zip")},
+    )
 
-@file_router.get("/list-of-files", response_model=list[BasicFileInfoSchema])
+
+@file_router.get("/list-of-files", response_model=FileListSchema)
 async def get_list_of_files(
+    limit: int = Query(
+        default=project_settings.FILE_LIST_PAGE_SIZE,
+        ge=1,
+        le=project_settings.FILE_LIST_MAX_PAGE_SIZE
+    ),
+    cursor: Optional[str] = None,
     user: User = Depends(get_current_user),
     service: FileService = Depends(get_file_service)
-) -> list[BasicFileInfoSchema]:
+) -> FileListSchema:
     """
-    Обработчик, позволяющий получить список всех файлов, загруженных на сервер текущим пользователем
+    Обработчик, позволяющий получить список файлов, загруженных на сервер текущим пользователем
+
+    Файлы возвращаются постранично в порядке загрузки: не более limit файлов за запрос.
+    Если файлов больше, в ответе передается next_cursor, который необходимо передать
+    в параметре cursor для получения следующей страницы
 
     В случае, если у пользователя нет ни одного скачанного файла, возникает исключение с кодом 404
+
+    В случае, если передан некорректный cursor, возникает исключение с кодом 400
     """
 
-    files: list[File] = await service.get_list_of_files(user=user)
+    try:
+        files, next_cursor = await service.get_list_of_files(
+            user=user, limit=limit, cursor=cursor
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
 
-    if not files:
+    if not files and cursor is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="This user has not uploaded any files yet"
         )
 
-    return files
+    return FileListSchema(files=files, next_cursor=next_cursor)
 
 
 @file_router.get("/file-info", response_model=FileInfoSchema)
@@ -120,6 +569,54 @@ async def get_file_info(
     return file
 
 
+@file_router.get("/usage", response_model=StorageUsageSchema)
+async def get_storage_usage(
+        user: User = Depends(get_current_user),
+        service: FileService = Depends(get_file_service)
+) -> StorageUsageSchema:
+    """
+    Обработчик, позволяющий получить количество и суммарный размер (в байтах)
+    загруженных файлов пользователя, а также его квоты (если они заданы)
+
+    Значения читаются из счетчиков, которые обновляются при загрузке и
+    удалении файлов, поэтому время ответа не зависит от количества файлов
+    """
+
+    file_count, total_bytes = await service.get_usage(user=user)
+    return StorageUsageSchema(
+        file_count=file_count,
+        total_bytes=total_bytes,
+        quota_bytes=project_settings.USER_STORAGE_QUOTA_BYTES or None,
+        file_count_quota=project_settings.USER_FILE_COUNT_QUOTA or None,
+    )
+
+
+@file_router.get("/status", response_model=FileStatusSchema)
+async def get_file_status(
+        file_id: UUID,
+        user: User = Depends(get_current_user),
+        service: FileService = Depends(get_file_service)
+) -> FileStatusSchema:
+    """
+    Обработчик, позволяющий получить статус загрузки файла на сервер
+    (pending, downloading, completed или failed), количество полученных байт,
+    ожидаемый размер файла (если он известен) и текущую скорость загрузки (байт/с)
+
+    Прогресс читается из Redis, поэтому обработчик можно часто опрашивать
+
+    В случае, если файла с таким id у пользователя нет, возникает исключение с кодом 404
+    """
+
+    file_status: Optional[dict] = await service.get_file_status(file_id=file_id, user=user)
+
+    if file_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File with this id does not exist or does not belong to the current user"
+        )
+    return FileStatusSchema(**file_status)
+
+
 @file_router.delete("/delete")
 async def delete_file(
         file_id: UUID,
@@ -127,7 +624,8 @@ async def delete_file(
         service: FileService = Depends(get_file_service)
 ) -> JSONResponse:
     """
-    Обработчик, позволяющий пользователю удалить файл с указанным id
+    Обработчик, позволяющий пользователю удалить файл с указанным id. Файл сразу
+    перестает быть доступен, а его содержимое удаляется с диска в фоновом режиме
 
     В случае, если файла с таким id у пользователя нет, возникает исключение с кодом 404
     """
@@ -144,3 +642,26 @@ async def delete_file(
             detail="File with this id does not exist or does not belong to the current user"
         )
 
+
+@file_router.post("/delete-batch", response_model=BatchDeleteResultSchema)
+async def delete_files(
+    body: BatchDeleteFileSchema,
+    user: User = Depends(get_current_user),
+    service: FileService = Depends(get_file_service)
+) -> BatchDeleteResultSchema:
+    """
+    Обработчик, позволяющий пользователю удалить несколько файлов (не более
+    FILE_BATCH_DELETE_MAX_SIZE) одним запросом. Файлы помечаются удаленными
+    одним запросом к базе данных, а их содержимое удаляется в фоновом режиме
+
+    Файлы, которых у пользователя нет, не прерывают удаление остальных:
+    их id возвращаются в списке not_found
+    """
+
+    deleted: list[UUID] = await service.delete_files(file_ids=body.file_ids, user=user)
+    deleted_ids: set[UUID] = set(deleted)
+
+    return BatchDeleteResultSchema(
+        deleted=deleted,
+        not_found=[file_id for file_id in dict.fromkeys(body.file_ids) if file_id not in deleted_ids],
+    )
@@ -0,0 +1,497 @@
+import os
+import secrets
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+from typing import Optional
+from urllib.parse import quote
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from src.services.cache import FileContentCache, file_content_cache
+from src.services.storage import ObjectStat, StorageBackend
+from src.services.volumes import VolumeStorageBackend
+from src.settings import project_settings
+
+
+class RangeFileResponse(FileResponse):
+    """
+    Ответ с содержимым файла, поддерживающий запросы диапазонов (RFC 7233)
+    и условные запросы (RFC 7232)
+
+    - If-None-Match и If-Modified-Since: если версия файла у клиента актуальна,
+      возвращается 304 без тела
+    - Range: для одного диапазона возвращается 206 с Content-Range, для нескольких -
+      206 с телом multipart/byteranges, для недопустимых диапазонов - 416.
+      Если If-Range не совпадает с текущей версией файла, Range игнорируется
+
+    Сильный ETag строится по переданному хешу содержимого, а если он не передан -
+    по размеру и времени изменения файла
+
+    Если ASGI-сервер поддерживает расширение http.response.zerocopysend, тело
+    передается серверу как файл и отправляется в сокет без копирования
+    (sendfile). Иначе файл читается вызовами os.pread в пуле потоков блоками
+    по FILE_DOWNLOAD_CHUNK_SIZE байт
+
+    Если передан content_cache, содержимое небольших файлов берется из него
+    (по ключу cache_key и версии файла), а при промахе читается с диска целиком
+    и сохраняется в кеш
+    """
+
+    MAX_RANGES: int = 16
+    ZERO_COPY_EXTENSION: str = "http.response.zerocopysend"
+
+    chunk_size: int = project_settings.FILE_DOWNLOAD_CHUNK_SIZE
+
+    def __init__(
+            self,
+            path: str,
+            filename: Optional[str] = None,
+            content_hash: Optional[str] = None,
+            cache_control: Optional[str] = None,
+            content_cache: Optional[FileContentCache] = None,
+            cache_key: Optional[str] = None,
+            **kwargs
+    ) -> None:
+        self.content_hash: Optional[str] = content_hash
+        self.content_cache: Optional[FileContentCache] = content_cache
+        self.cache_key: Optional[str] = cache_key
+        self.content: Optional[bytes] = None
+        self.zero_copy: bool = False
+        super().__init__(path=path, filename=filename, **kwargs)
+        self.headers.setdefault("accept-ranges", "bytes")
+        if cache_control is not None:
+            self.headers.setdefault("cache-control", cache_control)
+
+    def set_stat_headers(self, stat_result: os.stat_result) -> None:
+        if self.content_hash is not None:
+            etag: str = f'"{self.content_hash}"'
+        else:
+            etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+        self.headers.setdefault("content-length", str(stat_result.st_size))
+        self.headers.setdefault("last-modified", formatdate(stat_result.st_mtime, usegmt=True))
+        self.headers.setdefault("etag", etag)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            self.stat_result = await self.load_stat_result()
+            self.set_stat_headers(self.stat_result)
+
+        if self.content_cache is not None and self.cache_key is not None:
+            self.content = await self._get_cached_content()
+
+        self.zero_copy = self.ZERO_COPY_EXTENSION in scope.get("extensions", {})
+        request_headers: Headers = Headers(scope=scope)
+        size: int = self.stat_result.st_size
+        send_body: bool = scope["method"].upper() != "HEAD"
+
+        if self._is_not_modified(request_headers):
+            for header in ("content-length", "content-type", "content-disposition"):
+                del self.headers[header]
+            await self._send_start(send, status_code=304)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        ranges: Optional[list[tuple[int, int]]] = self._get_ranges(request_headers, size)
+
+        if ranges is None:
+            await self._send_start(send, status_code=self.status_code)
+            if send_body:
+                await self.send_range(send, 0, size - 1, more_body=False)
+            else:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif not ranges:
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            del self.headers["content-disposition"]
+            await self._send_start(send, status_code=416)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+            self.headers["content-length"] = str(end - start + 1)
+            await self._send_start(send, status_code=206)
+            if send_body:
+                await self.send_range(send, start, end, more_body=False)
+            else:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            await self._send_multipart(send, ranges, size, send_body)
+
+        if self.background is not None:
+            await self.background()
+
+    async def load_stat_result(self) -> os.stat_result:
+        try:
+            stat_result: os.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+        except FileNotFoundError:
+            raise RuntimeError(f"File at path {self.path} does not exist.")
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise RuntimeError(f"File at path {self.path} is not a file.")
+        return stat_result
+
+    async def send_range(self, send: Send, start: int, end: int, more_body: bool) -> None:
+        """Отправляет байты файла с start по end включительно"""
+
+        remaining: int = end - start + 1
+        if remaining <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": more_body})
+            return
+
+        if self.content is not None:
+            await send({
+                "type": "http.response.body",
+                "body": self.content[start:end + 1],
+                "more_body": more_body,
+            })
+            return
+
+        if self.zero_copy:
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": self.ZERO_COPY_EXTENSION,
+                    "file": file,
+                    "offset": start,
+                    "count": remaining,
+                    "more_body": more_body,
+                })
+            finally:
+                await anyio.to_thread.run_sync(file.close)
+            return
+
+        file_descriptor: int = await anyio.to_thread.run_sync(self._open_for_reading, self.path)
+        try:
+            offset: int = start
+            while remaining > 0:
+                chunk: bytes = await anyio.to_thread.run_sync(
+                    os.pread, file_descriptor, min(self.chunk_size, remaining), offset
+                )
+                if not chunk:
+                    raise RuntimeError(f"File at path {self.path} was truncated while reading.")
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": more_body or remaining > 0,
+                })
+        finally:
+            await anyio.to_thread.run_sync(os.close, file_descriptor)
+
+    async def _get_cached_content(self) -> Optional[bytes]:
+        size: int = self.stat_result.st_size
+        if not self.content_cache.is_cacheable(size):
+            return None
+
+        version: tuple = (size, self.stat_result.st_mtime_ns, self.content_hash)
+        content: Optional[bytes] = self.content_cache.get(key=self.cache_key, version=version)
+        if content is not None:
+            return content
+
+        content = await anyio.to_thread.run_sync(self._read_file, self.path, size)
+        if len(content) != size:
+            return None
+        self.content_cache.set(key=self.cache_key, version=version, content=content)
+        return content
+
+    @staticmethod
+    def _read_file(path: str, size: int) -> bytes:
+        file_descriptor: int = os.open(path, os.O_RDONLY)
+        try:
+            return os.pread(file_descriptor, size, 0)
+        finally:
+            os.close(file_descriptor)
+
+    @staticmethod
+    def _open_for_reading(path: str) -> int:
+        file_descriptor: int = os.open(path, os.O_RDONLY)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(file_descriptor, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        return file_descriptor
+
+    async def _send_multipart(
+            self,
+            send: Send,
+            ranges: list[tuple[int, int]],
+            size: int,
+            send_body: bool
+    ) -> None:
+        boundary: str = secrets.token_hex(16)
+        content_type: str = self.headers.get("content-type", "application/octet-stream")
+        part_headers: list[bytes] = [
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        closing: bytes = f"\r\n--{boundary}--\r\n".encode("latin-1")
+        content_length: int = (
+            sum(len(part_header) for part_header in part_headers)
+            + sum(end - start + 1 for start, end in ranges)
+            + 2 * (len(ranges) - 1)
+            + len(closing)
+        )
+
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self.headers["content-length"] = str(content_length)
+        await self._send_start(send, status_code=206)
+
+        if not send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        for number, ((start, end), part_header) in enumerate(zip(ranges, part_headers)):
+            separator: bytes = b"\r\n" if number > 0 else b""
+            await send({"type": "http.response.body", "body": separator + part_header, "more_body": True})
+            await self.send_range(send, start, end, more_body=True)
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+    async def _send_start(self, send: Send, status_code: int) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": self.raw_headers,
+        })
+
+    def _is_not_modified(self, request_headers: Headers) -> bool:
+        if_none_match: Optional[str] = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            etag: str = self.headers["etag"]
+            tags: list[str] = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+
+        if_modified_since: Optional[str] = request_headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                return int(self.stat_result.st_mtime) <= int(
+                    parsedate_to_datetime(if_modified_since).timestamp()
+                )
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+    def _get_ranges(self, request_headers: Headers, size: int) -> Optional[list[tuple[int, int]]]:
+        """
+        Возвращает None, если должен быть отправлен весь файл, пустой список,
+        если ни один из запрошенных диапазонов не может быть удовлетворен,
+        иначе - отсортированные и объединенные диапазоны (границы включительно)
+        """
+
+        range_header: Optional[str] = request_headers.get("range")
+        if range_header is None or self.status_code != 200:
+            return None
+
+        if_range: Optional[str] = request_headers.get("if-range")
+        if if_range is not None and not self._is_current_version(if_range):
+            return None
+
+        unit, _, range_set = range_header.partition("=")
+        if unit.strip().lower() != "bytes":
+            return None
+
+        ranges: list[tuple[int, int]] = []
+        for range_spec in range_set.split(","):
+            first, separator, last = range_spec.strip().partition("-")
+            if (
+                    not separator
+                    or not (first or last)
+                    or not all(_is_byte_position(value) for value in (first, last) if value)
+            ):
+                return None
+            if not first:
+                start, end = max(size - int(last), 0), size - 1
+                if int(last) == 0:
+                    continue
+            else:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+                if last and int(last) < start:
+                    return None
+            if start < size:
+                ranges.append((start, end))
+
+        if len(ranges) > self.MAX_RANGES:
+            return None
+
+        merged: list[tuple[int, int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def _is_current_version(self, if_range: str) -> bool:
+        if if_range.startswith('"'):
+            return if_range == self.headers["etag"]
+        try:
+            return int(parsedate_to_datetime(if_range).timestamp()) == int(self.stat_result.st_mtime)
+        except (TypeError, ValueError):
+            return False
+
+
+def _is_byte_position(value: str) -> bool:
+    return value.isascii() and value.isdigit()
+
+
+class StorageFileResponse(RangeFileResponse):
+    """
+    Ответ с содержимым объекта удаленного хранилища (StorageBackend без локальных
+    путей). Поддерживает те же запросы диапазонов и условные запросы, что и
+    RangeFileResponse, но читает содержимое потоком из хранилища
+    """
+
+    def __init__(
+            self,
+            storage: StorageBackend,
+            key: str,
+            filename: Optional[str] = None,
+            content_hash: Optional[str] = None,
+            cache_control: Optional[str] = None
+    ) -> None:
+        self.storage: StorageBackend = storage
+        self.key: str = key
+        super().__init__(
+            path=key,
+            filename=filename,
+            content_hash=content_hash,
+            cache_control=cache_control,
+        )
+
+    async def load_stat_result(self) -> os.stat_result:
+        object_stat: Optional[ObjectStat] = await self.storage.stat(self.key)
+        if object_stat is None:
+            raise RuntimeError(f"Object {self.key} does not exist.")
+
+        modified_at: int = int(object_stat.modified_at)
+        return os.stat_result(
+            (stat.S_IFREG | 0o644, 0, 0, 0, 0, 0, object_stat.size, modified_at, modified_at, modified_at),
+            {
+                "st_mtime": object_stat.modified_at,
+                "st_mtime_ns": int(object_stat.modified_at * 1_000_000_000),
+            },
+        )
+
+    async def send_range(self, send: Send, start: int, end: int, more_body: bool) -> None:
+        if end >= start:
+            async for chunk in self.storage.get_stream(self.key, start=start, end=end):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": more_body})
+
+
+class OffloadedFileResponse(Response):
+    """
+    Ответ без тела, передающий отправку файла стоящему перед приложением
+    прокси-серверу через заголовок X-Accel-Redirect (nginx) или X-Sendfile
+    (Apache, lighttpd). Запросы диапазонов и условные запросы в этом случае
+    обрабатывает прокси-сервер
+
+    Для X-Accel-Redirect путь файла задается относительно каталога accel_root
+    (по умолчанию UPLOADS_DIR) и дописывается к внутреннему location accel_prefix
+    (по умолчанию FILE_DOWNLOAD_ACCEL_PREFIX)
+    """
+
+    def __init__(
+            self,
+            path: str,
+            mode: str,
+            filename: Optional[str] = None,
+            cache_control: Optional[str] = None,
+            accel_root: Optional[str] = None,
+            accel_prefix: Optional[str] = None
+    ) -> None:
+        headers: dict[str, str] = {}
+        if mode == "x-accel-redirect":
+            accel_root = accel_root or project_settings.UPLOADS_DIR
+            accel_prefix = accel_prefix or project_settings.FILE_DOWNLOAD_ACCEL_PREFIX
+            relative_path: str = os.path.relpath(path, accel_root)
+            if relative_path.startswith(os.pardir):
+                raise ValueError(f"File at path {path} is outside of the directory {accel_root}")
+            headers["X-Accel-Redirect"] = accel_prefix.rstrip("/") + "/" + quote(relative_path)
+        elif mode == "x-sendfile":
+            headers["X-Sendfile"] = path
+        else:
+            raise ValueError(f"Unknown download mode {mode}")
+
+        if filename is not None:
+            headers["Content-Disposition"] = get_content_disposition(filename)
+        if cache_control is not None:
+            headers["Cache-Control"] = cache_control
+
+        super().__init__(
+            status_code=200,
+            headers=headers,
+            media_type=guess_type(filename or path)[0] or "application/octet-stream",
+        )
+
+
+def get_content_disposition(filename: str) -> str:
+    quoted_filename: str = quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
+
+
+def create_file_response(
+        storage: StorageBackend,
+        key: str,
+        filename: str,
+        content_hash: Optional[str] = None,
+        cache_key: Optional[str] = None
+) -> Response:
+    """
+    Создает ответ с содержимым файла в соответствии с настройкой FILE_DOWNLOAD_MODE:
+    direct - файл отправляется приложением, x-accel-redirect и x-sendfile -
+    отправка файла передается прокси-серверу
+
+    В режиме direct небольшие файлы, для которых передан cache_key, отдаются
+    из file_content_cache
+
+    Объекты удаленного хранилища (например, S3) всегда отдаются приложением
+    потоком из хранилища. Для объектов на томах STORAGE_VOLUMES в режиме
+    x-accel-redirect используется location FILE_DOWNLOAD_ACCEL_VOLUMES_PREFIX/<том>/
+    """
+
+    path: Optional[str] = storage.get_local_path(key)
+    if path is None:
+        return StorageFileResponse(
+            storage=storage,
+            key=key,
+            filename=filename,
+            content_hash=content_hash,
+            cache_control=project_settings.FILE_DOWNLOAD_CACHE_CONTROL,
+        )
+
+    if project_settings.FILE_DOWNLOAD_MODE == "direct":
+        return RangeFileResponse(
+            path=path,
+            filename=filename,
+            content_hash=content_hash,
+            cache_control=project_settings.FILE_DOWNLOAD_CACHE_CONTROL,
+            content_cache=file_content_cache,
+            cache_key=cache_key,
+        )
+
+    accel_root: Optional[str] = None
+    accel_prefix: Optional[str] = None
+    if isinstance(storage, VolumeStorageBackend):
+        accel_root = storage.root
+        accel_prefix = (
+            project_settings.FILE_DOWNLOAD_ACCEL_VOLUMES_PREFIX.rstrip("/") + "/" + quote(storage.volume)
+        )
+    return OffloadedFileResponse(
+        path=path,
+        mode=project_settings.FILE_DOWNLOAD_MODE,
+        filename=filename,
+        cache_control=project_settings.FILE_DOWNLOAD_CACHE_CONTROL,
+        accel_root=accel_root,
+        accel_prefix=accel_prefix,
+    )
@@ -0,0 +1,164 @@
+"""
+Перенос файлов в структуру каталогов, заданную FILE_PATH_FANOUT_LEVELS
+
+Команда обходит записи File пачками по batch_size строк (по возрастанию file_id)
+и для каждой записи, путь которой не совпадает с FileService.build_file_path,
+создает жесткую ссылку на файл по новому пути, обновляет file_path одним запросом
+на пачку и только после фиксации транзакции удаляет старый путь. Пока запись
+переносится, файл доступен по обоим путям, а строки пачки заблокированы
+(FOR UPDATE SKIP LOCKED), поэтому команду можно запускать на работающем сервисе.
+Ссылки создаются параллельно в workers потоках
+
+Записи, загрузка которых еще не завершена (pending, downloading), пропускаются:
+в их файлы продолжают писать воркер или сессия загрузки. Они переносятся
+повторным запуском команды. С флагом --dry-run команда только считает записи,
+которые нужно перенести:
+
+    python -m src.commands.migrate_file_layout --batch-size 1000 --workers 16 --dry-run
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Row, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.database.config import database_settings
+from src.database.models import File, FileStatus
+from src.services import file_ops
+from src.services.services import FileService
+
+
+@dataclass
+class LayoutMigrationReport:
+    scanned: int = 0
+    rewritten: int = 0
+    moved: int = 0
+    conflicts: int = 0
+    elapsed: float = 0
+
+    def __str__(self) -> str:
+        rate: float = self.scanned / self.elapsed if self.elapsed else 0
+        return (
+            f"scanned: {self.scanned}, rewritten: {self.rewritten}, moved: {self.moved}, "
+            f"conflicts: {self.conflicts}, elapsed: {self.elapsed:.2f} s ({rate:.0f} files/s)"
+        )
+
+
+async def migrate_file_layout(
+        session_factory: async_sessionmaker,
+        batch_size: int,
+        workers: int,
+        dry_run: bool = False
+) -> LayoutMigrationReport:
+    report: LayoutMigrationReport = LayoutMigrationReport()
+    started: float = time.perf_counter()
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    last_file_id: Optional[UUID] = None
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="layout-migration") as executor:
+        while True:
+            query = (
+                select(File.file_id, File.user_id, File.filename, File.file_path)
+                .where(
+                    File.status.in_((FileStatus.COMPLETED.value, FileStatus.FAILED.value)),
+                    File.deleted_at.is_(None),
+                )
+                .order_by(File.file_id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            if last_file_id is not None:
+                query = query.where(File.file_id > last_file_id)
+
+            async with session_factory() as session:
+                async with session.begin():
+                    files: Sequence[Row] = (await session.execute(query)).all()
+                    if not files:
+                        break
+                    last_file_id = files[-1].file_id
+                    report.scanned += len(files)
+
+                    moves: list[tuple[Row, str]] = [
+                        (file, target_path)
+                        for file in files
+                        if (target_path := FileService.build_file_path(str(file.user_id), file.filename))
+                        != file.file_path
+                    ]
+                    if dry_run:
+                        report.rewritten += len(moves)
+                        continue
+
+                    results: list[Optional[bool]] = await asyncio.gather(*(
+                        loop.run_in_executor(executor, _link, file.file_path, target_path)
+                        for file, target_path in moves
+                    ))
+
+                    rewrites: list[dict] = []
+                    moved_paths: list[str] = []
+                    for (file, target_path), linked in zip(moves, results):
+                        if linked is None:
+                            report.conflicts += 1
+                            continue
+                        rewrites.append({"file_id": file.file_id, "file_path": target_path})
+                        if linked:
+                            moved_paths.append(file.file_path)
+
+                    if rewrites:
+                        await session.execute(update(File), rewrites)
+
+            await asyncio.gather(*(
+                loop.run_in_executor(executor, file_ops.remove_if_exists_sync, file_path) for file_path in moved_paths
+            ))
+            report.rewritten += len(rewrites)
+            report.moved += len(moved_paths)
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _link(source_path: str, target_path: str) -> Optional[bool]:
+    """
+    Создает жесткую ссылку target_path на source_path. Возвращает False, если
+    файла source_path нет (например, содержимое уже перенесено в хранилище),
+    и None, если по пути target_path находится другой файл
+    """
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    try:
+        os.link(source_path, target_path)
+    except FileNotFoundError:
+        return False
+    except FileExistsError:
+        if not os.path.exists(source_path):
+            return False
+        if not os.path.samefile(source_path, target_path):
+            return None
+    return True
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        report: LayoutMigrationReport = await migrate_file_layout(
+            session_factory=database_settings.async_session,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await database_settings.dispose_engine()
+    print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,134 @@
+"""
+Пересчет счетчиков использования хранилища (UserUsage) по записям File
+
+Счетчики обновляются в транзакциях загрузки и удаления файлов, но могут
+разойтись с данными, например после ручного изменения таблицы file. Команда
+обходит пользователей пачками по batch_size (по возрастанию user_id) и для
+каждой пачки одной транзакцией:
+
+- создает недостающие строки user_usage и блокирует строки пачки;
+- считает количество и суммарный размер завершенных и не удаленных файлов
+  одним запросом с GROUP BY по индексу file (user_id, ...);
+- перезаписывает только разошедшиеся счетчики.
+
+Строки счетчиков блокируются до подсчета, поэтому параллельная загрузка или
+удаление, изменившие записи File, либо уже зафиксированы и попадают в подсчет,
+либо ждут блокировки и применяют свое изменение к пересчитанному значению.
+Команду можно запускать на работающем сервисе. С флагом --dry-run она только
+считает разошедшиеся счетчики:
+
+    python -m src.commands.recompute_usage --batch-size 1000 --dry-run
+"""
+
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.database.config import database_settings
+from src.database.models import File, FileStatus, User, UserUsage
+
+
+@dataclass
+class UsageRepairReport:
+    scanned: int = 0
+    fixed: int = 0
+    elapsed: float = 0
+
+    def __str__(self) -> str:
+        rate: float = self.scanned / self.elapsed if self.elapsed else 0
+        return (
+            f"scanned: {self.scanned}, fixed: {self.fixed}, "
+            f"elapsed: {self.elapsed:.2f} s ({rate:.0f} users/s)"
+        )
+
+
+async def recompute_usage(
+        session_factory: async_sessionmaker,
+        batch_size: int,
+        dry_run: bool = False
+) -> UsageRepairReport:
+    report: UsageRepairReport = UsageRepairReport()
+    started: float = time.perf_counter()
+    last_user_id: Optional[UUID] = None
+
+    while True:
+        query = select(User.user_id).order_by(User.user_id).limit(batch_size)
+        if last_user_id is not None:
+            query = query.where(User.user_id > last_user_id)
+
+        async with session_factory() as session:
+            async with session.begin():
+                user_ids: list[UUID] = list((await session.execute(query)).scalars())
+                if not user_ids:
+                    break
+                last_user_id = user_ids[-1]
+                report.scanned += len(user_ids)
+
+                if not dry_run:
+                    await session.execute(
+                        insert(UserUsage)
+                        .values([{"user_id": user_id} for user_id in user_ids])
+                        .on_conflict_do_nothing(index_elements=[UserUsage.user_id])
+                    )
+                result = await session.execute(
+                    select(UserUsage.user_id, UserUsage.file_count, UserUsage.total_bytes)
+                    .where(UserUsage.user_id.in_(user_ids))
+                    .order_by(UserUsage.user_id)
+                    .with_for_update()
+                )
+                stored: dict[UUID, tuple[int, int]] = {
+                    usage.user_id: (usage.file_count, usage.total_bytes) for usage in result
+                }
+
+                result = await session.execute(
+                    select(File.user_id, func.count(), func.coalesce(func.sum(File.size), 0))
+                    .where(
+                        File.user_id.in_(user_ids),
+                        File.status == FileStatus.COMPLETED.value,
+                        File.deleted_at.is_(None),
+                    )
+                    .group_by(File.user_id)
+                )
+                actual: dict[UUID, tuple[int, int]] = {
+                    usage[0]: (usage[1], usage[2]) for usage in result.all()
+                }
+
+                fixes: list[dict] = []
+                for user_id in user_ids:
+                    file_count, total_bytes = actual.get(user_id, (0, 0))
+                    if (file_count, total_bytes) != stored.get(user_id, (0, 0)):
+                        fixes.append(
+                            {"user_id": user_id, "file_count": file_count, "total_bytes": total_bytes}
+                        )
+                report.fixed += len(fixes)
+                if fixes and not dry_run:
+                    await session.execute(update(UserUsage), fixes)
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        report: UsageRepairReport = await recompute_usage(
+            session_factory=database_settings.async_session,
+            batch_size=args.batch_size,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await database_settings.dispose_engine()
+    print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
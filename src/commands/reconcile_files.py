@@ -0,0 +1,565 @@
+"""
+Сверка файлов на диске с записями в базе данных и удаление "осиротевших" файлов
+
+Файлы и записи могут расходиться: запись File удаляется раньше файла, воркер
+дописывает файл для уже удаленной записи, неудачные загрузки оставляют
+недописанные файлы. Команда сравнивает таблицу file с деревом каталогов
+пользователей в UPLOADS_DIR, а таблицу blob - с каталогами blobs хранилища
+содержимого (в UPLOADS_DIR и на томах STORAGE_VOLUMES):
+
+- записи читаются курсором на стороне сервера в порядке путей (COLLATE "C",
+  то есть побайтово), а каталоги обходятся os.scandir в workers потоках:
+  каждый каталог верхнего уровня обходится в том же порядке и записывается во
+  временный файл, поэтому оба потока данных сравниваются слиянием, и в памяти
+  находится не больше одной пачки действий;
+- файлы без записей, файлы неудачных загрузок (failed) и оставшиеся после
+  переноса в хранилище содержимого копии удаляются, файлы содержимого без
+  записи Blob - тоже. Файлы, измененные позже, чем grace_seconds назад, не
+  трогаются: запись для них могла еще не появиться. Перед удалением пачки
+  записи для ее путей перечитываются;
+- каталоги blobs сверяются по реальным путям (realpath): если несколько томов
+  (или том и UPLOADS_DIR) указывают на один каталог, его файлы сравниваются с
+  записями Blob всех этих томов. Тома, расположенные внутри UPLOADS_DIR, не
+  обходятся при сверке таблицы file;
+- загруженные до появления хранилища содержимого файлы, которых нет на диске,
+  ставятся в очередь на повторную загрузку по source_url, а если его нет,
+  отмечаются как неудачно загруженные (и в обоих случаях вычитаются из
+  счетчиков UserUsage). Отсутствующее содержимое Blob только учитывается в отчете
+
+Команда запускается задачей воркера reconcile_files раз в RECONCILE_INTERVAL
+секунд или вручную. С флагом --dry-run она только выводит отчет:
+
+    python -m src.commands.reconcile_files --batch-size 1000 --workers 8 --dry-run
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterator, Optional, Sequence
+
+from sqlalchemy import Row, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncResult, async_sessionmaker
+
+from src.database.config import database_settings
+from src.database.models import Blob, File, FileStatus
+from src.services import file_ops
+from src.services.blob_store import BlobStore
+from src.services.usage import change_usage, sum_usage
+from src.services.volumes import volume_set
+from src.settings import project_settings
+
+RUN_READ_SIZE: int = 1024 * 1024
+
+
+@dataclass
+class DiskEntry:
+    path: str
+    size: int
+    modified_at: float
+
+
+@dataclass
+class ReconciliationReport:
+    scanned_rows: int = 0
+    scanned_files: int = 0
+    orphan_files: int = 0
+    orphan_blobs: int = 0
+    recent_files: int = 0
+    deleted: int = 0
+    freed_bytes: int = 0
+    missing_files: int = 0
+    requeued: int = 0
+    marked_failed: int = 0
+    missing_blobs: int = 0
+    elapsed: float = 0
+
+    def __str__(self) -> str:
+        scanned: int = self.scanned_rows + self.scanned_files
+        rate: float = scanned / self.elapsed if self.elapsed else 0
+        return (
+            f"scanned rows: {self.scanned_rows}, scanned files: {self.scanned_files}, "
+            f"orphan files: {self.orphan_files}, orphan blobs: {self.orphan_blobs}, "
+            f"skipped recent: {self.recent_files}, deleted: {self.deleted} "
+            f"({self.freed_bytes / 1024 ** 2:.1f} MiB), missing files: {self.missing_files}, "
+            f"requeued: {self.requeued}, marked failed: {self.marked_failed}, "
+            f"missing blobs: {self.missing_blobs}, elapsed: {self.elapsed:.2f} s ({rate:.0f} entries/s)"
+        )
+
+
+async def reconcile_files(
+        session_factory: async_sessionmaker,
+        batch_size: int,
+        workers: int,
+        grace_seconds: float,
+        on_requeue: Optional[Callable[[list[dict[str, str]]], None]] = None,
+        dry_run: bool = False
+) -> ReconciliationReport:
+    """
+    Сверяет файлы с записями и возвращает отчет. on_requeue вызывается для каждой
+    пачки файлов, поставленных на повторную загрузку (аргументы задачи
+    download_file_to_server)
+    """
+
+    report: ReconciliationReport = ReconciliationReport()
+    started: float = time.perf_counter()
+    reconciler: _Reconciler = _Reconciler(
+        session_factory=session_factory,
+        batch_size=batch_size,
+        workers=workers,
+        modified_before=time.time() - grace_seconds,
+        on_requeue=on_requeue,
+        dry_run=dry_run,
+        report=report,
+    )
+    try:
+        uploads_root: str = os.path.normpath(project_settings.UPLOADS_DIR)
+        locations: dict[str, list[Optional[str]]] = _get_blob_locations()
+        await reconciler.reconcile_uploads(root=uploads_root, skip=_get_skipped_paths(uploads_root, locations))
+        for root, volumes in locations.items():
+            await reconciler.reconcile_blobs(volumes=volumes, root=root)
+    finally:
+        reconciler.close()
+
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+class _Reconciler:
+    def __init__(
+            self,
+            session_factory: async_sessionmaker,
+            batch_size: int,
+            workers: int,
+            modified_before: float,
+            on_requeue: Optional[Callable[[list[dict[str, str]]], None]],
+            dry_run: bool,
+            report: ReconciliationReport
+    ) -> None:
+        self.session_factory: async_sessionmaker = session_factory
+        self.batch_size: int = batch_size
+        self.workers: int = workers
+        self.modified_before: float = modified_before
+        self.on_requeue: Optional[Callable[[list[dict[str, str]]], None]] = on_requeue
+        self.dry_run: bool = dry_run
+        self.report: ReconciliationReport = report
+        self.scan_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="reconcile-scan"
+        )
+        self.io_executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="reconcile-io"
+        )
+
+    def close(self) -> None:
+        self.scan_executor.shutdown(wait=True, cancel_futures=True)
+        self.io_executor.shutdown(wait=True)
+
+    async def reconcile_uploads(self, root: str, skip: set[str]) -> None:
+        query = (
+            select(File.file_id, File.file_path, File.status, File.blob_sha256, File.deleted_at)
+            .where(File.file_path.startswith(root + os.sep, autoescape=True))
+            .order_by(File.file_path.collate("C"))
+            .execution_options(yield_per=self.batch_size)
+        )
+        orphans: list[DiskEntry] = []
+        missing: list[Row] = []
+
+        async with self.session_factory() as session:
+            rows: AsyncResult = await session.stream(query)
+            entries: AsyncIterator[DiskEntry] = scan_tree(
+                root=root,
+                executor=self.scan_executor,
+                workers=self.workers,
+                skip=skip,
+            )
+            async for file, entry in _merge(rows, entries, key=lambda file: file.file_path):
+                if file is not None:
+                    self.report.scanned_rows += 1
+                if entry is not None:
+                    self.report.scanned_files += 1
+
+                if entry is None:
+                    if _is_missing(file):
+                        self.report.missing_files += 1
+                        missing.append(file)
+                elif file is None or _is_stale(file):
+                    if entry.modified_at > self.modified_before:
+                        self.report.recent_files += 1
+                        continue
+                    self.report.orphan_files += 1
+                    orphans.append(entry)
+
+                if len(orphans) >= self.batch_size:
+                    await self._delete_orphan_files(orphans)
+                    orphans = []
+                if len(missing) >= self.batch_size:
+                    await self._requeue_missing_files(missing)
+                    missing = []
+
+        await self._delete_orphan_files(orphans)
+        await self._requeue_missing_files(missing)
+
+    async def reconcile_blobs(self, volumes: list[Optional[str]], root: str) -> None:
+        query = (
+            select(Blob.sha256)
+            .where(_get_volume_condition(volumes))
+            .order_by(Blob.sha256.collate("C"))
+            .execution_options(yield_per=self.batch_size)
+        )
+        orphans: list[DiskEntry] = []
+
+        async with self.session_factory() as session:
+            rows: AsyncResult = await session.stream(query)
+            entries: AsyncIterator[DiskEntry] = scan_tree(
+                root=os.path.join(root, BlobStore.BLOBS_DIR_NAME),
+                executor=self.scan_executor,
+                workers=self.workers,
+            )
+            async for blob, entry in _merge(
+                    rows, entries, key=lambda blob: os.path.join(root, BlobStore.get_blob_key(blob.sha256))
+            ):
+                if blob is not None:
+                    self.report.scanned_rows += 1
+                if entry is not None:
+                    self.report.scanned_files += 1
+
+                if entry is None:
+                    self.report.missing_blobs += 1
+                elif blob is None:
+                    if entry.modified_at > self.modified_before:
+                        self.report.recent_files += 1
+                        continue
+                    self.report.orphan_blobs += 1
+                    orphans.append(entry)
+
+                if len(orphans) >= self.batch_size:
+                    await self._delete_orphan_blobs(volumes, orphans)
+                    orphans = []
+
+        await self._delete_orphan_blobs(volumes, orphans)
+
+    async def _delete_orphan_files(self, orphans: list[DiskEntry]) -> None:
+        if not orphans or self.dry_run:
+            return
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(File.file_path, File.status, File.blob_sha256)
+                    .where(File.file_path.in_([entry.path for entry in orphans]))
+                )
+                kept: set[str] = {file.file_path for file in result if not _is_stale(file)}
+
+        await self._delete([entry for entry in orphans if entry.path not in kept])
+
+    async def _delete_orphan_blobs(self, volumes: list[Optional[str]], orphans: list[DiskEntry]) -> None:
+        if not orphans or self.dry_run:
+            return
+
+        async with self.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    select(Blob.sha256)
+                    .where(
+                        Blob.sha256.in_([os.path.basename(entry.path) for entry in orphans]),
+                        _get_volume_condition(volumes),
+                    )
+                )
+                kept: set[str] = set(result.scalars())
+
+        await self._delete([entry for entry in orphans if os.path.basename(entry.path) not in kept])
+
+    async def _delete(self, entries: list[DiskEntry]) -> None:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        removed: list[bool] = await asyncio.gather(*(
+            loop.run_in_executor(self.io_executor, file_ops.remove_if_exists_sync, entry.path) for entry in entries
+        ))
+        for entry, is_removed in zip(entries, removed):
+            if is_removed:
+                self.report.deleted += 1
+                self.report.freed_bytes += entry.size
+
+    async def _requeue_missing_files(self, files: list[Row]) -> None:
+        if not files or self.dry_run:
+            return
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        exists: list[bool] = await asyncio.gather(*(
+            loop.run_in_executor(self.io_executor, os.path.exists, file.file_path) for file in files
+        ))
+        file_ids: list = [file.file_id for file, is_present in zip(files, exists) if not is_present]
+        if not file_ids:
+            return
+
+        missing_condition = (
+            File.file_id.in_(file_ids),
+            File.status == FileStatus.COMPLETED.value,
+            File.blob_sha256.is_(None),
+            File.deleted_at.is_(None),
+        )
+        async with self.session_factory() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(File)
+                    .where(*missing_condition, File.source_url.is_not(None))
+                    .values(
+                        status=FileStatus.PENDING.value,
+                        downloaded_bytes=0,
+                        etag=None,
+                        last_modified=None,
+                    )
+                    .returning(File.file_id, File.source_url, File.file_path, File.user_id, File.size)
+                )
+                requeued: Sequence[Row] = result.all()
+                result = await session.execute(
+                    update(File)
+                    .where(*missing_condition, File.source_url.is_(None))
+                    .values(status=FileStatus.FAILED.value)
+                    .returning(File.user_id, File.size)
+                )
+                marked_failed: Sequence[Row] = result.all()
+                await change_usage(session, sum_usage((*requeued, *marked_failed), sign=-1))
+                self.report.marked_failed += len(marked_failed)
+
+        self.report.requeued += len(requeued)
+        if requeued and self.on_requeue is not None:
+            await loop.run_in_executor(
+                self.io_executor, file_ops.make_dirs_sync, {os.path.dirname(file.file_path) for file in requeued}
+            )
+            self.on_requeue([
+                {"file_url": file.source_url, "file_id": str(file.file_id), "file_path": file.file_path}
+                for file in requeued
+            ])
+
+
+async def scan_tree(
+        root: str,
+        executor: ThreadPoolExecutor,
+        workers: int,
+        skip: Optional[set[str]] = None
+) -> AsyncIterator[DiskEntry]:
+    """
+    Обходит файлы в каталоге root и возвращает их в порядке возрастания путей
+    (как при сортировке строк), пропуская каталоги skip (пути относительно root).
+    Подкаталоги верхнего уровня обходятся параллельно, не более чем на 2 * workers
+    вперед, и результат обхода каждого из них записывается во временный файл,
+    который затем читается по частям
+    """
+
+    skipped: frozenset[str] = frozenset(os.path.normpath(os.path.join(root, path)) for path in skip or ())
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    try:
+        top_entries: list[tuple[str, bool]] = await loop.run_in_executor(executor, _list_sorted, root)
+    except FileNotFoundError:
+        return
+
+    with tempfile.TemporaryDirectory(prefix="reconcile-") as runs_dir:
+        queued: Iterator[tuple[int, tuple[str, bool]]] = enumerate(
+            (name, is_dir) for name, is_dir in top_entries if os.path.join(root, name) not in skipped
+        )
+        pending: deque[tuple[str, asyncio.Future]] = deque()
+
+        def schedule() -> None:
+            for index, (name, is_dir) in queued:
+                run_path: str = os.path.join(runs_dir, str(index))
+                pending.append((run_path, loop.run_in_executor(
+                    executor, _write_run, os.path.join(root, name), is_dir, run_path, skipped
+                )))
+                if len(pending) >= 2 * workers:
+                    return
+
+        try:
+            schedule()
+            while pending:
+                run_path, future = pending.popleft()
+                await future
+                schedule()
+                async for entry in _read_run(run_path, executor):
+                    yield entry
+        finally:
+            await asyncio.gather(*(future for _, future in pending), return_exceptions=True)
+
+
+async def _merge(
+        rows: AsyncIterator[Row],
+        entries: AsyncIterator[DiskEntry],
+        key: Callable[[Row], str]
+) -> AsyncIterator[tuple[Optional[Row], Optional[DiskEntry]]]:
+    row: Optional[Row] = await anext(rows, None)
+    entry: Optional[DiskEntry] = await anext(entries, None)
+
+    while row is not None or entry is not None:
+        if entry is None or (row is not None and key(row) < entry.path):
+            yield row, None
+            row = await anext(rows, None)
+        elif row is None or entry.path < key(row):
+            yield None, entry
+            entry = await anext(entries, None)
+        else:
+            yield row, entry
+            row = await anext(rows, None)
+            entry = await anext(entries, None)
+
+
+async def _read_run(run_path: str, executor: ThreadPoolExecutor) -> AsyncIterator[DiskEntry]:
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    run_file = await loop.run_in_executor(executor, open, run_path, "rb")
+    try:
+        remainder: bytes = b""
+        while block := await loop.run_in_executor(executor, run_file.read, RUN_READ_SIZE):
+            records: list[bytes] = (remainder + block).split(b"\0")
+            remainder = records.pop()
+            for record in records:
+                size, modified_at, path = record.split(b"\t", 2)
+                yield DiskEntry(path=os.fsdecode(path), size=int(size), modified_at=float(modified_at))
+    finally:
+        await loop.run_in_executor(executor, run_file.close)
+        await loop.run_in_executor(executor, file_ops.remove_if_exists_sync, run_path)
+
+
+def _list_sorted(directory: str) -> list[tuple[str, bool]]:
+    """
+    Возвращает содержимое каталога (название, является ли каталогом), отсортированное
+    так, что обход в глубину дает пути в порядке сортировки строк: к названиям
+    каталогов при сравнении добавляется разделитель пути
+    """
+
+    with os.scandir(directory) as iterator:
+        entries: list[tuple[str, bool]] = [
+            (entry.name, entry.is_dir(follow_symlinks=False)) for entry in iterator
+        ]
+    return sorted(entries, key=lambda entry: entry[0] + os.sep if entry[1] else entry[0])
+
+
+def _write_run(path: str, is_dir: bool, run_path: str, skipped: frozenset[str]) -> None:
+    with open(run_path, "wb") as run_file:
+        if is_dir:
+            _walk(path, run_file, skipped)
+        else:
+            _write_entry(path, run_file)
+
+
+def _walk(directory: str, run_file, skipped: frozenset[str]) -> None:
+    try:
+        entries: list[tuple[str, bool]] = _list_sorted(directory)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+
+    for name, is_dir in entries:
+        path: str = os.path.join(directory, name)
+        if is_dir:
+            if path not in skipped:
+                _walk(path, run_file, skipped)
+        else:
+            _write_entry(path, run_file)
+
+
+def _write_entry(path: str, run_file) -> None:
+    try:
+        stat_result: os.stat_result = os.stat(path, follow_symlinks=False)
+    except FileNotFoundError:
+        return
+    run_file.write(f"{stat_result.st_size}\t{stat_result.st_mtime}\t".encode() + os.fsencode(path) + b"\0")
+
+
+def _is_stale(file: Row) -> bool:
+    """
+    Файл записи не нужен, если загрузка не удалась или содержимое уже перенесено
+    в хранилище содержимого
+    """
+
+    return file.status == FileStatus.FAILED.value or (
+        file.status == FileStatus.COMPLETED.value and file.blob_sha256 is not None
+    )
+
+
+def _is_missing(file: Row) -> bool:
+    """
+    Пропажа файла с диска важна только для завершенных загрузок без записи в
+    хранилище содержимого. Удаленные файлы ждут очистки и не восстанавливаются
+    """
+
+    return (
+        file.status == FileStatus.COMPLETED.value
+        and file.blob_sha256 is None
+        and file.deleted_at is None
+    )
+
+
+def _get_blob_locations() -> dict[str, list[Optional[str]]]:
+    """
+    Возвращает корни хранилища содержимого (реальные пути) и тома, записи Blob
+    которых в них хранятся: None - содержимое без тома в UPLOADS_DIR. Несколько
+    томов могут указывать на один каталог, и его файлы не считаются осиротевшими,
+    пока на них ссылается запись любого из них
+    """
+
+    if project_settings.STORAGE_BACKEND != "local":
+        return {}
+
+    roots: dict[Optional[str], str] = {None: project_settings.UPLOADS_DIR}
+    if volume_set is not None:
+        roots.update((volume, backend.root) for volume, backend in volume_set.backends.items())
+
+    locations: dict[str, list[Optional[str]]] = {}
+    for volume, root in roots.items():
+        locations.setdefault(os.path.realpath(root), []).append(volume)
+    return locations
+
+
+def _get_skipped_paths(uploads_root: str, locations: dict[str, list[Optional[str]]]) -> set[str]:
+    """
+    Возвращает каталоги внутри uploads_root (пути относительно него), которые
+    не относятся к файлам пользователей: каталоги blobs и тома внутри UPLOADS_DIR
+    """
+
+    real_uploads_root: str = os.path.realpath(uploads_root)
+    skipped: set[str] = {BlobStore.BLOBS_DIR_NAME}
+    for root in locations:
+        relative_root: str = os.path.relpath(root, real_uploads_root)
+        if relative_root == os.curdir:
+            continue
+        if relative_root != os.pardir and not relative_root.startswith(os.pardir + os.sep):
+            skipped.add(relative_root)
+    return skipped
+
+
+def _get_volume_condition(volumes: list[Optional[str]]):
+    named: list[str] = [volume for volume in volumes if volume is not None]
+    if None in volumes:
+        return or_(Blob.volume.is_(None), Blob.volume.in_(named)) if named else Blob.volume.is_(None)
+    return Blob.volume.in_(named)
+
+
+async def main(args: argparse.Namespace) -> None:
+    from src.worker import download_files_to_server
+
+    def requeue(downloads: list[dict[str, str]]) -> None:
+        download_files_to_server.apply_async(kwargs={"downloads": downloads})
+
+    try:
+        report: ReconciliationReport = await reconcile_files(
+            session_factory=database_settings.async_session,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            grace_seconds=args.grace_seconds,
+            on_requeue=requeue,
+            dry_run=args.dry_run,
+        )
+    finally:
+        await database_settings.dispose_engine()
+    print(report)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--batch-size", type=int, default=project_settings.RECONCILE_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=project_settings.RECONCILE_WORKERS)
+    parser.add_argument("--grace-seconds", type=float, default=project_settings.RECONCILE_GRACE_SECONDS)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
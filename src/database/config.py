@@ -1,7 +1,9 @@
 import os
+from functools import cached_property
 
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine
 
@@ -9,6 +11,10 @@ from sqlalchemy.ext.asyncio import create_async_engine
 class DatabaseSettings(BaseSettings):
     """
     Класс, реализующий настройки соединения с базой данных
+
+    Движок (а вместе с ним и пул соединений) создается один раз на процесс
+    при первом обращении и должен быть освобожден методом dispose_engine
+    при завершении работы процесса
     """
 
     DB_HOST: str
@@ -18,6 +24,14 @@ class DatabaseSettings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
 
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
     @property
     def ASYNC_DATABASE_URL(self):
         return (
@@ -25,13 +39,28 @@ class DatabaseSettings(BaseSettings):
             f"{self.DB_HOST}:{self.INTERNAL_DB_PORT}/{self.POSTGRES_DB}"
         )
 
-    @property
-    def _async_engine(self):
-        return create_async_engine(url=self.ASYNC_DATABASE_URL, future=True, echo=True)
+    @cached_property
+    def async_engine(self) -> AsyncEngine:
+        return create_async_engine(
+            url=self.ASYNC_DATABASE_URL,
+            echo=self.DB_ECHO,
+            pool_size=self.DB_POOL_SIZE,
+            max_overflow=self.DB_MAX_OVERFLOW,
+            pool_timeout=self.DB_POOL_TIMEOUT,
+            pool_pre_ping=self.DB_POOL_PRE_PING,
+            pool_recycle=self.DB_POOL_RECYCLE,
+            connect_args={"statement_cache_size": self.DB_STATEMENT_CACHE_SIZE},
+        )
 
-    @property
-    def async_session(self):
-        return async_sessionmaker(self._async_engine, expire_on_commit=False)
+    @cached_property
+    def async_session(self) -> async_sessionmaker:
+        return async_sessionmaker(self.async_engine, expire_on_commit=False)
+
+    async def dispose_engine(self) -> None:
+        if "async_engine" in self.__dict__:
+            await self.async_engine.dispose()
+            del self.__dict__["async_engine"]
+            self.__dict__.pop("async_session", None)
 
     model_config = SettingsConfigDict(
         env_file=os.path.join(
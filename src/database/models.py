@@ -1,6 +1,8 @@
+import enum
 from datetime import date, datetime
+from typing import Optional
 
-from sqlalchemy import ForeignKey, text, BigInteger
+from sqlalchemy import ForeignKey, text, BigInteger, Index, String
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from uuid import UUID
 from uuid import uuid4
@@ -28,8 +30,47 @@ class User(Base):
         return self.email
 
 
+class UserUsage(Base):
+    """
+    Счетчики файлов пользователя: количество и суммарный размер завершенных
+    и не удаленных файлов. Обновляются в тех же транзакциях, что и записи File
+    (см. src.services.usage)
+    """
+
+    __tablename__ = "user_usage"
+
+    user_id: Mapped[UUID] = mapped_column(
+        ForeignKey("user.user_id", ondelete="CASCADE"), primary_key=True
+    )
+    file_count: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+    total_bytes: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+
+    def __repr__(self):
+        return str(self.user_id)
+
+
+class FileStatus(str, enum.Enum):
+    """Этапы жизненного цикла загружаемого файла"""
+
+    PENDING = "pending"
+    DOWNLOADING = "downloading"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class File(Base):
     __tablename__ = "file"
+    __table_args__ = (
+        Index("ix_file_user_id_uploaded_at_file_id", "user_id", "uploaded_at", "file_id"),
+        Index(
+            "uq_file_user_id_filename",
+            "user_id",
+            "filename",
+            unique=True,
+            postgresql_where=text("deleted_at IS NULL"),
+        ),
+        Index("ix_file_deleted_at", "deleted_at", postgresql_where=text("deleted_at IS NOT NULL")),
+    )
 
     file_id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid4)
     filename: Mapped[str]
@@ -39,5 +80,31 @@ class File(Base):
     user_id: Mapped[UUID] = mapped_column(ForeignKey("user.user_id"))
     user: Mapped["User"] = relationship(back_populates="files")
 
+    status: Mapped[str] = mapped_column(
+        String(16), default=FileStatus.PENDING.value, server_default=FileStatus.PENDING.value
+    )
+    source_url: Mapped[Optional[str]]
+    downloaded_bytes: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+    etag: Mapped[Optional[str]]
+    last_modified: Mapped[Optional[str]]
+
+    blob_sha256: Mapped[Optional[str]] = mapped_column(ForeignKey("blob.sha256"), index=True)
+    volume: Mapped[Optional[str]] = mapped_column(String(64))
+    deleted_at: Mapped[Optional[datetime]]
+
     def __repr__(self):
         return self.filename
+
+
+class Blob(Base):
+    __tablename__ = "blob"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(BigInteger)
+    crc32: Mapped[Optional[int]] = mapped_column(BigInteger)
+    ref_count: Mapped[int] = mapped_column(default=1)
+    volume: Mapped[Optional[str]] = mapped_column(String(64))
+    created_at: Mapped[datetime] = mapped_column(server_default=text("TIMEZONE ('utc', now())"))
+
+    def __repr__(self):
+        return self.sha256
@@ -8,6 +8,7 @@ from jose import JWTError
 
 from src.database.config import database_settings
 from src.database.models import User
+from src.services.cache import user_cache
 from src.services.services import AuthService, FileService
 from src.services import security
 
@@ -38,12 +39,15 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    user: Optional[User] = await _get_user_by_email_from_database(
-        email=email, db_session=db_session
-    )
+    user: Optional[User] = await user_cache.get(email=email)
+    if user is not None:
+        return user
+
+    user = await _get_user_by_email_from_database(email=email, db_session=db_session)
     if user is None:
         raise credentials_exception
 
+    await user_cache.set(user=user)
     return user
 
 
@@ -1,11 +1,62 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 import uvicorn
-from fastapi import APIRouter, FastAPI
+from fastapi import APIRouter, FastAPI, Request, status
+from fastapi.responses import JSONResponse
 
 from src.api.auth import auth_router
 from src.api.file import file_router
+from src.database.config import database_settings
+from src.services.cache import user_cache
+from src.services.executors import ExecutorOverloadedError
+from src.services.file_ops import file_ops_executor
+from src.services.hashing import hashing_executor
+from src.services.progress import progress_store
+from src.services.services import StorageQuotaExceededError
+from src.services.storage import storage_backend
+from src.services.upload_sessions import upload_session_store
 from src.settings import project_settings
 
-app: FastAPI = FastAPI(title=project_settings.APP_TITLE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    yield
+    hashing_executor.shutdown()
+    file_ops_executor.shutdown()
+    await user_cache.close()
+    await progress_store.close()
+    await upload_session_store.close()
+    await storage_backend.close()
+    await database_settings.dispose_engine()
+
+
+app: FastAPI = FastAPI(title=project_settings.APP_TITLE, lifespan=lifespan)
+
+
+@app.exception_handler(ExecutorOverloadedError)
+async def executor_overloaded_handler(request: Request, exc: ExecutorOverloadedError) -> JSONResponse:
+    """
+    Ответ с кодом 503, если очередь блокирующих операций (например, операций
+    с файловой системой) переполнена
+    """
+
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Server is overloaded, please try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(StorageQuotaExceededError)
+async def storage_quota_exceeded_handler(request: Request, exc: StorageQuotaExceededError) -> JSONResponse:
+    """Ответ с кодом 413, если загрузка файла превысит квоту пользователя"""
+
+    return JSONResponse(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        content={"detail": str(exc)},
+    )
+
 
 main_router: APIRouter = APIRouter(prefix="/api")
 main_router.include_router(auth_router)
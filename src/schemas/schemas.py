@@ -3,9 +3,10 @@ from typing import Optional
 from uuid import UUID
 
 from fastapi import Form
-from pydantic import BaseModel, EmailStr, ConfigDict, HttpUrl
+from pydantic import BaseModel, EmailStr, ConfigDict, Field, HttpUrl
 
 from src.schemas.mixins import UserValidationMixin
+from src.settings import project_settings
 
 
 class OAuth2PasswordRequestFormEmail:
@@ -46,6 +47,47 @@ class UploadFileSchema(BaseModel):
     file_url: HttpUrl
 
 
+class BatchUploadFileSchema(BaseModel):
+    file_urls: list[HttpUrl] = Field(
+        min_length=1, max_length=project_settings.FILE_BATCH_UPLOAD_MAX_SIZE
+    )
+
+
+class CreateUploadSessionSchema(BaseModel):
+    filename: str
+    size: int = Field(ge=0, le=project_settings.UPLOAD_SESSION_MAX_SIZE)
+
+
+class BatchUploadItemSchema(BaseModel):
+    file_url: str
+    file_id: Optional[UUID] = None
+    error: Optional[str] = None
+
+
+class BatchUploadResultSchema(BaseModel):
+    started: int
+    conflicts: int
+    files: list[BatchUploadItemSchema]
+
+
+class BatchDeleteFileSchema(BaseModel):
+    file_ids: list[UUID] = Field(
+        min_length=1, max_length=project_settings.FILE_BATCH_DELETE_MAX_SIZE
+    )
+
+
+class BatchDeleteResultSchema(BaseModel):
+    deleted: list[UUID]
+    not_found: list[UUID]
+
+
+class StorageUsageSchema(BaseModel):
+    file_count: int
+    total_bytes: int
+    quota_bytes: Optional[int] = None
+    file_count_quota: Optional[int] = None
+
+
 class BasicFileInfoSchema(BaseModel):
     file_id: UUID
     filename: str
@@ -53,11 +95,30 @@ class BasicFileInfoSchema(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class FileListSchema(BaseModel):
+    files: list[BasicFileInfoSchema]
+    next_cursor: Optional[str] = None
+
+
 class FileInfoSchema(BaseModel):
     file_id: UUID
     filename: str
     uploaded_at: datetime
     size: int
+    status: str
 
     model_config = ConfigDict(from_attributes=True)
 
+
+class FileStatusSchema(BaseModel):
+    file_id: UUID
+    status: str
+    bytes_received: int
+    total_bytes: Optional[int] = None
+    rate: float
+
+
+
+class SignedDownloadUrlSchema(BaseModel):
+    url: str
+    expires_at: datetime
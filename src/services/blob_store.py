@@ -0,0 +1,276 @@
+import hashlib
+import os
+import zlib
+from typing import Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Result, Row, delete, func, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.database.models import Blob, File, FileStatus
+from src.services import file_ops
+from src.services.storage import StorageBackend, storage_backend
+from src.services.usage import change_usage
+from src.services.volumes import VolumeSet, volume_set
+from src.settings import project_settings
+
+
+class BlobStore:
+    """
+    Хранилище содержимого файлов, адресуемого по SHA-256
+
+    Одинаковое содержимое, загруженное разными пользователями, хранится
+    один раз в storage_backend под ключом blobs/<хеш> (с разбиением по первым
+    символам хеша), а записи File ссылаются на общую запись Blob со счетчиком
+    ссылок. Когда счетчик становится равным нулю, запись и объект содержимого удаляются
+
+    Если настроены тома STORAGE_VOLUMES, содержимое размещается на одном из них
+    (см. VolumeSet), а выбранный том записывается в Blob.volume и дублируется
+    в File.volume
+    """
+
+    BLOBS_DIR_NAME: str = "blobs"
+    HASH_CHUNK_SIZE: int = 1024 * 1024
+
+    def __init__(self, db_session: AsyncSession) -> None:
+        self.db_session: AsyncSession = db_session
+
+    @classmethod
+    def get_blob_key(cls, sha256: str) -> str:
+        return "/".join((cls.BLOBS_DIR_NAME, sha256[:2], sha256[2:4], sha256))
+
+    @classmethod
+    def get_blob_path(cls, sha256: str) -> str:
+        """Путь к содержимому при хранении в локальной файловой системе"""
+
+        return os.path.join(project_settings.UPLOADS_DIR, cls.get_blob_key(sha256))
+
+    @staticmethod
+    def get_storage(volume: Optional[str]) -> StorageBackend:
+        """Хранилище содержимого, размещенного на томе volume"""
+
+        if volume is None or volume_set is None:
+            return storage_backend
+        return volume_set.get_storage(volume)
+
+    @classmethod
+    def checksum_file(cls, file_path: str) -> tuple[str, int]:
+        """Считает SHA-256 и CRC-32 файла за один проход"""
+
+        hasher = hashlib.sha256()
+        crc32: int = 0
+        with open(file_path, "rb") as file:
+            while chunk := file.read(cls.HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+                crc32 = zlib.crc32(chunk, crc32)
+        return hasher.hexdigest(), crc32
+
+    async def store(
+            self,
+            file_id: UUID,
+            staging_path: str,
+            sha256: str,
+            size: int,
+            crc32: Optional[int] = None
+    ) -> bool:
+        """
+        Переносит полностью записанный файл staging_path в хранилище и привязывает
+        его к записи File. Если такое содержимое уже хранится, файл staging_path
+        удаляется, а счетчик ссылок увеличивается
+
+        CRC-32 содержимого сохраняется, чтобы при сборке ZIP-архивов не читать
+        файл повторно
+
+        Объект хранилища адресуется хешем содержимого, поэтому его повторная запись
+        безопасна: новое содержимое сохраняется в хранилище до начала транзакции
+        (для S3 это может быть долгая multipart-загрузка), а в транзакции только
+        обновляются строки Blob и File. Если запись Blob создана заново, наличие
+        объекта проверяется под блокировкой строки, так как параллельный release
+        мог удалить его после сохранения, и при необходимости объект записывается
+        еще раз. Файл staging_path удаляется после фиксации транзакции. В той же
+        транзакции файл учитывается в счетчиках UserUsage пользователя
+
+        Объект, сохраненный для записи File, удаленной до начала транзакции,
+        остается без записи Blob и удаляется сверкой файлов (reconcile_files)
+
+        Если запись File уже завершена с тем же содержимым (повторное завершение
+        той же загрузки), счетчик ссылок не меняется, и удаляется только staging_path
+
+        Возвращает False, если запись File была удалена (или помечена удаленной)
+        до завершения загрузки
+        """
+
+        key: str = self.get_blob_key(sha256)
+        volume: Optional[str] = None
+        if volume_set is not None:
+            await volume_set.refresh_usage()
+            volume = volume_set.choose(key)
+
+        async with self.db_session.begin():
+            result: Result = await self.db_session.execute(select(Blob.volume).filter_by(sha256=sha256))
+            uploaded: bool = result.first() is None
+
+        try:
+            if uploaded:
+                await self.get_storage(volume).put_file(key=key, source_path=staging_path, keep_source=True)
+
+            async with self.db_session.begin():
+                result = await self.db_session.execute(
+                    select(File.user_id, File.status, File.blob_sha256)
+                    .filter_by(file_id=file_id, deleted_at=None)
+                    .with_for_update()
+                )
+                file: Optional[Row] = result.first()
+                if file is None:
+                    return False
+                if file.status == FileStatus.COMPLETED.value and file.blob_sha256 == sha256:
+                    return True
+
+                statement = insert(Blob).values(
+                    sha256=sha256, size=size, crc32=crc32, ref_count=1, volume=volume
+                )
+                result = await self.db_session.execute(
+                    statement
+                    .on_conflict_do_update(
+                        index_elements=[Blob.sha256],
+                        set_={
+                            "ref_count": Blob.ref_count + 1,
+                            "crc32": func.coalesce(Blob.crc32, statement.excluded.crc32),
+                        },
+                    )
+                    .returning(literal_column("xmax = 0"), Blob.volume)
+                )
+                is_new_blob, volume = result.one()
+
+                if is_new_blob:
+                    storage: StorageBackend = self.get_storage(volume)
+                    if not uploaded or await storage.stat(key=key) is None:
+                        await storage.put_file(key=key, source_path=staging_path, keep_source=True)
+
+                await self.db_session.execute(
+                    update(File)
+                    .filter_by(file_id=file_id)
+                    .values(
+                        blob_sha256=sha256,
+                        size=size,
+                        downloaded_bytes=size,
+                        status=FileStatus.COMPLETED.value,
+                        volume=volume,
+                    )
+                )
+                if file.status != FileStatus.COMPLETED.value:
+                    await change_usage(self.db_session, {file.user_id: (1, size)})
+                return True
+        finally:
+            await file_ops.remove_if_exists(staging_path)
+
+
+    async def release(self, sha256: str) -> None:
+        """
+        Уменьшает счетчик ссылок на содержимое и удаляет его, если ссылок не осталось.
+        Должен вызываться внутри уже открытой транзакции: файл содержимого удаляется
+        до ее завершения, пока строка Blob заблокирована
+        """
+
+        result: Result = await self.db_session.execute(
+            update(Blob)
+            .filter_by(sha256=sha256)
+            .values(ref_count=Blob.ref_count - 1)
+            .returning(Blob.ref_count, Blob.volume)
+        )
+        blob: Optional[Row] = result.first()
+
+        if blob is not None and blob.ref_count <= 0:
+            await self.db_session.execute(delete(Blob).filter_by(sha256=sha256))
+            await self.get_storage(blob.volume).delete(key=self.get_blob_key(sha256))
+
+
+async def rebalance_blobs(
+        session_factory: async_sessionmaker,
+        volumes: VolumeSet,
+        batch_size: int,
+        threshold: float,
+        after: Optional[str] = None
+) -> tuple[int, Optional[str]]:
+    """
+    Проверяет до batch_size записей Blob с хешем больше after и переносит на другие
+    тома содержимое, размещение которого не соответствует текущему выбору
+    VolumeSet (см. VolumeSet.get_rebalance_target)
+
+    Содержимое копируется на новый том во временный файл вне транзакции. Затем
+    строка Blob блокируется, и если объект за это время не был удален или перенесен,
+    временный файл переименовывается, а том обновляется в Blob и File. Копия на
+    старом томе удаляется после фиксации транзакции: до этого момента читатели
+    находят объект на старом томе, после - на новом
+
+    Возвращает число перенесенных объектов и хеш, с которого нужно продолжить
+    проверку, или None, если проверены все записи
+    """
+
+    await volumes.refresh_usage()
+    query = select(Blob.sha256, Blob.volume).order_by(Blob.sha256).limit(batch_size)
+    if after is not None:
+        query = query.where(Blob.sha256 > after)
+
+    async with session_factory() as session:
+        async with session.begin():
+            result: Result = await session.execute(query)
+            blobs: Sequence[Row] = result.all()
+
+    moved: int = 0
+    for blob in blobs:
+        target: Optional[str] = volumes.get_rebalance_target(
+            key=BlobStore.get_blob_key(blob.sha256), volume=blob.volume, threshold=threshold
+        )
+        if target is not None and await _move_blob(session_factory, volumes, blob.sha256, blob.volume, target):
+            moved += 1
+
+    next_after: Optional[str] = blobs[-1].sha256 if len(blobs) == batch_size else None
+    return moved, next_after
+
+
+async def _move_blob(
+        session_factory: async_sessionmaker,
+        volumes: VolumeSet,
+        sha256: str,
+        volume: Optional[str],
+        target: str
+) -> bool:
+    key: str = BlobStore.get_blob_key(sha256)
+    source_path: Optional[str] = BlobStore.get_storage(volume).get_local_path(key)
+    if source_path is None:
+        return False
+
+    target_path: str = volumes.backends[target].get_local_path(key)
+    same_path: bool = os.path.realpath(source_path) == os.path.realpath(target_path)
+    temporary_path: str = f"{target_path}.{os.getpid()}.rebalance"
+    if not same_path:
+        try:
+            await file_ops.run(file_ops.copy_file, source_path, temporary_path)
+        except FileNotFoundError:
+            await file_ops.remove_if_exists(temporary_path)
+            return False
+        except BaseException:
+            await file_ops.remove_if_exists(temporary_path)
+            raise
+
+    async with session_factory() as session:
+        async with session.begin():
+            result: Result = await session.execute(
+                select(Blob.volume).filter_by(sha256=sha256).with_for_update()
+            )
+            blob: Optional[Row] = result.first()
+            if blob is None or blob.volume != volume:
+                if not same_path:
+                    await file_ops.remove_if_exists(temporary_path)
+                return False
+
+            if not same_path:
+                await file_ops.run(os.replace, temporary_path, target_path)
+            await session.execute(update(Blob).filter_by(sha256=sha256).values(volume=target))
+            await session.execute(update(File).filter_by(blob_sha256=sha256).values(volume=target))
+
+    if not same_path:
+        await file_ops.remove_if_exists(source_path)
+    return True
@@ -0,0 +1,213 @@
+import json
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+from uuid import UUID
+
+from redis import RedisError
+from redis.asyncio import Redis
+
+from src.database.models import User
+from src.settings import project_settings
+
+
+class UserCache:
+    """
+    Ограниченный по размеру и времени жизни записей (LRU + TTL) кеш
+    аутентифицированных пользователей, ключом которого является subject токена
+    (электронная почта пользователя)
+
+    Первый уровень кеша хранится в памяти процесса. Если передан redis_url,
+    используется второй, общий для всех процессов уровень в Redis. Хеш пароля
+    в кеше не хранится
+
+    При изменении или удалении пользователя необходимо вызывать метод invalidate
+    """
+
+    REDIS_KEY_PREFIX: str = "user_cache:"
+
+    def __init__(self, max_size: int, ttl_seconds: int, redis_url: Optional[str] = None) -> None:
+        self.max_size: int = max_size
+        self.ttl_seconds: int = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._redis: Optional[Redis] = Redis.from_url(redis_url) if redis_url else None
+
+        self.hits: int = 0
+        self.redis_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    async def get(self, email: str) -> Optional[User]:
+        entry: Optional[tuple[float, dict]] = self._entries.get(email)
+        if entry is not None:
+            expires_at, user_data = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(email)
+                self.hits += 1
+                return self._build_user(user_data)
+            del self._entries[email]
+
+        if self._redis is not None:
+            try:
+                raw_user_data: Optional[bytes] = await self._redis.get(
+                    self.REDIS_KEY_PREFIX + email
+                )
+            except RedisError:
+                raw_user_data = None
+
+            if raw_user_data is not None:
+                user_data: dict = json.loads(raw_user_data)
+                self._store_locally(email=email, user_data=user_data)
+                self.redis_hits += 1
+                return self._build_user(user_data)
+
+        self.misses += 1
+        return None
+
+    async def set(self, user: User) -> None:
+        user_data: dict = {
+            "user_id": str(user.user_id),
+            "email": user.email,
+            "username": user.username,
+            "birthdate": user.birthdate.isoformat(),
+            "phone_number": user.phone_number,
+        }
+        self._store_locally(email=user.email, user_data=user_data)
+
+        if self._redis is not None:
+            try:
+                await self._redis.set(
+                    self.REDIS_KEY_PREFIX + user.email,
+                    json.dumps(user_data),
+                    ex=self.ttl_seconds,
+                )
+            except RedisError:
+                pass
+
+    async def invalidate(self, email: str) -> None:
+        self._entries.pop(email, None)
+
+        if self._redis is not None:
+            try:
+                await self._redis.delete(self.REDIS_KEY_PREFIX + email)
+            except RedisError:
+                pass
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _store_locally(self, email: str, user_data: dict) -> None:
+        self._entries[email] = (time.monotonic() + self.ttl_seconds, user_data)
+        self._entries.move_to_end(email)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _build_user(user_data: dict) -> User:
+        return User(
+            user_id=UUID(user_data["user_id"]),
+            email=user_data["email"],
+            username=user_data["username"],
+            birthdate=date.fromisoformat(user_data["birthdate"]),
+            phone_number=user_data["phone_number"],
+        )
+
+
+class FileContentCache:
+    """
+    Ограниченный по суммарному размеру содержимого (LRU) кеш небольших файлов,
+    позволяющий отдавать часто скачиваемые файлы из памяти процесса без чтения с диска
+
+    Содержимое хранится под ключом файла вместе с его версией (размер, время
+    изменения и хеш содержимого). Если версия файла изменилась, запись считается
+    устаревшей и заменяется при следующем чтении. Файлы больше max_file_size
+    не кешируются
+
+    При удалении файла необходимо вызывать метод invalidate
+    """
+
+    def __init__(self, max_bytes: int, max_file_size: int) -> None:
+        self.max_bytes: int = max_bytes
+        self.max_file_size: int = max_file_size
+        self._entries: OrderedDict[str, tuple[tuple, bytes]] = OrderedDict()
+        self.size_bytes: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def is_cacheable(self, size: int) -> bool:
+        return size <= min(self.max_file_size, self.max_bytes)
+
+    def get(self, key: str, version: tuple) -> Optional[bytes]:
+        entry: Optional[tuple[tuple, bytes]] = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        return None
+
+    def set(self, key: str, version: tuple, content: bytes) -> None:
+        if not self.is_cacheable(len(content)):
+            return
+
+        self.invalidate(key)
+        self._entries[key] = (version, content)
+        self.size_bytes += len(content)
+
+        while self.size_bytes > self.max_bytes:
+            _, (_, evicted_content) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted_content)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        entry: Optional[tuple[tuple, bytes]] = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    @property
+    def stats(self) -> dict[str, float]:
+        requests: int = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+user_cache: UserCache = UserCache(
+    max_size=project_settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=project_settings.USER_CACHE_TTL_SECONDS,
+    redis_url=project_settings.REDIS_URL if project_settings.USER_CACHE_REDIS_ENABLED else None,
+)
+
+file_content_cache: FileContentCache = FileContentCache(
+    max_bytes=project_settings.FILE_CONTENT_CACHE_MAX_BYTES,
+    max_file_size=project_settings.FILE_CONTENT_CACHE_MAX_FILE_SIZE,
+)
@@ -1,11 +1,16 @@
-from datetime import date
-from typing import Optional
+import asyncio
+from datetime import date, datetime
+from typing import Optional, Sequence
 from uuid import UUID
 
-from sqlalchemy import select, Result
+from sqlalchemy import delete, func, select, update, case, Result, Row, tuple_
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.database.models import User, File
+from src.database.models import User, File, FileStatus, Blob, UserUsage
+from src.services import file_ops
+from src.services.blob_store import BlobStore
+from src.services.usage import change_usage, sum_usage
 
 
 class BaseDAL:
@@ -49,37 +54,201 @@ class UserDAL(BaseDAL):
 
             return new_user
 
+    async def get_usage(self, user: User) -> tuple[int, int]:
+        """Количество и суммарный размер файлов пользователя по счетчикам UserUsage"""
+
+        async with self.db_session.begin():
+            result: Result = await self.db_session.execute(
+                select(UserUsage.file_count, UserUsage.total_bytes).filter_by(user_id=user.user_id)
+            )
+            usage: Optional[Row] = result.first()
+            return (usage.file_count, usage.total_bytes) if usage is not None else (0, 0)
+
 
 class FileDAL(BaseDAL):
     """DAL класс для работы с данными файлов"""
 
-    async def add_file(self, filename: str, file_path: str, user_id: UUID) -> UUID:
+    async def add_file(
+            self,
+            filename: str,
+            file_path: str,
+            user_id: UUID,
+            source_url: Optional[str] = None,
+            status: FileStatus = FileStatus.PENDING
+    ) -> UUID:
         async with self.db_session.begin():
             new_file: File = File(
                 filename=filename,
                 file_path=file_path,
-                user_id=user_id
+                user_id=user_id,
+                source_url=source_url,
+                status=status.value
             )
             self.db_session.add(new_file)
             await self.db_session.flush()
 
             return new_file.file_id
 
-    async def get_list_of_files(self, user: User) -> list[File]:
+    async def add_files(self, files: list[dict], batch_size: int) -> dict[str, UUID]:
+        """
+        Добавляет файлы многострочными INSERT (не более batch_size строк в каждом)
+        в одной транзакции. Файлы, название или путь которых уже заняты, пропускаются
+
+        Возвращает словарь, сопоставляющий путям добавленных файлов их id
+        """
+
+        added_files: dict[str, UUID] = {}
         async with self.db_session.begin():
-            result: Result = await self.db_session.execute(
-                select(File).filter_by(user_id=user.user_id)
+            for start in range(0, len(files), batch_size):
+                result: Result = await self.db_session.execute(
+                    insert(File)
+                    .values(files[start:start + batch_size])
+                    .on_conflict_do_nothing()
+                    .returning(File.file_path, File.file_id)
+                )
+                added_files.update(result.tuples().all())
+
+        return added_files
+
+    async def set_file_status(self, file_id: UUID, status: FileStatus) -> None:
+        async with self.db_session.begin():
+            await self.db_session.execute(
+                update(File).filter_by(file_id=file_id).values(status=status.value)
+            )
+
+    async def get_list_of_files(
+            self,
+            user: User,
+            limit: int,
+            after: Optional[tuple[datetime, UUID]] = None
+    ) -> Sequence[Row]:
+        query = (
+            select(File.file_id, File.filename, File.uploaded_at)
+            .where(File.user_id == user.user_id, File.deleted_at.is_(None))
+            .order_by(File.uploaded_at, File.file_id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(tuple_(File.uploaded_at, File.file_id) > after)
+
+        async with self.db_session.begin():
+            result: Result = await self.db_session.execute(query)
+            return result.all()
+
+    async def get_files_for_archive(
+            self,
+            user: User,
+            file_ids: Optional[list[UUID]] = None
+    ) -> Sequence[Row]:
+        """
+        Возвращает загруженные файлы пользователя (все или только с указанными id)
+        вместе с размером и CRC-32 их содержимого, если они известны
+        """
+
+        query = (
+            select(
+                File.filename,
+                File.file_path,
+                File.blob_sha256,
+                File.volume,
+                File.uploaded_at,
+                Blob.size.label("blob_size"),
+                Blob.crc32,
+            )
+            .outerjoin(Blob, Blob.sha256 == File.blob_sha256)
+            .where(
+                File.user_id == user.user_id,
+                File.status == FileStatus.COMPLETED.value,
+                File.deleted_at.is_(None),
             )
-            return result.scalars().all()
+            .order_by(File.uploaded_at, File.file_id)
+        )
+        if file_ids is not None:
+            query = query.where(File.file_id.in_(file_ids))
+
+        async with self.db_session.begin():
+            result: Result = await self.db_session.execute(query)
+            return result.all()
 
     async def get_file_by_id(self, file_id: UUID, user: User) -> Optional[File]:
         async with self.db_session.begin():
             result: Result = await self.db_session.execute(
-                select(File).filter_by(file_id=file_id, user_id=user.user_id)
+                select(File).filter_by(file_id=file_id, user_id=user.user_id, deleted_at=None)
             )
             return result.scalars().first()
 
-    async def delete_file(self, file: File) -> None:
+    async def delete_files(self, user: User, file_ids: list[UUID]) -> list[UUID]:
+        """
+        Помечает файлы пользователя удаленными одним UPDATE и возвращает id
+        помеченных файлов. Содержимое и сами записи удаляются позже (purge_deleted_files)
+
+        Путь файла, содержимое которого уже перенесено в хранилище содержимого,
+        освобождается сразу (к нему добавляется суффикс), чтобы файл с тем же
+        названием можно было загрузить снова. Пути остальных файлов остаются
+        занятыми до очистки, иначе очистка удалила бы файл новой загрузки
+
+        Завершенные файлы в той же транзакции вычитаются из счетчиков UserUsage
+        """
+
+        async with self.db_session.begin():
+            result: Result = await self.db_session.execute(
+                update(File)
+                .where(
+                    File.user_id == user.user_id,
+                    File.file_id.in_(file_ids),
+                    File.deleted_at.is_(None),
+                )
+                .values(
+                    deleted_at=func.timezone("utc", func.now()),
+                    file_path=case(
+                        (
+                            (File.status == FileStatus.COMPLETED.value) & File.blob_sha256.is_not(None),
+                            func.concat(File.file_path, "#deleted-", File.file_id),
+                        ),
+                        else_=File.file_path,
+                    ),
+                )
+                .returning(File.file_id, File.user_id, File.status, File.size)
+            )
+            files: Sequence[Row] = result.all()
+            await change_usage(self.db_session, sum_usage(
+                (file for file in files if file.status == FileStatus.COMPLETED.value), sign=-1
+            ))
+            return [file.file_id for file in files]
+
+    async def purge_deleted_files(self, limit: int) -> int:
+        """
+        Окончательно удаляет до limit файлов, помеченных удаленными: удаляет с диска
+        файлы, содержимое которых не перенесено в хранилище содержимого, освобождает
+        ссылки на содержимое и удаляет записи. Файлы удаляются внутри транзакции,
+        пока записи (и их пути) заблокированы
+
+        Возвращает количество удаленных записей
+        """
+
         async with self.db_session.begin():
-            await self.db_session.delete(file)
+            result: Result = await self.db_session.execute(
+                select(File.file_id, File.file_path, File.blob_sha256)
+                .where(File.deleted_at.is_not(None))
+                .order_by(File.deleted_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            files: Sequence[Row] = result.all()
+            if not files:
+                return 0
+
+            await asyncio.gather(*(
+                file_ops.remove_if_exists(file.file_path)
+                for file in files if file.blob_sha256 is None
+            ))
+            await self.db_session.execute(
+                delete(File).where(File.file_id.in_([file.file_id for file in files]))
+            )
+
+            blob_store: BlobStore = BlobStore(db_session=self.db_session)
+            for sha256 in sorted(file.blob_sha256 for file in files if file.blob_sha256 is not None):
+                await blob_store.release(sha256=sha256)
+
+        return len(files)
 
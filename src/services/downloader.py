@@ -0,0 +1,358 @@
+import asyncio
+import hashlib
+import os
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, BinaryIO, Callable, Optional
+
+import httpx
+
+
+@dataclass
+class DownloadState:
+    """
+    Состояние загрузки файла, сохраняемое между попытками: количество байт,
+    гарантированно записанных на диск, и валидаторы версии файла на источнике
+
+    sha256 и crc32 заполняются, только если файл был загружен одним потоком
+    с самого начала и их удалось посчитать во время записи
+    """
+
+    downloaded_bytes: int = 0
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    sha256: Optional[str] = None
+    crc32: Optional[int] = None
+
+    @property
+    def validator(self) -> Optional[str]:
+        if self.etag is not None and not self.etag.startswith("W/"):
+            return self.etag
+        return self.last_modified
+
+
+CheckpointCallback = Callable[[DownloadState], Awaitable[None]]
+ProgressCallback = Callable[[int, Optional[int]], Awaitable[None]]
+
+
+class RangeNotHonouredError(Exception):
+    """Исключение, возникающее, если источник не вернул запрошенный диапазон байт"""
+
+
+class Downloader:
+    """
+    Асинхронный загрузчик файлов для воркера
+
+    Использует один долгоживущий HTTP-клиент (и, соответственно, пул соединений)
+    на процесс и ограничивает количество одновременно выполняемых загрузок
+    значением max_concurrency. Запись на диск выносится из event loop'а, чтобы
+    медленный диск не останавливал остальные загрузки
+
+    Прогресс загрузки периодически сохраняется через on_checkpoint, что позволяет
+    при повторной попытке продолжить загрузку запросом с заголовком Range. Если
+    файл на источнике изменился (If-Range не совпал), источник возвращает файл
+    целиком и загрузка начинается заново
+
+    Файлы размером не меньше segment_threshold, источник которых поддерживает
+    запросы диапазонов, загружаются параллельно segments частями, каждая из которых
+    записывается в заранее выделенный файл по своему смещению и при обрыве
+    соединения повторяется независимо от остальных
+
+    После записи каждого блока вызывается on_progress с количеством полученных
+    байт и ожидаемым размером файла (если он известен), поэтому вызываемая
+    функция должна быть дешевой и сама ограничивать частоту публикации прогресса
+    """
+
+    def __init__(
+            self,
+            max_concurrency: int,
+            chunk_size: int,
+            checkpoint_interval: int = 64 * 1024 * 1024,
+            segments: int = 1,
+            segment_threshold: int = 64 * 1024 * 1024,
+            segment_retries: int = 3,
+            client: Optional[httpx.AsyncClient] = None
+    ) -> None:
+        self.chunk_size: int = chunk_size
+        self.checkpoint_interval: int = checkpoint_interval
+        self.segments: int = segments
+        self.segment_threshold: int = segment_threshold
+        self.segment_retries: int = segment_retries
+        self.client: httpx.AsyncClient = client or httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=httpx.Timeout(connect=10, read=60, write=60, pool=None),
+            limits=httpx.Limits(max_connections=max_concurrency * max(segments, 1)),
+        )
+        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def download(
+            self,
+            file_url: str,
+            file_path: str,
+            state: Optional[DownloadState] = None,
+            on_checkpoint: Optional[CheckpointCallback] = None,
+            on_progress: Optional[ProgressCallback] = None
+    ) -> DownloadState:
+        state = state or DownloadState()
+        resume_from: int = await asyncio.to_thread(
+            self._get_resumable_offset, file_path, state
+        )
+
+        async with self._semaphore:
+            if resume_from == 0 and self.segments > 1:
+                remote_file: Optional[tuple[int, DownloadState]] = await self._probe(file_url)
+                if remote_file is not None:
+                    size, remote_state = remote_file
+                    try:
+                        return await self._download_segmented(
+                            file_url, file_path, size, remote_state, on_checkpoint, on_progress
+                        )
+                    except RangeNotHonouredError:
+                        pass
+
+            return await self._download_stream(
+                file_url, file_path, state, resume_from, on_checkpoint, on_progress
+            )
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+    async def _download_stream(
+            self,
+            file_url: str,
+            file_path: str,
+            state: DownloadState,
+            resume_from: int,
+            on_checkpoint: Optional[CheckpointCallback],
+            on_progress: Optional[ProgressCallback]
+    ) -> DownloadState:
+        while True:
+            headers: dict[str, str] = {}
+            if resume_from > 0:
+                headers = {"Range": f"bytes={resume_from}-", "If-Range": state.validator}
+
+            async with self.client.stream("GET", file_url, headers=headers) as response:
+                if resume_from > 0 and not self._can_resume(response, resume_from):
+                    resume_from = 0
+                    continue
+                response.raise_for_status()
+
+                if response.status_code != httpx.codes.PARTIAL_CONTENT:
+                    resume_from = 0
+
+                new_state: DownloadState = DownloadState(
+                    downloaded_bytes=resume_from,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
+                content_length: str = response.headers.get("Content-Length", "")
+                total_bytes: Optional[int] = (
+                    resume_from + int(content_length) if content_length.isdigit() else None
+                )
+                return await self._write_body(
+                    response, file_path, new_state, total_bytes, on_checkpoint, on_progress
+                )
+
+    async def _probe(self, file_url: str) -> Optional[tuple[int, DownloadState]]:
+        try:
+            response: httpx.Response = await self.client.head(file_url)
+        except httpx.HTTPError:
+            return None
+
+        content_length: str = response.headers.get("Content-Length", "")
+        if (
+                not response.is_success
+                or response.headers.get("Accept-Ranges", "").lower() != "bytes"
+                or not content_length.isdigit()
+                or int(content_length) < self.segment_threshold
+        ):
+            return None
+
+        return int(content_length), DownloadState(
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+    async def _download_segmented(
+            self,
+            file_url: str,
+            file_path: str,
+            size: int,
+            state: DownloadState,
+            on_checkpoint: Optional[CheckpointCallback],
+            on_progress: Optional[ProgressCallback]
+    ) -> DownloadState:
+        file_descriptor: int = await asyncio.to_thread(self._preallocate, file_path, size)
+        received: int = 0
+
+        async def on_chunk(chunk_size: int) -> None:
+            nonlocal received
+            received += chunk_size
+            if on_progress is not None:
+                await on_progress(received, size)
+
+        try:
+            if on_checkpoint is not None:
+                await on_checkpoint(state)
+
+            segment_size: int = -(-size // self.segments)
+            tasks: list[asyncio.Task] = [
+                asyncio.create_task(self._download_segment(
+                    file_url,
+                    file_descriptor,
+                    start,
+                    min(start + segment_size, size) - 1,
+                    state,
+                    on_chunk,
+                ))
+                for start in range(0, size, segment_size)
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            await asyncio.to_thread(os.fsync, file_descriptor)
+        finally:
+            await asyncio.to_thread(os.close, file_descriptor)
+
+        state.downloaded_bytes = size
+        return state
+
+    async def _download_segment(
+            self,
+            file_url: str,
+            file_descriptor: int,
+            start: int,
+            end: int,
+            state: DownloadState,
+            on_chunk: Callable[[int], Awaitable[None]]
+    ) -> None:
+        offset: int = start
+        attempt: int = 0
+
+        while offset <= end:
+            headers: dict[str, str] = {"Range": f"bytes={offset}-{end}"}
+            if state.validator is not None:
+                headers["If-Range"] = state.validator
+
+            try:
+                async with self.client.stream("GET", file_url, headers=headers) as response:
+                    if not (
+                            response.status_code == httpx.codes.PARTIAL_CONTENT
+                            and self._can_resume(response, offset)
+                    ):
+                        raise RangeNotHonouredError(file_url)
+
+                    async for chunk in response.aiter_bytes(chunk_size=self.chunk_size):
+                        chunk = chunk[:end - offset + 1]
+                        await asyncio.to_thread(os.pwrite, file_descriptor, chunk, offset)
+                        offset += len(chunk)
+                        await on_chunk(len(chunk))
+
+                if offset <= end:
+                    raise httpx.ReadError(f"Segment ended at {offset}, expected {end + 1}")
+            except httpx.TransportError:
+                attempt += 1
+                if attempt > self.segment_retries:
+                    raise
+                await asyncio.sleep(min(0.1 * 2 ** attempt, 5))
+
+    async def _write_body(
+            self,
+            response: httpx.Response,
+            file_path: str,
+            state: DownloadState,
+            total_bytes: Optional[int],
+            on_checkpoint: Optional[CheckpointCallback],
+            on_progress: Optional[ProgressCallback]
+    ) -> DownloadState:
+        file: BinaryIO = await asyncio.to_thread(self._open_at, file_path, state.downloaded_bytes)
+        hasher = hashlib.sha256() if state.downloaded_bytes == 0 else None
+        crc32: int = 0
+        written: int = state.downloaded_bytes
+        last_checkpoint: int = written
+
+        async def checkpoint() -> None:
+            nonlocal last_checkpoint
+            await asyncio.to_thread(self._sync_to_disk, file)
+            state.downloaded_bytes = written
+            last_checkpoint = written
+            if on_checkpoint is not None:
+                await on_checkpoint(state)
+
+        try:
+            await checkpoint()
+            async for chunk in response.aiter_bytes(chunk_size=self.chunk_size):
+                crc32 = await asyncio.to_thread(self._write_chunk, file, chunk, hasher, crc32)
+                written += len(chunk)
+                if on_progress is not None:
+                    await on_progress(written, total_bytes)
+                if written - last_checkpoint >= self.checkpoint_interval:
+                    await checkpoint()
+        except httpx.TransportError:
+            await checkpoint()
+            raise
+        finally:
+            await asyncio.to_thread(file.close)
+
+        state.downloaded_bytes = written
+        state.sha256 = hasher.hexdigest() if hasher is not None else None
+        state.crc32 = crc32 if hasher is not None else None
+        return state
+
+    @staticmethod
+    def _get_resumable_offset(file_path: str, state: DownloadState) -> int:
+        if state.downloaded_bytes <= 0 or state.validator is None:
+            return 0
+        try:
+            return min(state.downloaded_bytes, os.path.getsize(file_path))
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _can_resume(response: httpx.Response, offset: int) -> bool:
+        if response.status_code == httpx.codes.REQUESTED_RANGE_NOT_SATISFIABLE:
+            return False
+        if response.status_code == httpx.codes.PARTIAL_CONTENT:
+            content_range: str = response.headers.get("Content-Range", "")
+            return content_range.startswith(f"bytes {offset}-")
+        return True
+
+    @staticmethod
+    def _preallocate(file_path: str, size: int) -> int:
+        file_descriptor: int = os.open(file_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(file_descriptor, size)
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(file_descriptor, 0, size)
+        except OSError:
+            os.close(file_descriptor)
+            raise
+        return file_descriptor
+
+    @staticmethod
+    def _open_at(file_path: str, offset: int) -> BinaryIO:
+        if offset == 0:
+            return open(file_path, "wb")
+
+        file: BinaryIO = open(file_path, "r+b")
+        file.truncate(offset)
+        file.seek(offset)
+        return file
+
+    @staticmethod
+    def _write_chunk(file: BinaryIO, chunk: bytes, hasher, crc32: int) -> int:
+        file.write(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+            crc32 = zlib.crc32(chunk, crc32)
+        return crc32
+
+    @staticmethod
+    def _sync_to_disk(file: BinaryIO) -> None:
+        file.flush()
+        os.fsync(file.fileno())
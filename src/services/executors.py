@@ -0,0 +1,58 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class ExecutorOverloadedError(Exception):
+    """Исключение, возникающее при переполнении очереди задач BoundedExecutor"""
+
+
+class BoundedExecutor:
+    """
+    Пул потоков для выноса блокирующих операций из event loop'а
+
+    Одновременно выполняется не более max_workers задач, еще не более max_queue
+    задач ожидают своей очереди. При превышении этого количества новые задачи
+    не ставятся в очередь, а возникает исключение ExecutorOverloadedError
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, name: str) -> None:
+        self.max_workers: int = max_workers
+        self.max_queue: int = max_queue
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._pending: int = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if self._pending >= self.max_workers + self.max_queue:
+            raise ExecutorOverloadedError("Too many pending tasks")
+
+        return await self.run_queued(func, *args, **kwargs)
+
+    async def run_queued(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Ставит задачу в очередь без проверки переполнения: задача ждет свободного
+        потока. Используется для операций уже начатых ответов (например, чтения
+        файла, заголовки ответа с которым уже отправлены), которые нельзя прервать
+        ошибкой 503. Такие задачи учитываются в pending, поэтому при переполнении
+        новые запросы по-прежнему отклоняются
+        """
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(func, *args, **kwargs)
+            )
+        finally:
+            self._pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
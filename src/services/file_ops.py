@@ -0,0 +1,90 @@
+import os
+import shutil
+import threading
+from typing import Any, Callable, Iterable, Optional, TypeVar
+
+from src.services.executors import BoundedExecutor
+from src.settings import project_settings
+
+T = TypeVar("T")
+
+
+file_ops_executor: BoundedExecutor = BoundedExecutor(
+    max_workers=project_settings.FILE_OPS_MAX_WORKERS,
+    max_queue=project_settings.FILE_OPS_MAX_QUEUE,
+    name="file-ops",
+)
+
+
+async def run(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполняет блокирующую операцию с файловой системой в пуле file_ops_executor,
+    не останавливая event loop. Количество потоков, занятых файловыми операциями,
+    ограничено, поэтому медленный диск не занимает пул потоков event loop'а по
+    умолчанию, а при переполнении очереди возникает ExecutorOverloadedError
+    """
+
+    return await file_ops_executor.run(func, *args, **kwargs)
+
+
+async def run_queued(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполняет операцию в пуле file_ops_executor, дожидаясь свободного потока
+    даже при переполненной очереди (см. BoundedExecutor.run_queued)
+    """
+
+    return await file_ops_executor.run_queued(func, *args, **kwargs)
+
+
+async def make_dirs(directories: Iterable[str]) -> None:
+    await run(make_dirs_sync, list(directories))
+
+
+async def remove_if_exists(file_path: str) -> bool:
+    return await run(remove_if_exists_sync, file_path)
+
+
+async def stat(file_path: str) -> Optional[os.stat_result]:
+    return await run(_stat, file_path)
+
+
+def make_dirs_sync(directories: Iterable[str]) -> None:
+    """
+    Блокирующие версии операций (с суффиксом _sync) предназначены для кода,
+    который уже выполняется в отдельном потоке или в собственном пуле потоков
+    (например, команды из src.commands)
+    """
+
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+
+
+def remove_if_exists_sync(file_path: str) -> bool:
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def copy_file(source_path: str, destination_path: str) -> None:
+    """
+    Копирует файл (в том числе на другую файловую систему) так, что по пути
+    destination_path файл появляется только полностью записанным
+    """
+
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    temporary_path: str = f"{destination_path}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        shutil.copyfile(source_path, temporary_path)
+        os.replace(temporary_path, destination_path)
+    except BaseException:
+        remove_if_exists_sync(temporary_path)
+        raise
+
+
+def _stat(file_path: str) -> Optional[os.stat_result]:
+    try:
+        return os.stat(file_path)
+    except FileNotFoundError:
+        return None
@@ -1,11 +1,20 @@
 from passlib.context import CryptContext
 
+from src.services.executors import BoundedExecutor
+from src.settings import project_settings
+
 
 pwd_context: CryptContext = CryptContext(
     schemes=["bcrypt"],
     deprecated="auto",
 )
 
+hashing_executor: BoundedExecutor = BoundedExecutor(
+    max_workers=project_settings.PASSWORD_HASHING_MAX_WORKERS,
+    max_queue=project_settings.PASSWORD_HASHING_MAX_QUEUE,
+    name="password-hashing",
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -13,3 +22,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hashing_executor.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await hashing_executor.run(get_password_hash, password)
@@ -0,0 +1,169 @@
+import time
+from typing import Optional
+
+from redis import RedisError
+from redis.asyncio import Redis
+
+from src.database.models import FileStatus
+from src.settings import project_settings
+
+
+class ProgressStore:
+    """
+    Хранилище статуса и прогресса загрузок файлов в Redis
+
+    Для каждого файла хранится хеш с владельцем, статусом, количеством полученных
+    байт, ожидаемым размером и скоростью загрузки. Запись обновляется воркером
+    не чаще, чем раз в UPLOAD_PROGRESS_PUBLISH_INTERVAL секунд, и удаляется
+    по истечении ttl_seconds с момента последнего обновления
+
+    Хранилище не является источником истины: при недоступности Redis ошибки
+    игнорируются, а итоговый статус загрузки всегда сохраняется в базе данных
+    """
+
+    REDIS_KEY_PREFIX: str = "upload_progress:"
+
+    def __init__(self, redis_url: str, ttl_seconds: int) -> None:
+        self.redis_url: str = redis_url
+        self.ttl_seconds: int = ttl_seconds
+        self._redis: Optional[Redis] = None
+
+    async def start(self, file_id: str, user_id: str) -> None:
+        await self.start_many(file_ids=[file_id], user_id=user_id)
+
+    async def start_many(self, file_ids: list[str], user_id: str) -> None:
+        try:
+            async with self._get_redis().pipeline(transaction=False) as pipeline:
+                for file_id in file_ids:
+                    key: str = self.REDIS_KEY_PREFIX + file_id
+                    pipeline.hset(key, mapping={
+                        "user_id": user_id,
+                        "status": FileStatus.PENDING.value,
+                        "bytes_received": 0,
+                        "rate": 0,
+                    })
+                    pipeline.expire(key, self.ttl_seconds)
+                await pipeline.execute()
+        except RedisError:
+            pass
+
+    async def update(
+            self,
+            file_id: str,
+            status: FileStatus,
+            bytes_received: int,
+            total_bytes: Optional[int] = None,
+            rate: float = 0
+    ) -> None:
+        progress: dict = {
+            "status": status.value,
+            "bytes_received": bytes_received,
+            "rate": round(rate, 2),
+        }
+        if total_bytes is not None:
+            progress["total_bytes"] = total_bytes
+        await self._publish(file_id, progress)
+
+    async def get(self, file_id: str) -> Optional[dict]:
+        try:
+            progress: dict[bytes, bytes] = await self._get_redis().hgetall(
+                self.REDIS_KEY_PREFIX + file_id
+            )
+        except RedisError:
+            return None
+
+        if not progress:
+            return None
+
+        progress: dict[str, str] = {key.decode(): value.decode() for key, value in progress.items()}
+        total_bytes: Optional[str] = progress.get("total_bytes")
+        return {
+            "user_id": progress.get("user_id"),
+            "status": progress["status"],
+            "bytes_received": int(progress.get("bytes_received", 0)),
+            "total_bytes": int(total_bytes) if total_bytes is not None else None,
+            "rate": float(progress.get("rate", 0)),
+        }
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def _publish(self, file_id: str, progress: dict) -> None:
+        key: str = self.REDIS_KEY_PREFIX + file_id
+        try:
+            async with self._get_redis().pipeline(transaction=False) as pipeline:
+                pipeline.hset(key, mapping=progress)
+                pipeline.expire(key, self.ttl_seconds)
+                await pipeline.execute()
+        except RedisError:
+            pass
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+
+class ProgressReporter:
+    """
+    Публикует прогресс одной загрузки в ProgressStore, пропуская обновления,
+    пришедшие раньше, чем через interval секунд после предыдущей публикации.
+    Скорость загрузки считается по байтам, полученным с момента предыдущей публикации
+    """
+
+    def __init__(self, store: ProgressStore, file_id: str, interval: float) -> None:
+        self.store: ProgressStore = store
+        self.file_id: str = file_id
+        self.interval: float = interval
+        self.bytes_received: int = 0
+        self.total_bytes: Optional[int] = None
+        self._published_at: float = time.monotonic()
+        self._published_bytes: int = 0
+
+    async def start(self, bytes_received: int) -> None:
+        self.bytes_received = self._published_bytes = bytes_received
+        self._published_at = time.monotonic()
+        await self.store.update(
+            self.file_id, status=FileStatus.DOWNLOADING, bytes_received=bytes_received
+        )
+
+    async def update(self, bytes_received: int, total_bytes: Optional[int]) -> None:
+        self.bytes_received = bytes_received
+        self.total_bytes = total_bytes
+
+        now: float = time.monotonic()
+        elapsed: float = now - self._published_at
+        if elapsed < self.interval:
+            return
+
+        rate: float = max(bytes_received - self._published_bytes, 0) / elapsed
+        self._published_at = now
+        self._published_bytes = bytes_received
+        await self.store.update(
+            self.file_id,
+            status=FileStatus.DOWNLOADING,
+            bytes_received=bytes_received,
+            total_bytes=total_bytes,
+            rate=rate,
+        )
+
+    async def finish(self, status: FileStatus, bytes_received: Optional[int] = None) -> None:
+        if bytes_received is not None:
+            self.bytes_received = bytes_received
+        if status == FileStatus.COMPLETED:
+            self.total_bytes = self.bytes_received
+
+        await self.store.update(
+            self.file_id,
+            status=status,
+            bytes_received=self.bytes_received,
+            total_bytes=self.total_bytes,
+        )
+
+
+progress_store: ProgressStore = ProgressStore(
+    redis_url=project_settings.REDIS_URL,
+    ttl_seconds=project_settings.UPLOAD_PROGRESS_TTL_SECONDS,
+)
@@ -1,3 +1,10 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import time
 from datetime import datetime
 from datetime import timedelta
 from typing import Optional
@@ -30,3 +37,82 @@ def get_email_from_jwt_token(token: str) -> Optional[str]:
     )
     email: str = payload.get("sub", None)
     return email
+
+
+class InvalidDownloadTokenError(Exception):
+    """Исключение, возникающее, если подпись ссылки на скачивание неверна или срок ее действия истек"""
+
+
+def create_download_token(
+        file_id: str,
+        storage_key: str,
+        filename: str,
+        content_hash: Optional[str],
+        expires_at: int,
+        volume: Optional[str] = None
+) -> str:
+    """
+    Создает токен ссылки на скачивание: данные файла (ключ его содержимого
+    в хранилище и том, на котором оно размещено) и время истечения, подписанные
+    HMAC-SHA256 с ключом SECRET_KEY
+    """
+
+    payload: bytes = json.dumps(
+        {
+            "f": file_id,
+            "p": storage_key,
+            "n": filename,
+            "h": content_hash,
+            "v": volume,
+            "e": expires_at,
+        },
+        separators=(",", ":"),
+    ).encode()
+    encoded_payload: str = _encode_base64(payload)
+    return f"{encoded_payload}.{_encode_base64(_sign(encoded_payload))}"
+
+
+def verify_download_token(token: str) -> dict:
+    """
+    Проверяет подпись и срок действия токена ссылки на скачивание без обращения
+    к базе данных и возвращает данные файла (file_id, storage_key, filename,
+    content_hash, volume)
+    """
+
+    encoded_payload, _, encoded_signature = token.partition(".")
+    try:
+        signature: bytes = _decode_base64(encoded_signature)
+    except (binascii.Error, ValueError):
+        raise InvalidDownloadTokenError("Invalid download signature")
+    if not hmac.compare_digest(signature, _sign(encoded_payload)):
+        raise InvalidDownloadTokenError("Invalid download signature")
+
+    payload: dict = json.loads(_decode_base64(encoded_payload))
+    if payload["e"] < time.time():
+        raise InvalidDownloadTokenError("Download link has expired")
+
+    storage_key: str = os.path.normpath(payload["p"])
+    if os.path.isabs(storage_key) or storage_key.startswith(os.pardir):
+        raise InvalidDownloadTokenError("Invalid download signature")
+
+    return {
+        "file_id": payload["f"],
+        "storage_key": storage_key,
+        "filename": payload["n"],
+        "content_hash": payload["h"],
+        "volume": payload.get("v"),
+    }
+
+
+def _sign(encoded_payload: str) -> bytes:
+    return hmac.new(
+        project_settings.SECRET_KEY.encode(), encoded_payload.encode(), hashlib.sha256
+    ).digest()
+
+
+def _encode_base64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _decode_base64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
@@ -1,19 +1,45 @@
+import base64
+import binascii
+import hashlib
 import os
-from datetime import timedelta, date
+import time
+import zlib
+from datetime import datetime, timedelta, timezone, date
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, BinaryIO, Optional, Sequence
 from urllib.parse import urlparse
 from uuid import UUID
 
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.worker import download_file_to_server
-from src.database.models import User, File
-from src.services import security, hashing
+from src.worker import download_file_to_server, download_files_to_server
+from src.database.models import User, File, FileStatus
+from src.services import file_ops, security, hashing
+from src.services.blob_store import BlobStore
+from src.services.cache import file_content_cache, user_cache
 from src.services.dals import UserDAL, FileDAL
+from src.services.progress import ProgressReporter, progress_store
+from src.services.upload_sessions import (
+    UploadSession,
+    UploadSessionNotFoundError,
+    preallocate_file,
+    upload_session_store,
+)
+from src.services.storage import ObjectStat, StorageBackend, local_storage_backend
+from src.services.volumes import VolumeStorageBackend
+from src.services.zip_stream import ZipEntry
 from src.settings import project_settings
 
 
+class FileNotReadyError(Exception):
+    """Исключение, возникающее при обращении к содержимому еще не загруженного файла"""
+
+
+class StorageQuotaExceededError(Exception):
+    """Исключение, возникающее при загрузке файла сверх квоты пользователя"""
+
+
 class BaseService:
     """
     Базовый класс для всех сервисов в проекте (то есть классов,
@@ -41,10 +67,11 @@ class AuthService(BaseService):
         new_user: User = await self.user_dal.create_user(
             email=email,
             username=username,
-            password=hashing.get_password_hash(password),
+            password=await hashing.get_password_hash_async(password),
             phone_number=phone_number,
             birthdate=birthdate
         )
+        await user_cache.invalidate(email=email)
 
         return new_user
 
@@ -54,7 +81,7 @@ class AuthService(BaseService):
         if user is None:
             raise ValueError("User does not exist")
 
-        if not hashing.verify_password(
+        if not await hashing.verify_password_async(
                 hashed_password=user.hashed_password, plain_password=password
         ):
             raise ValueError("Passwords do not match")
@@ -97,15 +124,19 @@ class FileService(BaseService):
         self.file_dal: FileDAL = FileDAL(db_session=db_session)
 
     async def upload_file(self, user: User, file_url: str) -> None:
+        await self.check_quota(user=user)
+
         user_id: UUID = user.user_id
         filename: str = self.extract_filename_from_url(file_url=file_url)
-        file_path: str = self.generate_file_path(str(user_id), filename)
+        file_path: str = await self.generate_file_path(str(user_id), filename)
 
         file_id: UUID = await self.file_dal.add_file(
             filename=filename,
             file_path=file_path,
             user_id=user_id,
+            source_url=file_url,
         )
+        await progress_store.start(file_id=str(file_id), user_id=str(user_id))
 
         download_file_to_server.apply_async(kwargs={
             "file_url": file_url,
@@ -113,6 +144,321 @@ class FileService(BaseService):
             "file_path": file_path
         })
 
+    async def upload_files(self, user: User, file_urls: list[str]) -> list[dict]:
+        """
+        Добавляет все файлы пакета одной транзакцией и ставит их загрузку в очередь
+        одним сообщением брокеру. Файлы, которые уже есть у пользователя (в том числе
+        повторяющиеся в самом пакете), не загружаются и отмечаются в результате ошибкой
+        """
+
+        await self.check_quota(user=user, file_count=len(file_urls))
+
+        user_id: UUID = user.user_id
+
+        files: list[dict] = []
+        for file_url in file_urls:
+            filename: str = self.extract_filename_from_url(file_url=file_url)
+            files.append({
+                "filename": filename,
+                "file_path": self.build_file_path(str(user_id), filename),
+                "user_id": user_id,
+                "source_url": file_url,
+            })
+        await file_ops.make_dirs({os.path.dirname(file["file_path"]) for file in files})
+
+        added_files: dict[str, UUID] = await self.file_dal.add_files(
+            files=files, batch_size=project_settings.FILE_BATCH_INSERT_SIZE
+        )
+
+        results: list[dict] = []
+        downloads: list[dict] = []
+        for file in files:
+            file_id: Optional[UUID] = added_files.pop(file["file_path"], None)
+            if file_id is None:
+                results.append({"file_url": file["source_url"], "error": "This file is already uploaded"})
+                continue
+
+            results.append({"file_url": file["source_url"], "file_id": file_id})
+            downloads.append({
+                "file_url": file["source_url"],
+                "file_id": str(file_id),
+                "file_path": file["file_path"],
+            })
+
+        if downloads:
+            await progress_store.start_many(
+                file_ids=[download["file_id"] for download in downloads], user_id=str(user_id)
+            )
+            download_files_to_server.apply_async(kwargs={"downloads": downloads})
+
+        return results
+
+    async def upload_file_stream(
+            self,
+            user: User,
+            filename: str,
+            stream: AsyncIterator[bytes],
+            total_bytes: Optional[int] = None
+    ) -> tuple[UUID, int]:
+        """
+        Записывает на диск файл, передаваемый клиентом в теле запроса, по мере
+        получения данных. Размер и SHA-256 считаются в том же проходе, после чего
+        файл переносится в хранилище содержимого, а запись File получает итоговый
+        размер и статус completed одной транзакцией
+
+        Если передача прервалась, файл помечается как неудачно загруженный,
+        а записанная часть удаляется
+        """
+
+        self.validate_filename(filename=filename)
+        await self.check_quota(user=user, size=total_bytes or 0)
+
+        user_id: UUID = user.user_id
+        file_path: str = await self.generate_file_path(str(user_id), filename)
+        file_id: UUID = await self.file_dal.add_file(
+            filename=filename,
+            file_path=file_path,
+            user_id=user_id,
+            status=FileStatus.DOWNLOADING,
+        )
+
+        reporter: ProgressReporter = ProgressReporter(
+            store=progress_store,
+            file_id=str(file_id),
+            interval=project_settings.UPLOAD_PROGRESS_PUBLISH_INTERVAL,
+        )
+        await progress_store.start(file_id=str(file_id), user_id=str(user_id))
+
+        hasher = hashlib.sha256()
+        crc32: int = 0
+        size: int = 0
+        try:
+            file: BinaryIO = await file_ops.run(open, file_path, "wb")
+            try:
+                buffer: bytearray = bytearray()
+                async for chunk in stream:
+                    buffer += chunk
+                    if len(buffer) >= project_settings.STREAM_UPLOAD_BUFFER_SIZE:
+                        data, buffer = buffer, bytearray()
+                        crc32 = await file_ops.run(self._write_chunk, file, data, hasher, crc32)
+                        size += len(data)
+                        await reporter.update(bytes_received=size, total_bytes=total_bytes)
+                if buffer:
+                    crc32 = await file_ops.run(self._write_chunk, file, buffer, hasher, crc32)
+                    size += len(buffer)
+                await file_ops.run(self._sync_to_disk, file)
+            finally:
+                await file_ops.run(file.close)
+        except BaseException:
+            await self.file_dal.set_file_status(file_id=file_id, status=FileStatus.FAILED)
+            await file_ops.remove_if_exists(file_path)
+            await reporter.finish(status=FileStatus.FAILED, bytes_received=size)
+            raise
+
+        stored: bool = await BlobStore(db_session=self.file_dal.db_session).store(
+            file_id=file_id,
+            staging_path=file_path,
+            sha256=hasher.hexdigest(),
+            size=size,
+            crc32=crc32,
+        )
+        if not stored:
+            raise ValueError("File was deleted before the upload finished")
+        await reporter.finish(status=FileStatus.COMPLETED, bytes_received=size)
+
+        return file_id, size
+
+    async def create_upload_session(self, user: User, filename: str, size: int) -> UUID:
+        """
+        Создает сессию загрузки файла размером size по частям: добавляет запись
+        File и заранее выделяет на диске место под весь файл
+        """
+
+        self.validate_filename(filename=filename)
+        await self.check_quota(user=user, size=size)
+
+        user_id: UUID = user.user_id
+        file_path: str = await self.generate_file_path(str(user_id), filename)
+        file_id: UUID = await self.file_dal.add_file(
+            filename=filename,
+            file_path=file_path,
+            user_id=user_id,
+            status=FileStatus.DOWNLOADING,
+        )
+
+        try:
+            await file_ops.run(preallocate_file, file_path, size)
+        except OSError:
+            await self.file_dal.set_file_status(file_id=file_id, status=FileStatus.FAILED)
+            await file_ops.remove_if_exists(file_path)
+            raise
+
+        await upload_session_store.create(UploadSession(
+            file_id=str(file_id), user_id=str(user_id), file_path=file_path, size=size
+        ))
+        await progress_store.start(file_id=str(file_id), user_id=str(user_id))
+
+        return file_id
+
+    async def get_upload_session(self, file_id: UUID, user: User) -> UploadSession:
+        session: Optional[UploadSession] = await upload_session_store.get(file_id=str(file_id))
+        if session is None or session.user_id != str(user.user_id):
+            raise UploadSessionNotFoundError(str(file_id))
+        return session
+
+    async def write_upload_chunk(
+            self,
+            file_id: UUID,
+            user: User,
+            offset: int,
+            stream: AsyncIterator[bytes]
+    ) -> int:
+        """
+        Записывает часть файла, начиная с offset, который должен совпадать с текущим
+        смещением сессии. Если передача части прервалась, смещение все равно
+        переносится на конец фактически записанных данных, и клиент может
+        продолжить загрузку с него
+
+        Перед записью сессия захватывается, поэтому запрос с тем же смещением,
+        пришедший во время записи, получает UploadSessionLockedError и не
+        перезаписывает уже переданные данные
+
+        Возвращает новое смещение сессии
+        """
+
+        session: UploadSession = await self.get_upload_session(file_id=file_id, user=user)
+        token: str = await upload_session_store.claim(file_id=str(file_id), offset=offset)
+        try:
+            try:
+                file_descriptor: int = await file_ops.run(os.open, session.file_path, os.O_WRONLY)
+            except FileNotFoundError:
+                raise UploadSessionNotFoundError(str(file_id))
+
+            written: int = 0
+            try:
+                try:
+                    buffer: bytearray = bytearray()
+                    async for chunk in stream:
+                        if offset + written + len(buffer) + len(chunk) > session.size:
+                            raise ValueError("Chunk exceeds the declared file size")
+                        buffer += chunk
+                        if len(buffer) >= project_settings.STREAM_UPLOAD_BUFFER_SIZE:
+                            data, buffer = buffer, bytearray()
+                            await upload_session_store.refresh(file_id=str(file_id), token=token)
+                            await file_ops.run(self._pwrite, file_descriptor, data, offset + written)
+                            written += len(data)
+                    if buffer:
+                        await upload_session_store.refresh(file_id=str(file_id), token=token)
+                        await file_ops.run(self._pwrite, file_descriptor, buffer, offset + written)
+                        written += len(buffer)
+                finally:
+                    if written:
+                        await file_ops.run(os.fsync, file_descriptor)
+                        await upload_session_store.advance(
+                            file_id=str(file_id), offset=offset, new_offset=offset + written, token=token
+                        )
+                        await progress_store.update(
+                            str(file_id),
+                            status=FileStatus.DOWNLOADING,
+                            bytes_received=offset + written,
+                            total_bytes=session.size,
+                        )
+            finally:
+                await file_ops.run(os.close, file_descriptor)
+        finally:
+            await upload_session_store.release(file_id=str(file_id), token=token)
+
+        return offset + written
+
+    async def finalize_upload(self, file_id: UUID, user: User) -> int:
+        """
+        Завершает загрузку по частям: считает хеш собранного файла, переносит его
+        в хранилище содержимого и удаляет сессию. Возвращает размер файла
+
+        На время завершения сессия захватывается так же, как при записи части,
+        поэтому параллельный запрос получает UploadSessionLockedError, а повторный -
+        UploadSessionNotFoundError, так как сессия уже удалена
+        """
+
+        session: UploadSession = await self.get_upload_session(file_id=file_id, user=user)
+        token: str = await upload_session_store.claim(file_id=str(file_id), offset=session.size)
+        try:
+            try:
+                sha256, crc32 = await file_ops.run(BlobStore.checksum_file, session.file_path)
+            except FileNotFoundError:
+                await upload_session_store.delete(file_id=str(file_id))
+                raise UploadSessionNotFoundError(str(file_id))
+
+            await upload_session_store.refresh(file_id=str(file_id), token=token)
+            stored: bool = await BlobStore(db_session=self.file_dal.db_session).store(
+                file_id=file_id,
+                staging_path=session.file_path,
+                sha256=sha256,
+                size=session.size,
+                crc32=crc32,
+            )
+            await upload_session_store.delete(file_id=str(file_id))
+        finally:
+            await upload_session_store.release(file_id=str(file_id), token=token)
+        if not stored:
+            raise UploadSessionNotFoundError(str(file_id))
+
+        await progress_store.update(
+            str(file_id),
+            status=FileStatus.COMPLETED,
+            bytes_received=session.size,
+            total_bytes=session.size,
+        )
+        return session.size
+
+    async def get_usage(self, user: User) -> tuple[int, int]:
+        return await self.user_dal.get_usage(user=user)
+
+    async def check_quota(self, user: User, size: int = 0, file_count: int = 1) -> None:
+        """
+        Проверяет по счетчикам UserUsage, что file_count новых файлов общим размером
+        size (0, если размер заранее неизвестен) не превысят квоты пользователя
+        USER_STORAGE_QUOTA_BYTES и USER_FILE_COUNT_QUOTA (0 - без ограничения)
+
+        Счетчики учитывают только завершенные загрузки, поэтому файлы, которые
+        загружаются одновременно, могут превысить квоту на свой размер
+        """
+
+        storage_quota: int = project_settings.USER_STORAGE_QUOTA_BYTES
+        file_count_quota: int = project_settings.USER_FILE_COUNT_QUOTA
+        if not storage_quota and not file_count_quota:
+            return
+
+        used_file_count, used_bytes = await self.get_usage(user=user)
+        if storage_quota and (used_bytes >= storage_quota or used_bytes + size > storage_quota):
+            raise StorageQuotaExceededError("Storage quota exceeded")
+        if file_count_quota and used_file_count + file_count > file_count_quota:
+            raise StorageQuotaExceededError("File count quota exceeded")
+
+    @staticmethod
+    def validate_filename(filename: str) -> None:
+        if not filename or filename != os.path.basename(filename) or filename in (".", ".."):
+            raise ValueError("Invalid filename")
+
+    @staticmethod
+    def _pwrite(file_descriptor: int, data: bytearray, offset: int) -> None:
+        view: memoryview = memoryview(data)
+        while view:
+            written: int = os.pwrite(file_descriptor, view, offset)
+            view = view[written:]
+            offset += written
+
+    @staticmethod
+    def _write_chunk(file: BinaryIO, chunk: bytearray, hasher, crc32: int) -> int:
+        file.write(chunk)
+        hasher.update(chunk)
+        return zlib.crc32(chunk, crc32)
+
+    @staticmethod
+    def _sync_to_disk(file: BinaryIO) -> None:
+        file.flush()
+        os.fsync(file.fileno())
+
     @staticmethod
     def extract_filename_from_url(file_url: str) -> str:
         parsed_url = urlparse(file_url)
@@ -120,44 +466,200 @@ class FileService(BaseService):
         return filename
 
     @staticmethod
-    def generate_file_path(user_id: str, filename: str) -> str:
-        base_dir = Path(__file__).resolve().parent.parent.parent / "uploads"
-        user_dir = base_dir / user_id
-        file_path = user_dir / filename
-        os.makedirs(user_dir, exist_ok=True)
+    async def generate_file_path(user_id: str, filename: str) -> str:
+        file_path: str = FileService.build_file_path(user_id, filename)
+        await file_ops.make_dirs([os.path.dirname(file_path)])
+
+        return file_path
+
+    @staticmethod
+    def build_file_path(user_id: str, filename: str) -> str:
+        """
+        Строит путь к файлу в каталоге пользователя. Если FILE_PATH_FANOUT_LEVELS
+        больше нуля, файлы распределяются по вложенным каталогам, названия которых
+        берутся из SHA-256 названия файла (по FILE_PATH_FANOUT_WIDTH символов
+        на уровень), чтобы в одном каталоге не оказывалось слишком много файлов
+        """
+
+        base_dir = Path(project_settings.UPLOADS_DIR)
+        width: int = project_settings.FILE_PATH_FANOUT_WIDTH
+        digest: str = hashlib.sha256(filename.encode()).hexdigest()
+        shards: list[str] = [
+            digest[level * width:(level + 1) * width]
+            for level in range(project_settings.FILE_PATH_FANOUT_LEVELS)
+        ]
+        return str(base_dir.joinpath(user_id, *shards, filename))
 
-        return str(file_path)
+    async def get_list_of_files(
+            self,
+            user: User,
+            limit: int,
+            cursor: Optional[str] = None
+    ) -> tuple[list[Row], Optional[str]]:
+        after: Optional[tuple[datetime, UUID]] = (
+            self.decode_list_cursor(cursor=cursor) if cursor is not None else None
+        )
+        files: list[Row] = list(
+            await self.file_dal.get_list_of_files(user=user, limit=limit + 1, after=after)
+        )
+
+        next_cursor: Optional[str] = None
+        if len(files) > limit:
+            files = files[:limit]
+            next_cursor = self.encode_list_cursor(
+                uploaded_at=files[-1].uploaded_at, file_id=files[-1].file_id
+            )
+
+        return files, next_cursor
+
+    @staticmethod
+    def encode_list_cursor(uploaded_at: datetime, file_id: UUID) -> str:
+        raw_cursor: str = f"{uploaded_at.isoformat()}|{file_id}"
+        return base64.urlsafe_b64encode(raw_cursor.encode()).decode()
 
-    async def get_list_of_files(self, user: User) -> list[File]:
-        files: list[File] = await self.file_dal.get_list_of_files(user=user)
-        return files
+    @staticmethod
+    def decode_list_cursor(cursor: str) -> tuple[datetime, UUID]:
+        try:
+            raw_cursor: str = base64.urlsafe_b64decode(cursor.encode()).decode()
+            uploaded_at, file_id = raw_cursor.split("|")
+            return datetime.fromisoformat(uploaded_at), UUID(file_id)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValueError("Invalid cursor")
 
     async def get_file_info(self, file_id: UUID, user: User) -> Optional[File]:
         file: Optional[File] = await self.file_dal.get_file_by_id(user=user, file_id=file_id)
         return file
 
-    async def delete_file(self, file_id: UUID, user: User) -> None:
+    async def get_file_status(self, file_id: UUID, user: User) -> Optional[dict]:
+        """
+        Возвращает статус и прогресс загрузки файла из хранилища прогресса.
+        База данных используется, только если записи о загрузке в нем нет
+        (например, она устарела или Redis недоступен)
+        """
+
+        progress: Optional[dict] = await progress_store.get(file_id=str(file_id))
+        if progress is not None and progress["user_id"] == str(user.user_id):
+            return {"file_id": file_id, **progress}
+
         file: Optional[File] = await self.file_dal.get_file_by_id(file_id=file_id, user=user)
         if file is None:
+            return None
+
+        return {
+            "file_id": file.file_id,
+            "status": file.status,
+            "bytes_received": file.size if file.status == FileStatus.COMPLETED else file.downloaded_bytes,
+            "total_bytes": file.size if file.status == FileStatus.COMPLETED else None,
+            "rate": 0,
+        }
+
+    async def delete_file(self, file_id: UUID, user: User) -> None:
+        deleted_file_ids: list[UUID] = await self.delete_files(file_ids=[file_id], user=user)
+        if not deleted_file_ids:
             raise ValueError("File does not exist")
-        file_path: Path = Path(file.file_path)
-        await self.file_dal.delete_file(file=file)
 
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            else:
-                raise ValueError("File was not found on the server")
-        except OSError:
-            print("Error when deleting the file")
+    async def delete_files(self, file_ids: list[UUID], user: User) -> list[UUID]:
+        """
+        Помечает файлы пользователя удаленными одним запросом и возвращает id
+        помеченных файлов. Содержимое удаляется с диска фоновой задачей
+        purge_deleted_files, поэтому запрос не ждет удаления больших файлов
+        """
+
+        deleted_file_ids: list[UUID] = await self.file_dal.delete_files(user=user, file_ids=file_ids)
+        for file_id in deleted_file_ids:
+            file_content_cache.invalidate(key=str(file_id))
+        return deleted_file_ids
+
+    async def download_file(
+            self,
+            file_id: UUID,
+            user: User
+    ) -> tuple[StorageBackend, str, str, Optional[str]]:
+        """
+        Возвращает хранилище и ключ содержимого файла, его название и хеш содержимого
+        """
 
-    async def download_file(self, file_id: UUID, user: User) -> tuple[str, str]:
         file: Optional[File] = await self.file_dal.get_file_by_id(file_id=file_id, user=user)
         if file is None:
             raise ValueError("File with this id does not exist or does not belong to the current user")
+        if file.status != FileStatus.COMPLETED:
+            raise FileNotReadyError(f"File upload is {file.status}")
 
-        file_path: Path = Path(file.file_path)
-        if not file_path.exists() or not file_path.is_file():
+        storage, key = self.get_storage_location(file=file)
+        if await storage.stat(key=key) is None:
             raise ValueError("File not found on server")
 
-        return str(file_path), file.filename
+        return storage, key, file.filename, file.blob_sha256
+
+    async def create_download_token(
+            self,
+            file_id: UUID,
+            user: User,
+            expires_in: int
+    ) -> tuple[str, datetime]:
+        """
+        Создает подписанный токен, по которому файл можно скачать без аутентификации
+        и обращения к базе данных в течение expires_in секунд
+        """
+
+        storage, key, filename, content_hash = await self.download_file(file_id=file_id, user=user)
+        if os.path.isabs(key):
+            key = os.path.relpath(key, project_settings.UPLOADS_DIR)
+        volume: Optional[str] = storage.volume if isinstance(storage, VolumeStorageBackend) else None
+
+        expires_at: int = int(time.time()) + expires_in
+        token: str = security.create_download_token(
+            file_id=str(file_id),
+            storage_key=key,
+            filename=filename,
+            content_hash=content_hash,
+            volume=volume,
+            expires_at=expires_at,
+        )
+        return token, datetime.fromtimestamp(expires_at, tz=timezone.utc)
+
+    async def get_archive_entries(
+            self,
+            user: User,
+            file_ids: Optional[list[UUID]] = None
+    ) -> list[ZipEntry]:
+        """
+        Возвращает загруженные файлы пользователя (все или только с указанными id)
+        в виде элементов ZIP-архива. Незавершенные загрузки в архив не попадают
+        """
+
+        files: Sequence[Row] = await self.file_dal.get_files_for_archive(user=user, file_ids=file_ids)
+        if not files:
+            raise ValueError("There are no uploaded files to archive")
+
+        entries: list[ZipEntry] = []
+        for file in files:
+            storage, key = self.get_storage_location(file=file)
+            size: Optional[int] = file.blob_size
+            if size is None:
+                object_stat: Optional[ObjectStat] = await storage.stat(key=key)
+                if object_stat is None:
+                    raise ValueError(f"File {file.filename} not found on server")
+                size = object_stat.size
+
+            entries.append(ZipEntry(
+                name=file.filename,
+                storage=storage,
+                key=key,
+                size=size,
+                modified_at=file.uploaded_at,
+                crc32=file.crc32,
+            ))
+        return entries
+
+    @staticmethod
+    def get_storage_location(file: File) -> tuple[StorageBackend, str]:
+        """
+        Возвращает хранилище и ключ содержимого файла (с учетом тома, на котором
+        оно размещено). Файлы, загруженные до появления хранилища содержимого,
+        хранятся на локальном диске по file_path
+        """
+
+        if file.blob_sha256 is not None:
+            return BlobStore.get_storage(volume=file.volume), BlobStore.get_blob_key(sha256=file.blob_sha256)
+        return local_storage_backend, file.file_path
@@ -0,0 +1,432 @@
+import errno
+import hashlib
+import hmac
+import os
+import threading
+import xml.etree.ElementTree as ElementTree
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+import httpx
+
+from src.services import file_ops
+from src.settings import project_settings
+
+
+@dataclass
+class ObjectStat:
+    """Размер и время изменения (timestamp) объекта в хранилище"""
+
+    size: int
+    modified_at: float
+
+
+class StorageBackend(ABC):
+    """
+    Хранилище содержимого файлов. Объекты адресуются ключами - относительными
+    путями вида blobs/ab/cd/<sha256>
+    """
+
+    @abstractmethod
+    async def put_file(self, key: str, source_path: str, keep_source: bool = False) -> None:
+        """
+        Переносит локальный файл source_path в хранилище. Файл source_path удаляется,
+        если не передан keep_source
+        """
+
+    @abstractmethod
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> None:
+        """Сохраняет в хранилище объект, содержимое которого передается частями"""
+
+    @abstractmethod
+    def get_stream(
+            self,
+            key: str,
+            start: int = 0,
+            end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Возвращает содержимое объекта с байта start по end включительно (по умолчанию - до конца)"""
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        """Возвращает размер и время изменения объекта или None, если объекта нет"""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Удаляет объект. Отсутствие объекта ошибкой не считается"""
+
+    def get_local_path(self, key: str) -> Optional[str]:
+        """
+        Возвращает путь к объекту в локальной файловой системе или None, если объект
+        хранится удаленно (в этом случае его можно прочитать только через get_stream)
+        """
+
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Хранилище в каталоге локальной файловой системы (по умолчанию UPLOADS_DIR).
+    Файлы переносятся в него переименованием, а если каталог находится на другой
+    файловой системе - копированием
+    """
+
+    def __init__(self, root: Optional[str] = None, chunk_size: int = 1024 * 1024) -> None:
+        self._root: Optional[str] = root
+        self.chunk_size: int = chunk_size
+
+    @property
+    def root(self) -> str:
+        return self._root or project_settings.UPLOADS_DIR
+
+    def get_local_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    async def put_file(self, key: str, source_path: str, keep_source: bool = False) -> None:
+        await file_ops.run(_link if keep_source else _move, source_path, self.get_local_path(key))
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> None:
+        file_path: str = self.get_local_path(key)
+        temporary_path: str = f"{file_path}.{os.getpid()}.{id(chunks)}.part"
+        await file_ops.run(os.makedirs, os.path.dirname(file_path), exist_ok=True)
+
+        file = await file_ops.run(open, temporary_path, "wb")
+        try:
+            async for chunk in chunks:
+                await file_ops.run(file.write, chunk)
+        except BaseException:
+            await file_ops.run(file.close)
+            await file_ops.remove_if_exists(temporary_path)
+            raise
+        await file_ops.run(file.close)
+        await file_ops.run(os.replace, temporary_path, file_path)
+
+    async def get_stream(
+            self,
+            key: str,
+            start: int = 0,
+            end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        # Поток читается, когда заголовки ответа уже отправлены, поэтому операции
+        # ждут свободного потока, а не прерывают ответ ошибкой переполнения
+        file_descriptor: int = await file_ops.run_queued(os.open, self.get_local_path(key), os.O_RDONLY)
+        try:
+            if end is None:
+                end = (await file_ops.run_queued(os.fstat, file_descriptor)).st_size - 1
+
+            offset: int = start
+            while offset <= end:
+                chunk: bytes = await file_ops.run_queued(
+                    os.pread, file_descriptor, min(self.chunk_size, end - offset + 1), offset
+                )
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+        finally:
+            await file_ops.run_queued(os.close, file_descriptor)
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        try:
+            stat_result: os.stat_result = await file_ops.run(os.stat, self.get_local_path(key))
+        except FileNotFoundError:
+            return None
+        return ObjectStat(size=stat_result.st_size, modified_at=stat_result.st_mtime)
+
+    async def delete(self, key: str) -> None:
+        await file_ops.remove_if_exists(self.get_local_path(key))
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Хранилище в бакете S3-совместимого сервиса (AWS S3, MinIO и т.п.)
+
+    Запросы подписываются AWS Signature Version 4, адресация бакета - по пути
+    (endpoint_url/bucket/key). Объекты больше part_size байт загружаются частями
+    (multipart upload), поэтому в памяти одновременно находится не более одной
+    части. Содержимое читается потоком, в том числе по диапазонам (Range)
+    """
+
+    MIN_PART_SIZE: int = 5 * 1024 * 1024
+
+    def __init__(
+            self,
+            endpoint_url: str,
+            bucket: str,
+            access_key_id: str,
+            secret_access_key: str,
+            region: str,
+            part_size: int,
+            transport: Optional[httpx.AsyncBaseTransport] = None
+    ) -> None:
+        self.endpoint_url: str = endpoint_url.rstrip("/")
+        self.bucket: str = bucket
+        self.access_key_id: str = access_key_id
+        self.secret_access_key: str = secret_access_key
+        self.region: str = region
+        self.part_size: int = max(part_size, self.MIN_PART_SIZE)
+        self._transport: Optional[httpx.AsyncBaseTransport] = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def put_file(self, key: str, source_path: str, keep_source: bool = False) -> None:
+        await self.put_stream(key, self._read_file(source_path))
+        if not keep_source:
+            await file_ops.remove_if_exists(source_path)
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> None:
+        buffer: bytearray = bytearray()
+        upload_id: Optional[str] = None
+        parts: list[tuple[int, str]] = []
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = await self._create_multipart_upload(key)
+                    parts.append(await self._upload_part(
+                        key, upload_id, len(parts) + 1, bytes(buffer[:self.part_size])
+                    ))
+                    del buffer[:self.part_size]
+
+            if upload_id is None:
+                response: httpx.Response = await self._request("PUT", key, content=bytes(buffer))
+                response.raise_for_status()
+                return
+
+            if buffer:
+                parts.append(await self._upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+            await self._complete_multipart_upload(key, upload_id, parts)
+        except BaseException:
+            if upload_id is not None:
+                await self._request("DELETE", key, params={"uploadId": upload_id})
+            raise
+
+    async def get_stream(
+            self,
+            key: str,
+            start: int = 0,
+            end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        headers: dict[str, str] = {}
+        if start > 0 or end is not None:
+            headers["Range"] = f"bytes={start}-{end if end is not None else ''}"
+
+        request: httpx.Request = self._build_request("GET", key, headers=headers)
+        response: httpx.Response = await self._get_client().send(request, stream=True)
+        try:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        response: httpx.Response = await self._request("HEAD", key)
+        if response.status_code == httpx.codes.NOT_FOUND:
+            return None
+        response.raise_for_status()
+
+        last_modified: Optional[str] = response.headers.get("last-modified")
+        return ObjectStat(
+            size=int(response.headers["content-length"]),
+            modified_at=parsedate_to_datetime(last_modified).timestamp() if last_modified else 0,
+        )
+
+    async def delete(self, key: str) -> None:
+        response: httpx.Response = await self._request("DELETE", key)
+        if response.status_code != httpx.codes.NOT_FOUND:
+            response.raise_for_status()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _create_multipart_upload(self, key: str) -> str:
+        response: httpx.Response = await self._request("POST", key, params={"uploads": ""})
+        response.raise_for_status()
+        return _find_xml_text(response.content, "UploadId")
+
+    async def _upload_part(
+            self,
+            key: str,
+            upload_id: str,
+            part_number: int,
+            data: bytes
+    ) -> tuple[int, str]:
+        response: httpx.Response = await self._request(
+            "PUT", key, params={"partNumber": str(part_number), "uploadId": upload_id}, content=data
+        )
+        response.raise_for_status()
+        return part_number, response.headers["etag"]
+
+    async def _complete_multipart_upload(
+            self,
+            key: str,
+            upload_id: str,
+            parts: list[tuple[int, str]]
+    ) -> None:
+        body: str = "<CompleteMultipartUpload>" + "".join(
+            f"<Part><PartNumber>{part_number}</PartNumber><ETag>{etag}</ETag></Part>"
+            for part_number, etag in parts
+        ) + "</CompleteMultipartUpload>"
+        response: httpx.Response = await self._request(
+            "POST", key, params={"uploadId": upload_id}, content=body.encode()
+        )
+        response.raise_for_status()
+        # S3 может вернуть ошибку завершения загрузки с кодом 200 в теле ответа
+        if b"<Error>" in response.content:
+            raise httpx.HTTPStatusError(
+                f"Failed to complete multipart upload of {key}",
+                request=response.request,
+                response=response,
+            )
+
+    async def _read_file(self, file_path: str) -> AsyncIterator[bytes]:
+        file = await file_ops.run(open, file_path, "rb")
+        try:
+            while chunk := await file_ops.run(file.read, self.part_size):
+                yield chunk
+        finally:
+            await file_ops.run(file.close)
+
+    async def _request(
+            self,
+            method: str,
+            key: str,
+            params: Optional[dict[str, str]] = None,
+            content: Optional[bytes] = None
+    ) -> httpx.Response:
+        request: httpx.Request = self._build_request(method, key, params=params, content=content)
+        return await self._get_client().send(request)
+
+    def _build_request(
+            self,
+            method: str,
+            key: str,
+            params: Optional[dict[str, str]] = None,
+            headers: Optional[dict[str, str]] = None,
+            content: Optional[bytes] = None
+    ) -> httpx.Request:
+        url: httpx.URL = httpx.URL(
+            f"{self.endpoint_url}/{quote(self.bucket)}/{quote(key, safe='/-_.~')}",
+            params=params,
+        )
+        headers = {**(headers or {}), **self._sign(method, url)}
+        return httpx.Request(method, url, headers=headers, content=content)
+
+    def _sign(self, method: str, url: httpx.URL) -> dict[str, str]:
+        now: datetime = datetime.now(timezone.utc)
+        amz_date: str = now.strftime("%Y%m%dT%H%M%SZ")
+        scope: str = f"{now:%Y%m%d}/{self.region}/s3/aws4_request"
+        headers: dict[str, str] = {
+            "host": url.netloc.decode(),
+            "x-amz-content-sha256": "UNSIGNED-PAYLOAD",
+            "x-amz-date": amz_date,
+        }
+
+        canonical_query: str = "&".join(sorted(
+            f"{quote(name, safe='-_.~')}={quote(value, safe='-_.~')}"
+            for name, value in url.params.multi_items()
+        ))
+        signed_headers: str = ";".join(sorted(headers))
+        canonical_request: str = "\n".join([
+            method,
+            url.raw_path.decode().split("?")[0],
+            canonical_query,
+            "".join(f"{name}:{headers[name]}\n" for name in sorted(headers)),
+            signed_headers,
+            "UNSIGNED-PAYLOAD",
+        ])
+        string_to_sign: str = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+
+        signing_key: bytes = ("AWS4" + self.secret_access_key).encode()
+        for part in (f"{now:%Y%m%d}", self.region, "s3", "aws4_request"):
+            signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+        signature: str = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key_id}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=httpx.Timeout(connect=10, read=60, write=60, pool=None),
+            )
+        return self._client
+
+
+def create_storage_backend() -> StorageBackend:
+    if project_settings.STORAGE_BACKEND == "s3":
+        return S3StorageBackend(
+            endpoint_url=project_settings.S3_ENDPOINT_URL,
+            bucket=project_settings.S3_BUCKET,
+            access_key_id=project_settings.S3_ACCESS_KEY_ID,
+            secret_access_key=project_settings.S3_SECRET_ACCESS_KEY,
+            region=project_settings.S3_REGION,
+            part_size=project_settings.S3_MULTIPART_PART_SIZE,
+        )
+    return local_storage_backend
+
+
+def _find_xml_text(content: bytes, tag: str) -> str:
+    for element in ElementTree.fromstring(content).iter():
+        if element.tag.rsplit("}", 1)[-1] == tag:
+            return element.text or ""
+    raise ValueError(f"Element {tag} not found in the response")
+
+
+def _move(source_path: str, destination_path: str) -> None:
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    try:
+        os.replace(source_path, destination_path)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        file_ops.copy_file(source_path, destination_path)
+        os.remove(source_path)
+
+
+def _link(source_path: str, destination_path: str) -> None:
+    """
+    Помещает в destination_path жесткую ссылку на source_path (или копию, если
+    пути находятся на разных файловых системах), не удаляя source_path
+    """
+
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    temporary_path: str = f"{destination_path}.{os.getpid()}.{threading.get_ident()}.link"
+    try:
+        os.link(source_path, temporary_path)
+    except OSError as exc:
+        if exc.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP):
+            raise
+        file_ops.copy_file(source_path, destination_path)
+        return
+    try:
+        os.replace(temporary_path, destination_path)
+    finally:
+        # если destination_path уже ссылается на тот же файл, rename ничего не делает
+        file_ops.remove_if_exists_sync(temporary_path)
+
+
+local_storage_backend: LocalStorageBackend = LocalStorageBackend(
+    chunk_size=project_settings.FILE_DOWNLOAD_CHUNK_SIZE
+)
+storage_backend: StorageBackend = create_storage_backend()
@@ -0,0 +1,248 @@
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from src.settings import project_settings
+
+
+class UploadSessionNotFoundError(Exception):
+    """Исключение, возникающее, если сессии загрузки не существует или она истекла"""
+
+
+class UploadSessionLockedError(Exception):
+    """Исключение, возникающее, если в сессию загрузки уже записывается другая часть файла"""
+
+
+class UploadOffsetMismatchError(Exception):
+    """Исключение, возникающее, если часть файла передана не по текущему смещению загрузки"""
+
+    def __init__(self, offset: int) -> None:
+        super().__init__(f"Upload offset is {offset}")
+        self.offset: int = offset
+
+
+@dataclass
+class UploadSession:
+    """Состояние загрузки файла по частям"""
+
+    file_id: str
+    user_id: str
+    file_path: str
+    size: int
+    offset: int = 0
+
+
+class UploadSessionStore:
+    """
+    Хранилище сессий загрузки файлов по частям в Redis
+
+    Сессия хранится в хеше, а время ее истечения - в общем отсортированном
+    множестве, по которому периодическая задача находит и удаляет брошенные
+    сессии
+
+    Перед записью части сессия захватывается (claim): вместе с проверкой
+    смещения атомарно (скриптом Lua) устанавливается блокировка с токеном
+    и временем жизни lock_ttl_seconds, поэтому одновременно в файл пишет только
+    один запрос. Блокировка продлевается перед записью каждого блока (refresh),
+    а смещение меняется только владельцем блокировки (advance)
+    """
+
+    REDIS_KEY_PREFIX: str = "upload_session:"
+    LOCK_KEY_PREFIX: str = "upload_session_lock:"
+    EXPIRIES_KEY: str = "upload_session_expiries"
+
+    _CLAIM_SCRIPT: str = """
+        local offset = redis.call('HGET', KEYS[1], 'offset')
+        if not offset then
+            return -1
+        end
+        if offset ~= ARGV[1] then
+            return tonumber(offset)
+        end
+        if not redis.call('SET', KEYS[2], ARGV[2], 'NX', 'PX', ARGV[3]) then
+            return -2
+        end
+        return tonumber(offset)
+    """
+
+    _REFRESH_LOCK_SCRIPT: str = """
+        if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+            return 0
+        end
+        return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    """
+
+    _RELEASE_LOCK_SCRIPT: str = """
+        if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+            return 0
+        end
+        return redis.call('DEL', KEYS[1])
+    """
+
+    _ADVANCE_OFFSET_SCRIPT: str = """
+        local offset = redis.call('HGET', KEYS[1], 'offset')
+        if not offset then
+            return -1
+        end
+        if redis.call('GET', KEYS[3]) ~= ARGV[5] then
+            return -2
+        end
+        if offset ~= ARGV[1] then
+            return tonumber(offset)
+        end
+        redis.call('HSET', KEYS[1], 'offset', ARGV[2])
+        redis.call('ZADD', KEYS[2], ARGV[3], ARGV[4])
+        return tonumber(ARGV[2])
+    """
+
+    def __init__(self, redis_url: str, ttl_seconds: int, lock_ttl_seconds: int = 60) -> None:
+        self.redis_url: str = redis_url
+        self.ttl_seconds: int = ttl_seconds
+        self.lock_ttl_seconds: int = lock_ttl_seconds
+        self._redis: Optional[Redis] = None
+
+    async def create(self, session: UploadSession) -> None:
+        async with self._get_redis().pipeline(transaction=True) as pipeline:
+            pipeline.hset(self.REDIS_KEY_PREFIX + session.file_id, mapping={
+                "user_id": session.user_id,
+                "file_path": session.file_path,
+                "size": session.size,
+                "offset": session.offset,
+            })
+            pipeline.zadd(self.EXPIRIES_KEY, {session.file_id: self._get_expires_at()})
+            await pipeline.execute()
+
+    async def get(self, file_id: str) -> Optional[UploadSession]:
+        session: dict[bytes, bytes] = await self._get_redis().hgetall(
+            self.REDIS_KEY_PREFIX + file_id
+        )
+        if not session:
+            return None
+
+        return UploadSession(
+            file_id=file_id,
+            user_id=session[b"user_id"].decode(),
+            file_path=session[b"file_path"].decode(),
+            size=int(session[b"size"]),
+            offset=int(session[b"offset"]),
+        )
+
+    async def claim(self, file_id: str, offset: int) -> str:
+        """
+        Захватывает сессию для записи части, начинающейся с offset, и возвращает
+        токен блокировки. Если смещение сессии другое, возникает
+        UploadOffsetMismatchError, если сессия уже захвачена - UploadSessionLockedError
+        """
+
+        token: str = secrets.token_hex(16)
+        current_offset: int = await self._get_redis().eval(
+            self._CLAIM_SCRIPT,
+            2,
+            self.REDIS_KEY_PREFIX + file_id,
+            self.LOCK_KEY_PREFIX + file_id,
+            offset,
+            token,
+            self.lock_ttl_seconds * 1000,
+        )
+        if current_offset == -1:
+            raise UploadSessionNotFoundError(file_id)
+        if current_offset == -2:
+            raise UploadSessionLockedError(file_id)
+        if current_offset != offset:
+            raise UploadOffsetMismatchError(offset=current_offset)
+        return token
+
+    async def refresh(self, file_id: str, token: str) -> None:
+        """
+        Продлевает блокировку сессии. Если блокировка истекла и, возможно,
+        захвачена другим запросом, возникает UploadSessionLockedError
+        """
+
+        refreshed: int = await self._get_redis().eval(
+            self._REFRESH_LOCK_SCRIPT, 1, self.LOCK_KEY_PREFIX + file_id, token, self.lock_ttl_seconds * 1000
+        )
+        if not refreshed:
+            raise UploadSessionLockedError(file_id)
+
+    async def release(self, file_id: str, token: str) -> None:
+        await self._get_redis().eval(self._RELEASE_LOCK_SCRIPT, 1, self.LOCK_KEY_PREFIX + file_id, token)
+
+    async def advance(self, file_id: str, offset: int, new_offset: int, token: str) -> None:
+        """
+        Переносит смещение загрузки с offset на new_offset и продлевает сессию.
+        Если блокировка с токеном token потеряна, возникает UploadSessionLockedError,
+        если смещение уже изменилось - UploadOffsetMismatchError
+        """
+
+        current_offset: int = await self._get_redis().eval(
+            self._ADVANCE_OFFSET_SCRIPT,
+            3,
+            self.REDIS_KEY_PREFIX + file_id,
+            self.EXPIRIES_KEY,
+            self.LOCK_KEY_PREFIX + file_id,
+            offset,
+            new_offset,
+            self._get_expires_at(),
+            file_id,
+            token,
+        )
+        if current_offset == -1:
+            raise UploadSessionNotFoundError(file_id)
+        if current_offset == -2:
+            raise UploadSessionLockedError(file_id)
+        if current_offset != new_offset:
+            raise UploadOffsetMismatchError(offset=current_offset)
+
+    async def delete(self, file_id: str) -> None:
+        async with self._get_redis().pipeline(transaction=True) as pipeline:
+            pipeline.delete(self.REDIS_KEY_PREFIX + file_id, self.LOCK_KEY_PREFIX + file_id)
+            pipeline.zrem(self.EXPIRIES_KEY, file_id)
+            await pipeline.execute()
+
+    async def get_expired(self, limit: int) -> list[UploadSession]:
+        file_ids: list[bytes] = await self._get_redis().zrangebyscore(
+            self.EXPIRIES_KEY, "-inf", time.time(), start=0, num=limit
+        )
+
+        sessions: list[UploadSession] = []
+        for file_id in file_ids:
+            session: Optional[UploadSession] = await self.get(file_id.decode())
+            if session is None:
+                await self._get_redis().zrem(self.EXPIRIES_KEY, file_id)
+                continue
+            sessions.append(session)
+        return sessions
+
+    async def close(self) -> None:
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def _get_expires_at(self) -> float:
+        return time.time() + self.ttl_seconds
+
+    def _get_redis(self) -> Redis:
+        if self._redis is None:
+            self._redis = Redis.from_url(self.redis_url)
+        return self._redis
+
+
+def preallocate_file(file_path: str, size: int) -> None:
+    file_descriptor: int = os.open(file_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(file_descriptor, size)
+        if hasattr(os, "posix_fallocate") and size > 0:
+            os.posix_fallocate(file_descriptor, 0, size)
+    finally:
+        os.close(file_descriptor)
+
+
+upload_session_store: UploadSessionStore = UploadSessionStore(
+    redis_url=project_settings.REDIS_URL,
+    ttl_seconds=project_settings.UPLOAD_SESSION_TTL_SECONDS,
+    lock_ttl_seconds=project_settings.UPLOAD_SESSION_LOCK_TTL_SECONDS,
+)
@@ -0,0 +1,51 @@
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import Row
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import UserUsage
+
+
+def sum_usage(files: Iterable[Row], sign: int = 1) -> dict[UUID, tuple[int, int]]:
+    """
+    Группирует строки с полями user_id и size по пользователям и возвращает
+    для каждого изменение количества файлов и суммарного размера, умноженное на sign
+    """
+
+    changes: dict[UUID, tuple[int, int]] = {}
+    for file in files:
+        file_count, total_bytes = changes.get(file.user_id, (0, 0))
+        changes[file.user_id] = (file_count + sign, total_bytes + sign * file.size)
+    return changes
+
+
+async def change_usage(db_session: AsyncSession, changes: dict[UUID, tuple[int, int]]) -> None:
+    """
+    Изменяет счетчики UserUsage пользователей на (количество файлов, байты) из changes
+    одним запросом. Должна вызываться внутри уже открытой транзакции, в которой
+    изменены сами записи File, и последним запросом в ней: строка счетчиков
+    блокируется до конца транзакции, а все загрузки пользователя обновляют одну строку
+
+    Строки блокируются в порядке user_id, чтобы параллельные транзакции
+    с несколькими пользователями не блокировали друг друга взаимно
+    """
+
+    changes = {user_id: change for user_id, change in changes.items() if change != (0, 0)}
+    if not changes:
+        return
+
+    statement = insert(UserUsage).values([
+        {"user_id": user_id, "file_count": file_count, "total_bytes": total_bytes}
+        for user_id, (file_count, total_bytes) in sorted(changes.items())
+    ])
+    await db_session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[UserUsage.user_id],
+            set_={
+                "file_count": UserUsage.file_count + statement.excluded.file_count,
+                "total_bytes": UserUsage.total_bytes + statement.excluded.total_bytes,
+            },
+        )
+    )
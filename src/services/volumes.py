@@ -0,0 +1,219 @@
+import hashlib
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from src.services import file_ops
+from src.services.storage import LocalStorageBackend, ObjectStat, StorageBackend
+from src.settings import project_settings
+
+
+@dataclass
+class VolumeUsage:
+    """Свободное и общее место на томе в байтах"""
+
+    free: int
+    total: int
+
+    @property
+    def free_fraction(self) -> float:
+        return self.free / self.total if self.total else 0.0
+
+
+class VolumeSet:
+    """
+    Набор локальных томов (точек монтирования), по которым распределяется
+    содержимое файлов
+
+    Том для объекта выбирается взвешенным рандеву-хешированием (HRW) - вариантом
+    консистентного хеширования: для каждого тома считается score = -weight / ln(h),
+    где h - равномерно распределенный в (0, 1) хеш пары (том, ключ), а weight -
+    свободное место на томе. Объект помещается на том с наибольшим score, поэтому
+    доля новых объектов тома пропорциональна его свободному месту, а при добавлении
+    тома на него переходит только соответствующая его весу часть ключей
+
+    Свободное место перечитывается (statvfs) в пуле file_ops методом refresh_usage
+    не чаще раза в refresh_interval секунд: его нужно вызвать перед choose и
+    get_rebalance_target, которые используют уже прочитанные значения. Тома из
+    draining не получают новых объектов и освобождаются перебалансировкой
+    """
+
+    def __init__(
+            self,
+            volumes: dict[str, str],
+            refresh_interval: float = 60,
+            draining: Optional[list[str]] = None,
+            chunk_size: int = 1024 * 1024
+    ) -> None:
+        self.backends: dict[str, LocalStorageBackend] = {
+            name: LocalStorageBackend(root=root, chunk_size=chunk_size)
+            for name, root in volumes.items()
+        }
+        self.refresh_interval: float = refresh_interval
+        self.draining: set[str] = set(draining or ())
+        self._usage: dict[str, VolumeUsage] = {}
+        self._usage_read_at: float = -math.inf
+
+    async def refresh_usage(self) -> None:
+        if time.monotonic() - self._usage_read_at >= self.refresh_interval:
+            self._usage = await file_ops.run(self._read_usage)
+            self._usage_read_at = time.monotonic()
+
+    def get_usage(self) -> dict[str, VolumeUsage]:
+        return self._usage
+
+    def _read_usage(self) -> dict[str, VolumeUsage]:
+        usage: dict[str, VolumeUsage] = {}
+        for name, backend in self.backends.items():
+            try:
+                stat_result: os.statvfs_result = os.statvfs(backend.root)
+            except OSError:
+                usage[name] = VolumeUsage(free=0, total=0)
+                continue
+            usage[name] = VolumeUsage(
+                free=stat_result.f_bavail * stat_result.f_frsize,
+                total=stat_result.f_blocks * stat_result.f_frsize,
+            )
+        return usage
+
+    def choose(self, key: str) -> str:
+        """Возвращает том, на котором должен храниться объект с ключом key"""
+
+        usage: dict[str, VolumeUsage] = self.get_usage()
+        candidates: list[str] = [name for name in self.backends if name not in self.draining]
+        if not candidates:
+            raise ValueError("There are no volumes available for new objects")
+
+        weights: dict[str, int] = {
+            name: usage[name].free if name in usage else 0 for name in candidates
+        }
+        if not any(weights.values()):
+            weights = dict.fromkeys(candidates, 1)
+
+        return max(
+            candidates,
+            key=lambda name: -weights[name] / math.log(self._hash(name, key))
+        )
+
+    def get_rebalance_target(self, key: str, volume: Optional[str], threshold: float) -> Optional[str]:
+        """
+        Возвращает том, на который нужно перенести объект с тома volume, или None.
+        Объект переносится, если его том удален из набора или освобождается, либо
+        если доля свободного места на выбранном томе больше, чем на текущем,
+        более чем на threshold (чтобы колебания свободного места не вызывали переносов)
+        """
+
+        target: str = self.choose(key)
+        if target == volume:
+            return None
+        if volume not in self.backends or volume in self.draining:
+            return target
+
+        usage: dict[str, VolumeUsage] = self.get_usage()
+        if target not in usage or volume not in usage:
+            return None
+        if usage[target].free_fraction - usage[volume].free_fraction > threshold:
+            return target
+        return None
+
+    def get_storage(self, volume: str) -> "VolumeStorageBackend":
+        return VolumeStorageBackend(volume_set=self, volume=volume)
+
+    @staticmethod
+    def _hash(volume: str, key: str) -> float:
+        digest: bytes = hashlib.sha256(f"{volume}\0{key}".encode()).digest()
+        return (int.from_bytes(digest[:8], "big") + 1) / (2 ** 64 + 2)
+
+
+class VolumeStorageBackend(StorageBackend):
+    """
+    Хранилище объектов, размещенных на томе volume из набора volume_set
+
+    Пока перебалансировка переносит объект, он может уже отсутствовать на
+    записанном в базе данных томе. Поэтому при чтении объект, не найденный на
+    томе volume, ищется на остальных томах набора, а удаляется он со всех томов
+    """
+
+    def __init__(self, volume_set: VolumeSet, volume: str) -> None:
+        self.volume_set: VolumeSet = volume_set
+        self.volume: str = volume
+
+    @property
+    def root(self) -> str:
+        return self._get_volume_backend(self.volume).root
+
+    def get_local_path(self, key: str) -> str:
+        return self._get_volume_backend(self.volume).get_local_path(key)
+
+    async def put_file(self, key: str, source_path: str, keep_source: bool = False) -> None:
+        await self._get_volume_backend(self.volume).put_file(key, source_path, keep_source)
+
+    async def put_stream(self, key: str, chunks: AsyncIterator[bytes]) -> None:
+        await self._get_volume_backend(self.volume).put_stream(key, chunks)
+
+    async def get_stream(
+            self,
+            key: str,
+            start: int = 0,
+            end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        for volume in self._get_search_order():
+            stream: AsyncIterator[bytes] = self._get_volume_backend(volume).get_stream(key, start, end)
+            try:
+                try:
+                    chunk: bytes = await anext(stream)
+                except FileNotFoundError:
+                    continue
+                except StopAsyncIteration:
+                    return
+
+                self.volume = volume
+                yield chunk
+                async for chunk in stream:
+                    yield chunk
+                return
+            finally:
+                await stream.aclose()
+
+        raise FileNotFoundError(f"Object {key} not found on any volume")
+
+    async def stat(self, key: str) -> Optional[ObjectStat]:
+        for volume in self._get_search_order():
+            object_stat: Optional[ObjectStat] = await self._get_volume_backend(volume).stat(key)
+            if object_stat is not None:
+                self.volume = volume
+                return object_stat
+        return None
+
+    async def delete(self, key: str) -> None:
+        for backend in self.volume_set.backends.values():
+            await backend.delete(key)
+
+    def _get_search_order(self) -> list[str]:
+        volumes: list[str] = list(self.volume_set.backends)
+        if self.volume in self.volume_set.backends:
+            volumes.remove(self.volume)
+            volumes.insert(0, self.volume)
+        return volumes
+
+    def _get_volume_backend(self, volume: str) -> LocalStorageBackend:
+        try:
+            return self.volume_set.backends[volume]
+        except KeyError:
+            raise FileNotFoundError(f"Volume {volume} is not configured")
+
+
+def create_volume_set() -> Optional[VolumeSet]:
+    if project_settings.STORAGE_BACKEND != "local" or not project_settings.STORAGE_VOLUMES:
+        return None
+    return VolumeSet(
+        volumes=project_settings.STORAGE_VOLUMES,
+        refresh_interval=project_settings.STORAGE_VOLUME_REFRESH_INTERVAL,
+        draining=project_settings.STORAGE_DRAINING_VOLUMES,
+        chunk_size=project_settings.FILE_DOWNLOAD_CHUNK_SIZE,
+    )
+
+
+volume_set: Optional[VolumeSet] = create_volume_set()
@@ -0,0 +1,135 @@
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Optional
+
+from src.services.storage import StorageBackend
+
+ZIP64_VERSION: int = 45
+UTF8_FLAG: int = 1 << 11
+DATA_DESCRIPTOR_FLAG: int = 1 << 3
+ZIP64_LIMIT: int = 0xFFFFFFFF
+UNIX_FILE_ATTRIBUTES: int = 0o100644 << 16
+
+
+@dataclass
+class ZipEntry:
+    """Файл, добавляемый в архив. crc32 передается, если он уже известен"""
+
+    name: str
+    storage: StorageBackend
+    key: str
+    size: int
+    modified_at: datetime
+    crc32: Optional[int] = None
+
+
+async def stream_zip(entries: Iterable[ZipEntry]) -> AsyncIterator[bytes]:
+    """
+    Формирует ZIP64-архив из entries по мере чтения файлов из хранилища, не сохраняя его
+    ни на диск, ни в память целиком. Файлы добавляются без сжатия (stored)
+
+    Если CRC-32 файла известен заранее, он записывается в локальный заголовок.
+    Иначе он считается во время чтения файла и записывается в дескриптор данных
+    после содержимого
+    """
+
+    central_directory: list[bytes] = []
+    offset: int = 0
+
+    for entry in entries:
+        flags: int = UTF8_FLAG | (DATA_DESCRIPTOR_FLAG if entry.crc32 is None else 0)
+        name: bytes = entry.name.encode("utf-8")
+        dos_time, dos_date = _get_dos_datetime(entry.modified_at)
+        header_crc32: int = entry.crc32 if entry.crc32 is not None else 0
+
+        local_header: bytes = struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50,
+            ZIP64_VERSION,
+            flags,
+            0,
+            dos_time,
+            dos_date,
+            header_crc32,
+            ZIP64_LIMIT,
+            ZIP64_LIMIT,
+            len(name),
+            20,
+        ) + name + struct.pack("<HHQQ", 0x0001, 16, entry.size, entry.size)
+        yield local_header
+
+        crc32: int = 0
+        written: int = 0
+        if entry.size > 0:
+            async for chunk in entry.storage.get_stream(entry.key, start=0, end=entry.size - 1):
+                if entry.crc32 is None:
+                    crc32 = zlib.crc32(chunk, crc32)
+                written += len(chunk)
+                yield chunk
+        if written != entry.size:
+            raise RuntimeError(f"Object {entry.key} is shorter than {entry.size} bytes")
+
+        data_descriptor: bytes = b""
+        if entry.crc32 is None:
+            data_descriptor = struct.pack("<IIQQ", 0x08074B50, crc32, entry.size, entry.size)
+            yield data_descriptor
+        else:
+            crc32 = entry.crc32
+
+        central_directory.append(struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50,
+            (3 << 8) | ZIP64_VERSION,
+            ZIP64_VERSION,
+            flags,
+            0,
+            dos_time,
+            dos_date,
+            crc32,
+            ZIP64_LIMIT,
+            ZIP64_LIMIT,
+            len(name),
+            28,
+            0,
+            0,
+            0,
+            UNIX_FILE_ATTRIBUTES,
+            ZIP64_LIMIT,
+        ) + name + struct.pack("<HHQQQ", 0x0001, 24, entry.size, entry.size, offset))
+
+        offset += len(local_header) + entry.size + len(data_descriptor)
+
+    central_directory_offset: int = offset
+    central_directory_size: int = 0
+    for record in central_directory:
+        central_directory_size += len(record)
+        yield record
+
+    zip64_end_offset: int = central_directory_offset + central_directory_size
+    yield struct.pack(
+        "<IQHHIIQQQQ",
+        0x06064B50,
+        44,
+        (3 << 8) | ZIP64_VERSION,
+        ZIP64_VERSION,
+        0,
+        0,
+        len(central_directory),
+        len(central_directory),
+        central_directory_size,
+        central_directory_offset,
+    ) + struct.pack(
+        "<IIQI", 0x07064B50, 0, zip64_end_offset, 1
+    ) + struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, 0xFFFF, 0xFFFF, ZIP64_LIMIT, ZIP64_LIMIT, 0
+    )
+
+
+def _get_dos_datetime(value: datetime) -> tuple[int, int]:
+    if value.year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time: int = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    dos_date: int = ((value.year - 1980) << 9) | (value.month << 5) | value.day
+    return dos_time, dos_date
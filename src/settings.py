@@ -1,4 +1,5 @@
 import os
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 from pydantic_settings import SettingsConfigDict
@@ -16,15 +17,103 @@ class ProjectSettings(BaseSettings):
 
     SECRET_KEY: str
 
+    PASSWORD_HASHING_MAX_WORKERS: int = 4
+    PASSWORD_HASHING_MAX_QUEUE: int = 64
+
+    FILE_OPS_MAX_WORKERS: int = 16
+    FILE_OPS_MAX_QUEUE: int = 1024
+
     APP_TITLE: str
     APP_HOST: str
     APP_PORT: int
 
+    UPLOADS_DIR: str = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads"
+    )
+
+    FILE_PATH_FANOUT_LEVELS: int = 2
+    FILE_PATH_FANOUT_WIDTH: int = 2
+
+    FILE_LIST_PAGE_SIZE: int = 100
+    FILE_LIST_MAX_PAGE_SIZE: int = 1000
+
+    FILE_DOWNLOAD_CACHE_CONTROL: str = "private, max-age=3600"
+    FILE_DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+    FILE_DOWNLOAD_MODE: Literal["direct", "x-accel-redirect", "x-sendfile"] = "direct"
+    FILE_DOWNLOAD_ACCEL_PREFIX: str = "/internal-uploads/"
+    FILE_DOWNLOAD_ACCEL_VOLUMES_PREFIX: str = "/internal-volumes/"
+
+    SIGNED_DOWNLOAD_URL_TTL_SECONDS: int = 5 * 60
+    SIGNED_DOWNLOAD_URL_MAX_TTL_SECONDS: int = 24 * 60 * 60
+
+    STORAGE_BACKEND: Literal["local", "s3"] = "local"
+    S3_ENDPOINT_URL: str = ""
+    S3_BUCKET: str = ""
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    S3_REGION: str = "us-east-1"
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+
+    STORAGE_VOLUMES: dict[str, str] = {}
+    STORAGE_DRAINING_VOLUMES: list[str] = []
+    STORAGE_VOLUME_REFRESH_INTERVAL: float = 60
+    STORAGE_REBALANCE_INTERVAL: int = 10 * 60
+    STORAGE_REBALANCE_BATCH_SIZE: int = 1000
+    STORAGE_REBALANCE_THRESHOLD: float = 0.05
+
+    FILE_CONTENT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    FILE_CONTENT_CACHE_MAX_FILE_SIZE: int = 256 * 1024
+
+    FILE_BATCH_UPLOAD_MAX_SIZE: int = 10000
+    FILE_BATCH_INSERT_SIZE: int = 1000
+    FILE_BATCH_DELETE_MAX_SIZE: int = 10000
+
+    FILE_PURGE_INTERVAL: int = 60
+    FILE_PURGE_BATCH_SIZE: int = 1000
+
+    USER_STORAGE_QUOTA_BYTES: int = 0
+    USER_FILE_COUNT_QUOTA: int = 0
+
+    STREAM_UPLOAD_BUFFER_SIZE: int = 1024 * 1024
+
+    UPLOAD_SESSION_MAX_SIZE: int = 100 * 1024 * 1024 * 1024
+    UPLOAD_SESSION_TTL_SECONDS: int = 24 * 60 * 60
+    UPLOAD_SESSION_LOCK_TTL_SECONDS: int = 60
+    UPLOAD_SESSION_REAP_INTERVAL: int = 5 * 60
+    UPLOAD_SESSION_REAP_BATCH_SIZE: int = 1000
+
+    RECONCILE_INTERVAL: int = 24 * 60 * 60
+    RECONCILE_BATCH_SIZE: int = 1000
+    RECONCILE_WORKERS: int = 8
+    RECONCILE_GRACE_SECONDS: int = 60 * 60
+
     CELERY_BROKER_HOST: str
     CELERY_RESULT_BACKEND_HOST: str
     CELERY_BROKER_PORT: int
     CELERY_RESULT_BACKEND_PORT: int
 
+    WORKER_DOWNLOAD_CONCURRENCY: int = 16
+    WORKER_DOWNLOAD_CHUNK_SIZE: int = 1024 * 1024
+    WORKER_DOWNLOAD_CHECKPOINT_INTERVAL: int = 64 * 1024 * 1024
+    WORKER_DOWNLOAD_MAX_RETRIES: int = 5
+    WORKER_DOWNLOAD_SEGMENTS: int = 4
+    WORKER_DOWNLOAD_SEGMENT_THRESHOLD: int = 64 * 1024 * 1024
+    WORKER_DOWNLOAD_SEGMENT_RETRIES: int = 3
+
+    REDIS_HOST: str = "redis"
+    REDIS_PORT: int = 6379
+
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+    USER_CACHE_REDIS_ENABLED: bool = False
+
+    UPLOAD_PROGRESS_PUBLISH_INTERVAL: float = 1.0
+    UPLOAD_PROGRESS_TTL_SECONDS: int = 24 * 60 * 60
+
+    @property
+    def REDIS_URL(self):
+        return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}"
+
     @property
     def CELERY_BROKER_URL(self):
         return f"redis://{self.CELERY_BROKER_HOST}:{self.CELERY_BROKER_PORT}"
@@ -1,67 +1,358 @@
+import asyncio
 import os
-from typing import Optional
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional, TypeVar
+from uuid import UUID
 
-import requests
-from asgiref.sync import async_to_sync
-from celery import Celery
-from requests import HTTPError
-from sqlalchemy import select, Result, delete
-from sqlalchemy.ext.asyncio import AsyncSession
+import httpx
+from celery import Celery, Task, group
+from celery.signals import worker_process_shutdown, worker_shutdown
+from sqlalchemy import update
 
+from src.commands import reconcile_files as reconciliation
 from src.database.config import database_settings
-from src.database.models import File
+from src.database.models import File, FileStatus
+from src.services.blob_store import BlobStore, rebalance_blobs
+from src.services.dals import FileDAL
+from src.services.downloader import Downloader, DownloadState
+from src.services.file_ops import file_ops_executor
+from src.services.progress import ProgressReporter, progress_store
+from src.services.storage import storage_backend
+from src.services.upload_sessions import UploadSession, upload_session_store
+from src.services.volumes import volume_set
 from src.settings import project_settings
 
+T = TypeVar("T")
+
 
 celery: Celery = Celery("worker")
 celery.conf.broker_url = project_settings.CELERY_BROKER_URL
 celery.conf.result_backend = project_settings.CELERY_RESULT_BACKEND_URL
+celery.conf.worker_pool = "threads"
+celery.conf.worker_concurrency = project_settings.WORKER_DOWNLOAD_CONCURRENCY
+celery.conf.beat_schedule = {
+    "reap-upload-sessions": {
+        "task": "reap_upload_sessions",
+        "schedule": project_settings.UPLOAD_SESSION_REAP_INTERVAL,
+    },
+    "purge-deleted-files": {
+        "task": "purge_deleted_files",
+        "schedule": project_settings.FILE_PURGE_INTERVAL,
+    },
+    "reconcile-files": {
+        "task": "reconcile_files",
+        "schedule": project_settings.RECONCILE_INTERVAL,
+    },
+}
+if volume_set is not None:
+    celery.conf.beat_schedule["rebalance-volumes"] = {
+        "task": "rebalance_volumes",
+        "schedule": project_settings.STORAGE_REBALANCE_INTERVAL,
+    }
+
+
+class WorkerEventLoop:
+    """
+    Долгоживущий event loop процесса воркера, работающий в отдельном потоке
+
+    Задачи Celery (выполняемые в потоках пула) передают в него корутины через
+    метод run, поэтому все загрузки процесса используют общие HTTP-клиент и пул
+    соединений с базой данных и выполняются конкурентно
+    """
+
+    def __init__(self) -> None:
+        self.downloader: Optional[Downloader] = None
+        self.rebalance_after: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        future: Future = asyncio.run_coroutine_threadsafe(coroutine, self._get_loop())
+        return future.result()
+
+    def get_downloader(self) -> Downloader:
+        if self.downloader is None:
+            self.downloader = Downloader(
+                max_concurrency=project_settings.WORKER_DOWNLOAD_CONCURRENCY,
+                chunk_size=project_settings.WORKER_DOWNLOAD_CHUNK_SIZE,
+                checkpoint_interval=project_settings.WORKER_DOWNLOAD_CHECKPOINT_INTERVAL,
+                segments=project_settings.WORKER_DOWNLOAD_SEGMENTS,
+                segment_threshold=project_settings.WORKER_DOWNLOAD_SEGMENT_THRESHOLD,
+                segment_retries=project_settings.WORKER_DOWNLOAD_SEGMENT_RETRIES,
+            )
+        return self.downloader
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._loop is None:
+                return
+
+            asyncio.run_coroutine_threadsafe(self._close_resources(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop = None
+            self._thread = None
+            file_ops_executor.shutdown()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="worker-event-loop", daemon=True
+                )
+                self._thread.start()
+            return self._loop
+
+    async def _close_resources(self) -> None:
+        if self.downloader is not None:
+            await self.downloader.close()
+            self.downloader = None
+        await progress_store.close()
+        await upload_session_store.close()
+        await storage_backend.close()
+        await database_settings.dispose_engine()
+
+
+worker_loop: WorkerEventLoop = WorkerEventLoop()
+
 
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def _stop_worker_loop(**kwargs) -> None:
+    worker_loop.stop()
 
-@celery.task(name="download_file_to_server")
+
+class DownloadTask(Task):
+    """
+    Задача загрузки файла, помечающая файл как неудачно загруженный,
+    если все попытки загрузки исчерпаны
+    """
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo) -> None:
+        worker_loop.run(_mark_download_failed(kwargs["file_id"], kwargs["file_path"]))
+        worker_loop.run(progress_store.update(
+            kwargs["file_id"], status=FileStatus.FAILED, bytes_received=0
+        ))
+
+
+@celery.task(
+    name="download_file_to_server",
+    base=DownloadTask,
+    autoretry_for=(httpx.TransportError,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=project_settings.WORKER_DOWNLOAD_MAX_RETRIES,
+)
 def download_file_to_server(file_url: str, file_id: str, file_path: str) -> None:
-    try:
-        response = requests.get(file_url, stream=True)
-        response.raise_for_status()
-
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=1024 * 1024):
-                if chunk:
-                    f.write(chunk)
-
-        file_size = os.path.getsize(file_path)
-        session = async_to_sync(_get_db_session_for_task)()
-        async_to_sync(_update_file_size)(session, file_id, file_size)
-    except HTTPError:
-        print(f"File with this url not found")
-        session = async_to_sync(_get_db_session_for_task)()
-        async_to_sync(_delete_nonexistent_file_from_db)(session, file_id)
+    worker_loop.run(_download_file_to_server(file_url, file_id, file_path))
+
+
+@celery.task(name="download_files_to_server")
+def download_files_to_server(downloads: list[dict[str, str]]) -> None:
+    """
+    Ставит в очередь загрузку пакета файлов. Сервер отправляет брокеру одно
+    сообщение на весь пакет, а отдельные задачи download_file_to_server
+    публикуются воркером одной группой
+    """
+
+    group(download_file_to_server.s(**download) for download in downloads).apply_async()
+
+
+@celery.task(name="reap_upload_sessions")
+def reap_upload_sessions() -> None:
+    """
+    Удаляет сессии загрузки по частям, которые не продлевались дольше
+    UPLOAD_SESSION_TTL_SECONDS, вместе с недозагруженными файлами
+    """
+
+    worker_loop.run(_reap_upload_sessions())
+
+
+async def _reap_upload_sessions() -> None:
+    while True:
+        sessions: list[UploadSession] = await upload_session_store.get_expired(
+            limit=project_settings.UPLOAD_SESSION_REAP_BATCH_SIZE
+        )
+        for session in sessions:
+            await _mark_download_failed(session.file_id, session.file_path)
+            await upload_session_store.delete(session.file_id)
+            await progress_store.update(
+                session.file_id, status=FileStatus.FAILED, bytes_received=session.offset
+            )
 
+        if len(sessions) < project_settings.UPLOAD_SESSION_REAP_BATCH_SIZE:
+            return
 
-async def _get_db_session_for_task() -> AsyncSession:
-    session: AsyncSession = database_settings.async_session()
-    return session
 
+@celery.task(name="purge_deleted_files")
+def purge_deleted_files() -> None:
+    """
+    Окончательно удаляет файлы, помеченные удаленными, пачками по
+    FILE_PURGE_BATCH_SIZE записей
+    """
 
-async def _update_file_size(session: AsyncSession, file_id: str, file_size: int) -> None:
+    worker_loop.run(_purge_deleted_files())
+
+
+async def _purge_deleted_files() -> None:
+    while True:
+        async with database_settings.async_session() as session:
+            purged: int = await FileDAL(db_session=session).purge_deleted_files(
+                limit=project_settings.FILE_PURGE_BATCH_SIZE
+            )
+        if purged < project_settings.FILE_PURGE_BATCH_SIZE:
+            return
+
+
+@celery.task(name="reconcile_files")
+def reconcile_files() -> None:
+    """
+    Удаляет файлы, для которых нет записей в базе данных, и ставит в очередь
+    на повторную загрузку файлы, пропавшие с диска (см. src.commands.reconcile_files)
+    """
+
+    report: reconciliation.ReconciliationReport = worker_loop.run(reconciliation.reconcile_files(
+        session_factory=database_settings.async_session,
+        batch_size=project_settings.RECONCILE_BATCH_SIZE,
+        workers=project_settings.RECONCILE_WORKERS,
+        grace_seconds=project_settings.RECONCILE_GRACE_SECONDS,
+        on_requeue=_requeue_downloads,
+    ))
+    print(f"Files reconciled: {report}")
+
+
+def _requeue_downloads(downloads: list[dict[str, str]]) -> None:
+    download_files_to_server.apply_async(kwargs={"downloads": downloads})
+
+
+@celery.task(name="rebalance_volumes")
+def rebalance_volumes() -> None:
+    """
+    Переносит между томами STORAGE_VOLUMES содержимое, размещение которого
+    больше не соответствует свободному месту на томах. За один запуск проверяется
+    не более STORAGE_REBALANCE_BATCH_SIZE записей, следующий запуск в этом
+    процессе продолжает с места остановки
+    """
+
+    if volume_set is not None:
+        worker_loop.run(_rebalance_volumes())
+
+
+async def _rebalance_volumes() -> None:
+    moved, worker_loop.rebalance_after = await rebalance_blobs(
+        session_factory=database_settings.async_session,
+        volumes=volume_set,
+        batch_size=project_settings.STORAGE_REBALANCE_BATCH_SIZE,
+        threshold=project_settings.STORAGE_REBALANCE_THRESHOLD,
+        after=worker_loop.rebalance_after,
+    )
+    if moved:
+        print(f"Rebalanced {moved} objects between storage volumes")
+
+
+async def _download_file_to_server(file_url: str, file_id: str, file_path: str) -> None:
+    state: Optional[DownloadState] = await _get_download_state(file_id)
+    if state is None:
+        return
+
+    async def save_checkpoint(checkpoint: DownloadState) -> None:
+        await _save_download_checkpoint(file_id, checkpoint)
+
+    reporter: ProgressReporter = ProgressReporter(
+        store=progress_store,
+        file_id=file_id,
+        interval=project_settings.UPLOAD_PROGRESS_PUBLISH_INTERVAL,
+    )
+    await reporter.start(bytes_received=state.downloaded_bytes)
+
+    started_at: float = time.monotonic()
     try:
+        state = await worker_loop.get_downloader().download(
+            file_url=file_url,
+            file_path=file_path,
+            state=state,
+            on_checkpoint=save_checkpoint,
+            on_progress=reporter.update,
+        )
+    except httpx.HTTPStatusError:
+        print(f"File with this url not found")
+        await _mark_download_failed(file_id, file_path)
+        await reporter.finish(status=FileStatus.FAILED)
+        return
+
+    elapsed: float = max(time.monotonic() - started_at, 1e-6)
+    print(
+        f"File {file_id} downloaded: {state.downloaded_bytes} bytes in {elapsed:.2f} s "
+        f"({state.downloaded_bytes / elapsed / 1024 / 1024:.2f} MiB/s)"
+    )
+    await _store_downloaded_file(file_id, file_path, state)
+    await reporter.finish(status=FileStatus.COMPLETED, bytes_received=state.downloaded_bytes)
+
+
+async def _get_download_state(file_id: str) -> Optional[DownloadState]:
+    async with database_settings.async_session() as session:
         async with session.begin():
-            result: Result = await session.execute(select(File).filter_by(file_id=file_id))
-            file: Optional[File] = result.scalar_one_or_none()
+            result = await session.execute(
+                update(File)
+                .filter_by(file_id=file_id, deleted_at=None)
+                .values(status=FileStatus.DOWNLOADING.value)
+                .returning(File.downloaded_bytes, File.etag, File.last_modified)
+            )
+            row = result.first()
 
-            if file:
-                file.size = file_size
-                await session.commit()
-    finally:
-        await session.close()
+    if row is None:
+        return None
+    return DownloadState(
+        downloaded_bytes=row.downloaded_bytes, etag=row.etag, last_modified=row.last_modified
+    )
 
 
-async def _delete_nonexistent_file_from_db(session: AsyncSession, file_id: str) -> None:
-    try:
+async def _save_download_checkpoint(file_id: str, state: DownloadState) -> None:
+    async with database_settings.async_session() as session:
         async with session.begin():
-            await session.execute(delete(File).filter_by(file_id=file_id))
-    finally:
-        await session.close()
+            await session.execute(
+                update(File).filter_by(file_id=file_id).values(
+                    downloaded_bytes=state.downloaded_bytes,
+                    etag=state.etag,
+                    last_modified=state.last_modified,
+                )
+            )
+
+
+async def _store_downloaded_file(file_id: str, file_path: str, state: DownloadState) -> None:
+    sha256: Optional[str] = state.sha256
+    crc32: Optional[int] = state.crc32
+    if sha256 is None:
+        sha256, crc32 = await asyncio.to_thread(BlobStore.checksum_file, file_path)
 
+    async with database_settings.async_session() as session:
+        await BlobStore(db_session=session).store(
+            file_id=UUID(file_id),
+            staging_path=file_path,
+            sha256=sha256,
+            size=state.downloaded_bytes,
+            crc32=crc32,
+        )
 
 
+async def _mark_download_failed(file_id: str, file_path: str) -> None:
+    async with database_settings.async_session() as session:
+        async with session.begin():
+            await session.execute(
+                update(File).filter_by(file_id=file_id).values(
+                    status=FileStatus.FAILED.value,
+                    downloaded_bytes=0,
+                    etag=None,
+                    last_modified=None,
+                )
+            )
+
+    try:
+        await asyncio.to_thread(os.remove, file_path)
+    except FileNotFoundError:
+        pass
@@ -18,6 +18,9 @@ from sqlalchemy.ext.asyncio import create_async_engine
 
 from src.dependencies import get_db_session
 from src.main import app
+from src.services.cache import user_cache
+from src.services.progress import progress_store
+from src.services.upload_sessions import upload_session_store
 from src.services.security import create_jwt_token
 from src.settings import project_settings
 
@@ -33,7 +36,7 @@ TEST_SYNC_DATABASE_URL: str = (
     f"{os.getenv('TEST_DB_HOST')}:{os.getenv('INTERNAL_DB_PORT')}/{os.getenv('TEST_DB_NAME')}"
 )
 
-TABLES: list[str] = ["user", "file"]
+TABLES: list[str] = ["user", "file", "blob", "user_usage"]
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -73,6 +76,18 @@ async def clean_tables(get_async_session: AsyncSession) -> None:
             )
 
 
+@pytest.fixture(scope="function", autouse=True)
+def clear_user_cache() -> None:
+    user_cache.clear()
+
+
+@pytest.fixture(scope="function", autouse=True)
+async def close_redis_stores() -> None:
+    yield
+    await progress_store.close()
+    await upload_session_store.close()
+
+
 @pytest.fixture(scope="function")
 async def async_client() -> Generator[AsyncClient, Any, None]:
     """Fixture that creates testing client and overrides get_db_session dependence"""
@@ -219,19 +234,65 @@ def create_file_in_database(pg_pool: pool.SimpleConnectionPool) -> Callable:
             filename: str,
             file_path: str,
             user_id: str,
+            blob_sha256: Optional[str] = None,
+            status: str = "completed",
+            source_url: Optional[str] = None,
+            size: int = 0,
     ) -> None:
         connection = pg_pool.getconn()
         with connection.cursor() as cursor:
             try:
                 cursor.execute(
                     """
-                    INSERT INTO "file" (user_id, file_id, filename, file_path, size)
-                    VALUES (%s, %s, %s, %s, %s);
+                    INSERT INTO "file" (user_id, file_id, filename, file_path, size, blob_sha256, status, source_url)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
                     """,
-                    (user_id, file_id, filename, file_path, 0),
+                    (user_id, file_id, filename, file_path, size, blob_sha256, status, source_url),
                 )
                 connection.commit()
             finally:
                 pg_pool.putconn(connection)
 
     return create_file_in_database
+
+
+@pytest.fixture
+def create_blob_in_database(pg_pool: pool.SimpleConnectionPool) -> Callable:
+    def create_blob_in_database(
+            sha256: str,
+            size: int,
+            ref_count: int,
+            crc32: Optional[int] = None,
+            volume: Optional[str] = None
+    ) -> None:
+        connection = pg_pool.getconn()
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute(
+                    """
+                    INSERT INTO "blob" (sha256, size, ref_count, crc32, volume)
+                    VALUES (%s, %s, %s, %s, %s);
+                    """,
+                    (sha256, size, ref_count, crc32, volume),
+                )
+                connection.commit()
+            finally:
+                pg_pool.putconn(connection)
+
+    return create_blob_in_database
+
+
+@pytest.fixture
+def get_blob_from_database(pg_pool: pool.SimpleConnectionPool) -> Callable:
+    def get_blob_from_database_by_sha256(sha256: str) -> Optional[dict]:
+        connection = pg_pool.getconn()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("""SELECT size, ref_count, volume FROM "blob" WHERE sha256 = %s""", (sha256,))
+                blob: Optional[tuple] = cursor.fetchone()
+                return None if blob is None else {"size": blob[0], "ref_count": blob[1], "volume": blob[2]}
+        finally:
+            pg_pool.putconn(connection)
+
+    return get_blob_from_database_by_sha256
+
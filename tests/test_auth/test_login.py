@@ -1,6 +1,7 @@
 import uuid
 from datetime import timedelta
 from typing import Callable
+from unittest.mock import patch
 
 from fastapi import status
 from httpx import AsyncClient
@@ -8,7 +9,8 @@ from httpx import Response
 
 from src.settings import project_settings
 from src.services import security
-from src.services.hashing import get_password_hash
+from src.services.executors import ExecutorOverloadedError
+from src.services.hashing import get_password_hash, hashing_executor
 
 
 async def test_login_when_user_exists(
@@ -91,3 +93,33 @@ async def test_login_when_password_is_incorrect(
         "/api/auth/login", data=login_data
     )
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+async def test_login_when_hashing_is_overloaded(
+    async_client: AsyncClient, create_user_in_database: Callable
+):
+    user_data: dict = {
+        "user_id": str(uuid.uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+
+    login_data: dict = {
+        "grant_type": None,
+        "username": "user@example.com",
+        "password": "1234",
+        "scope": None,
+        "client_id": None,
+        "client_secret": None,
+    }
+    with patch.object(hashing_executor, "run", side_effect=ExecutorOverloadedError):
+        response: Response = await async_client.post(
+            "/api/auth/login", data=login_data
+        )
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,69 @@
+import uuid
+from typing import Callable
+
+from fastapi import status
+from httpx import AsyncClient
+from httpx import Response
+
+from src.services.cache import user_cache
+from src.services.hashing import get_password_hash
+from tests.conftest import create_test_auth_headers_for_user
+
+
+async def test_authenticated_user_is_cached(
+    async_client: AsyncClient, create_user_in_database: Callable
+):
+    user_data: dict = {
+        "user_id": str(uuid.uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    hits_before: int = user_cache.hits
+    misses_before: int = user_cache.misses
+
+    for _ in range(2):
+        response: Response = await async_client.post(
+            "/api/auth/refresh-token",
+            headers=create_test_auth_headers_for_user(user_data["email"]),
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    assert user_cache.misses == misses_before + 1
+    assert user_cache.hits == hits_before + 1
+
+    cached_user = await user_cache.get(email=user_data["email"])
+    assert str(cached_user.user_id) == user_data["user_id"]
+
+
+async def test_invalidated_user_is_loaded_from_database(
+    async_client: AsyncClient, create_user_in_database: Callable
+):
+    user_data: dict = {
+        "user_id": str(uuid.uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+
+    response: Response = await async_client.post(
+        "/api/auth/refresh-token",
+        headers=create_test_auth_headers_for_user(user_data["email"]),
+    )
+    assert response.status_code == status.HTTP_200_OK
+
+    await user_cache.invalidate(email=user_data["email"])
+    misses_before: int = user_cache.misses
+
+    response = await async_client.post(
+        "/api/auth/refresh-token",
+        headers=create_test_auth_headers_for_user(user_data["email"]),
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert user_cache.misses == misses_before + 1
@@ -0,0 +1,62 @@
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.commands.migrate_file_layout import LayoutMigrationReport, migrate_file_layout
+from src.services.hashing import get_password_hash
+from src.services.services import FileService
+from src.settings import project_settings
+
+
+async def test_migrate_file_layout(
+        configure_async_session: async_sessionmaker,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        get_file_from_database: Callable,
+        tmp_path: Path
+):
+    user_id: str = str(uuid4())
+    create_user_in_database(
+        user_id=user_id,
+        username="some_username",
+        email="user@example.com",
+        hashed_password=get_password_hash("1234"),
+        phone_number="+79208443222",
+        birthdate="2020-02-11",
+    )
+
+    flat_paths: dict[str, Path] = {}
+    for filename in ("first.txt", "second.txt", "pending.txt"):
+        flat_paths[filename] = tmp_path / user_id / filename
+        flat_paths[filename].parent.mkdir(parents=True, exist_ok=True)
+        flat_paths[filename].write_text(filename)
+        create_file_in_database(
+            file_id=str(uuid4()),
+            filename=filename,
+            file_path=str(flat_paths[filename]),
+            user_id=user_id,
+            status="pending" if filename == "pending.txt" else "completed",
+        )
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)), \
+            patch.object(project_settings, "FILE_PATH_FANOUT_LEVELS", 2):
+        dry_run_report: LayoutMigrationReport = await migrate_file_layout(
+            session_factory=configure_async_session, batch_size=1, workers=2, dry_run=True
+        )
+        report: LayoutMigrationReport = await migrate_file_layout(
+            session_factory=configure_async_session, batch_size=1, workers=2
+        )
+        expected_path: str = FileService.build_file_path(user_id, "first.txt")
+
+    assert dry_run_report.rewritten == 2
+    assert flat_paths["first.txt"].exists()
+    assert (report.scanned, report.rewritten, report.moved, report.conflicts) == (2, 2, 2, 0)
+
+    assert get_file_from_database(filename="first.txt", user_id=user_id)["file_path"] == expected_path
+    assert Path(expected_path).read_text() == "first.txt"
+    assert not flat_paths["first.txt"].exists()
+    assert not flat_paths["second.txt"].exists()
+    assert flat_paths["pending.txt"].exists()
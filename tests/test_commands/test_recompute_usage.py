@@ -0,0 +1,67 @@
+from typing import Callable
+from uuid import uuid4
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.commands.recompute_usage import UsageRepairReport, recompute_usage
+from src.database.models import UserUsage
+from src.services.hashing import get_password_hash
+
+
+async def test_recompute_usage(
+        configure_async_session: async_sessionmaker,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable
+):
+    user_ids: list[str] = [str(uuid4()) for _ in range(3)]
+    for number, user_id in enumerate(user_ids):
+        create_user_in_database(
+            user_id=user_id,
+            username=f"username{number}",
+            email=f"user{number}@example.com",
+            hashed_password=get_password_hash("1234"),
+            phone_number=f"+7920844322{number}",
+            birthdate="2020-02-11",
+        )
+
+    for filename, status, size in (
+            ("first.txt", "completed", 10),
+            ("second.txt", "completed", 20),
+            ("pending.txt", "pending", 30),
+            ("failed.txt", "failed", 40),
+    ):
+        create_file_in_database(
+            file_id=str(uuid4()),
+            filename=filename,
+            file_path=f"/some_way/uploads/{user_ids[0]}/{filename}",
+            user_id=user_ids[0],
+            status=status,
+            size=size,
+        )
+    create_file_in_database(
+        file_id=str(uuid4()),
+        filename="example.txt",
+        file_path=f"/some_way/uploads/{user_ids[1]}/example.txt",
+        user_id=user_ids[1],
+        size=5,
+    )
+
+    dry_run_report: UsageRepairReport = await recompute_usage(
+        session_factory=configure_async_session, batch_size=2, dry_run=True
+    )
+    report: UsageRepairReport = await recompute_usage(session_factory=configure_async_session, batch_size=2)
+    repeated_report: UsageRepairReport = await recompute_usage(
+        session_factory=configure_async_session, batch_size=2
+    )
+
+    assert (dry_run_report.scanned, dry_run_report.fixed) == (3, 2)
+    assert (report.scanned, report.fixed) == (3, 2)
+    assert repeated_report.fixed == 0
+
+    async with configure_async_session() as session:
+        result = await session.execute(select(UserUsage.user_id, UserUsage.file_count, UserUsage.total_bytes))
+        usage: dict[str, tuple[int, int]] = {
+            str(user_id): (file_count, total_bytes) for user_id, file_count, total_bytes in result
+        }
+    assert usage == {user_ids[0]: (2, 30), user_ids[1]: (1, 5), user_ids[2]: (0, 0)}
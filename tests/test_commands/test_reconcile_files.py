@@ -0,0 +1,157 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.commands.reconcile_files import DiskEntry, ReconciliationReport, reconcile_files, scan_tree
+from src.database.models import File
+from src.services.blob_store import BlobStore
+from src.services.hashing import get_password_hash
+from src.services.volumes import VolumeSet
+from src.settings import project_settings
+
+
+def create_old_file(path: Path, content: str = "content") -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+    os.utime(path, (time.time() - 7200, time.time() - 7200))
+    return path
+
+
+async def test_scan_tree_returns_paths_in_string_order(tmp_path: Path):
+    for relative_path in ("a/x", "a-b", "a.c/y/z", "ab", "b/c/d", "a/b/c", "blobs/skipped", "b/v/skipped"):
+        create_old_file(tmp_path / relative_path)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        entries: list[DiskEntry] = [
+            entry async for entry in scan_tree(str(tmp_path), executor, workers=2, skip={"blobs", "b/v"})
+        ]
+
+    paths: list[str] = [entry.path for entry in entries]
+    assert paths == sorted(paths)
+    assert [os.path.relpath(path, tmp_path) for path in paths] == [
+        "a-b", "a.c/y/z", "a/b/c", "a/x", "ab", "b/c/d"
+    ]
+    assert entries[0].size == len("content")
+
+
+async def test_reconcile_files(
+        configure_async_session: async_sessionmaker,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        create_blob_in_database: Callable,
+        tmp_path: Path
+):
+    user_id: str = str(uuid4())
+    create_user_in_database(
+        user_id=user_id,
+        username="some_username",
+        email="user@example.com",
+        hashed_password=get_password_hash("1234"),
+        phone_number="+79208443222",
+        birthdate="2020-02-11",
+    )
+
+    user_dir: Path = tmp_path / user_id
+    kept_path: Path = create_old_file(user_dir / "kept.txt")
+    pending_path: Path = create_old_file(user_dir / "pending.txt")
+    failed_path: Path = create_old_file(user_dir / "failed.txt")
+    orphan_path: Path = create_old_file(user_dir / "orphan.txt")
+    recent_path: Path = user_dir / "recent.txt"
+    recent_path.write_text("content")
+    for filename, status, source_url in (
+            ("kept.txt", "completed", None),
+            ("pending.txt", "pending", None),
+            ("failed.txt", "failed", None),
+            ("missing.txt", "completed", "http://example.com/missing.txt"),
+            ("lost.txt", "completed", None),
+    ):
+        create_file_in_database(
+            file_id=str(uuid4()),
+            filename=filename,
+            file_path=str(user_dir / filename),
+            user_id=user_id,
+            status=status,
+            source_url=source_url,
+        )
+
+    blob_sha256: str = "a" * 64
+    create_blob_in_database(sha256=blob_sha256, size=7, ref_count=1)
+    blob_path: Path = create_old_file(tmp_path / BlobStore.get_blob_key(blob_sha256))
+    orphan_blob_path: Path = create_old_file(tmp_path / BlobStore.get_blob_key("b" * 64))
+
+    requeued: list[dict[str, str]] = []
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        dry_run_report: ReconciliationReport = await reconcile_files(
+            session_factory=configure_async_session,
+            batch_size=2,
+            workers=2,
+            grace_seconds=3600,
+            on_requeue=requeued.extend,
+            dry_run=True,
+        )
+        assert orphan_path.exists()
+
+        report: ReconciliationReport = await reconcile_files(
+            session_factory=configure_async_session,
+            batch_size=2,
+            workers=2,
+            grace_seconds=3600,
+            on_requeue=requeued.extend,
+        )
+
+    assert (dry_run_report.orphan_files, dry_run_report.orphan_blobs, dry_run_report.missing_files) == (2, 1, 2)
+    assert dry_run_report.deleted == 0
+    assert (report.deleted, report.requeued, report.marked_failed, report.recent_files) == (3, 1, 1, 1)
+
+    assert kept_path.exists() and pending_path.exists() and recent_path.exists() and blob_path.exists()
+    assert not failed_path.exists() and not orphan_path.exists() and not orphan_blob_path.exists()
+    assert requeued == [{
+        "file_url": "http://example.com/missing.txt",
+        "file_id": requeued[0]["file_id"],
+        "file_path": str(user_dir / "missing.txt"),
+    }]
+
+    async with configure_async_session() as session:
+        statuses: dict[str, str] = dict((await session.execute(select(File.filename, File.status))).all())
+    assert statuses["missing.txt"] == "pending"
+    assert statuses["lost.txt"] == "failed"
+
+
+@pytest.mark.parametrize("volume_dir", ["", "volumes/a"])
+async def test_reconcile_files_with_volume_in_uploads_dir(
+        configure_async_session: async_sessionmaker,
+        create_blob_in_database: Callable,
+        tmp_path: Path,
+        volume_dir: str
+):
+    volume_root: Path = tmp_path / volume_dir
+    volume_blob_sha256: str = "a" * 64
+    uploads_blob_sha256: str = "b" * 64
+    create_blob_in_database(sha256=volume_blob_sha256, size=7, ref_count=1, volume="a")
+    create_blob_in_database(sha256=uploads_blob_sha256, size=7, ref_count=1)
+    volume_blob_path: Path = create_old_file(volume_root / BlobStore.get_blob_key(volume_blob_sha256))
+    uploads_blob_path: Path = create_old_file(tmp_path / BlobStore.get_blob_key(uploads_blob_sha256))
+    orphan_blob_path: Path = create_old_file(volume_root / BlobStore.get_blob_key("c" * 64))
+
+    with (
+        patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)),
+        patch("src.commands.reconcile_files.volume_set", VolumeSet(volumes={"a": str(volume_root)})),
+    ):
+        report: ReconciliationReport = await reconcile_files(
+            session_factory=configure_async_session,
+            batch_size=2,
+            workers=2,
+            grace_seconds=3600,
+        )
+
+    assert (report.orphan_files, report.orphan_blobs, report.missing_blobs, report.deleted) == (0, 1, 0, 1)
+    assert volume_blob_path.exists() and uploads_blob_path.exists()
+    assert not orphan_blob_path.exists()
@@ -0,0 +1,226 @@
+import hashlib
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+from httpx import AsyncClient, Response
+from fastapi import status
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.services.blob_store import BlobStore
+from src.services.hashing import get_password_hash
+from src.services.upload_sessions import upload_session_store
+from src.settings import project_settings
+from tests.conftest import create_test_auth_headers_for_user
+
+
+async def test_chunked_upload_successfully(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        get_file_from_database: Callable,
+        get_blob_from_database: Callable,
+        tmp_path: Path
+):
+    user_data: dict = {
+        "user_id": str(uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    headers: dict = create_test_auth_headers_for_user(user_data["email"])
+    content: bytes = b"0123456789" * 100
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        response: Response = await async_client.post(
+            url="/api/file/uploads",
+            json={"filename": "example.bin", "size": len(content)},
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        file_id: str = response.json()["file_id"]
+
+        response = await async_client.patch(
+            url=f"/api/file/uploads/{file_id}",
+            content=content[:600],
+            headers={**headers, "Upload-Offset": "0"},
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert response.headers["Upload-Offset"] == "600"
+
+        response = await async_client.post(url=f"/api/file/uploads/{file_id}/finalize", headers=headers)
+        assert response.status_code == status.HTTP_409_CONFLICT
+
+        response = await async_client.patch(
+            url=f"/api/file/uploads/{file_id}",
+            content=content[:600],
+            headers={**headers, "Upload-Offset": "0"},
+        )
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response.headers["Upload-Offset"] == "600"
+
+        response = await async_client.head(url=f"/api/file/uploads/{file_id}", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["Upload-Offset"] == "600"
+        assert response.headers["Upload-Length"] == str(len(content))
+
+        response = await async_client.patch(
+            url=f"/api/file/uploads/{file_id}",
+            content=content[600:] + b"extra",
+            headers={**headers, "Upload-Offset": "600"},
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = await async_client.patch(
+            url=f"/api/file/uploads/{file_id}",
+            content=content[600:],
+            headers={**headers, "Upload-Offset": "600"},
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+
+        response = await async_client.post(url=f"/api/file/uploads/{file_id}/finalize", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["size"] == len(content)
+
+        response = await async_client.head(url=f"/api/file/uploads/{file_id}", headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    assert get_file_from_database(filename="example.bin", user_id=user_data["user_id"])["size"] == len(content)
+    assert get_blob_from_database(sha256=hashlib.sha256(content).hexdigest())["size"] == len(content)
+
+
+async def test_chunked_upload_of_another_user(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        tmp_path: Path
+):
+    users: list[dict] = []
+    for number in range(2):
+        user_data: dict = {
+            "user_id": str(uuid4()),
+            "username": f"some_username{number}",
+            "email": f"user{number}@example.com",
+            "hashed_password": get_password_hash("1234"),
+            "phone_number": f"+7920844322{number}",
+            "birthdate": "2020-02-11"
+        }
+        create_user_in_database(**user_data)
+        users.append(user_data)
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        response: Response = await async_client.post(
+            url="/api/file/uploads",
+            json={"filename": "example.bin", "size": 10},
+            headers=create_test_auth_headers_for_user(users[0]["email"]),
+        )
+        file_id: str = response.json()["file_id"]
+
+        response = await async_client.patch(
+            url=f"/api/file/uploads/{file_id}",
+            content=b"0123456789",
+            headers={**create_test_auth_headers_for_user(users[1]["email"]), "Upload-Offset": "0"},
+        )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+async def test_chunked_upload_while_session_is_locked(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        get_blob_from_database: Callable,
+        tmp_path: Path
+):
+    user_data: dict = {
+        "user_id": str(uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    headers: dict = create_test_auth_headers_for_user(user_data["email"])
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        response: Response = await async_client.post(
+            url="/api/file/uploads",
+            json={"filename": "example.bin", "size": 10},
+            headers=headers,
+        )
+        file_id: str = response.json()["file_id"]
+
+        token: str = await upload_session_store.claim(file_id=file_id, offset=0)
+        response = await async_client.patch(
+            url=f"/api/file/uploads/{file_id}",
+            content=b"0123456789",
+            headers={**headers, "Upload-Offset": "0"},
+        )
+        assert response.status_code == status.HTTP_423_LOCKED
+
+        await upload_session_store.release(file_id=file_id, token=token)
+        response = await async_client.patch(
+            url=f"/api/file/uploads/{file_id}",
+            content=b"0123456789",
+            headers={**headers, "Upload-Offset": "0"},
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert response.headers["Upload-Offset"] == "10"
+
+        token = await upload_session_store.claim(file_id=file_id, offset=10)
+        response = await async_client.post(url=f"/api/file/uploads/{file_id}/finalize", headers=headers)
+        assert response.status_code == status.HTTP_423_LOCKED
+
+        await upload_session_store.release(file_id=file_id, token=token)
+        response = await async_client.post(url=f"/api/file/uploads/{file_id}/finalize", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = await async_client.post(url=f"/api/file/uploads/{file_id}/finalize", headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    assert get_blob_from_database(sha256=hashlib.sha256(b"0123456789").hexdigest())["ref_count"] == 1
+
+
+async def test_store_of_already_completed_file(
+        configure_async_session: async_sessionmaker,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        create_blob_in_database: Callable,
+        get_blob_from_database: Callable,
+        tmp_path: Path
+):
+    user_id: str = str(uuid4())
+    create_user_in_database(
+        user_id=user_id,
+        username="some_username",
+        email="user@example.com",
+        hashed_password=get_password_hash("1234"),
+        phone_number="+79208443222",
+        birthdate="2020-02-11",
+    )
+    content: bytes = b"0123456789"
+    sha256: str = hashlib.sha256(content).hexdigest()
+    file_id = uuid4()
+    create_blob_in_database(sha256=sha256, size=len(content), ref_count=1)
+    create_file_in_database(
+        file_id=str(file_id),
+        filename="example.bin",
+        file_path=str(tmp_path / "example.bin"),
+        user_id=user_id,
+        blob_sha256=sha256,
+        size=len(content),
+    )
+    staging_path: Path = tmp_path / "example.bin.part"
+    staging_path.write_bytes(content)
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        async with configure_async_session() as session:
+            stored: bool = await BlobStore(db_session=session).store(
+                file_id=file_id, staging_path=str(staging_path), sha256=sha256, size=len(content)
+            )
+
+    assert stored
+    assert not staging_path.exists()
+    assert get_blob_from_database(sha256=sha256)["ref_count"] == 1
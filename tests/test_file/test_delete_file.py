@@ -3,17 +3,28 @@ from uuid import uuid4
 
 from httpx import AsyncClient, Response
 from fastapi import status
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
+from src.services.blob_store import BlobStore
+from src.services.dals import FileDAL
 from src.services.hashing import get_password_hash
 from tests.conftest import create_test_auth_headers_for_user
 from pathlib import Path
+import hashlib
 import os
 
 
+async def purge_deleted_files(session_factory: async_sessionmaker) -> int:
+    async with session_factory() as session:
+        return await FileDAL(db_session=session).purge_deleted_files(limit=100)
+
+
 async def test_delete_file_successfully(
         async_client: AsyncClient,
+        configure_async_session: async_sessionmaker,
         create_user_in_database: Callable,
-        create_file_in_database: Callable
+        create_file_in_database: Callable,
+        get_file_from_database: Callable
 ):
     user_id: str = str(uuid4())
     file_id: str = str(uuid4())
@@ -50,7 +61,17 @@ async def test_delete_file_successfully(
     )
 
     assert response.status_code == status.HTTP_200_OK
+    assert file_path.exists()
+
+    response = await async_client.get(
+        url=f"/api/file/file-info?file_id={file_id}",
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    assert await purge_deleted_files(configure_async_session) == 1
     assert not file_path.exists()
+    assert not get_file_from_database(filename=filename, user_id=user_id)
 
 
 async def test_delete_file_not_found(
@@ -129,3 +150,111 @@ async def test_delete_file_belongs_to_another_user(
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert file_path.exists()
+
+
+async def test_delete_file_with_shared_content(
+        async_client: AsyncClient,
+        configure_async_session: async_sessionmaker,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        create_blob_in_database: Callable,
+        get_blob_from_database: Callable
+):
+    content: bytes = b"This is a shared test file content."
+    sha256: str = hashlib.sha256(content).hexdigest()
+    blob_path = Path(BlobStore.get_blob_path(sha256=sha256))
+    os.makedirs(blob_path.parent, exist_ok=True)
+    blob_path.write_bytes(content)
+    create_blob_in_database(sha256=sha256, size=len(content), ref_count=2)
+
+    users: list[dict] = []
+    for number in range(2):
+        user_data: dict = {
+            "user_id": str(uuid4()),
+            "username": f"username{number}",
+            "email": f"user{number}@example.com",
+            "hashed_password": get_password_hash("1234"),
+            "phone_number": f"+7920844322{number}",
+            "birthdate": "2020-02-11"
+        }
+        create_user_in_database(**user_data)
+
+        file_id: str = str(uuid4())
+        create_file_in_database(
+            filename="example.txt",
+            file_id=file_id,
+            user_id=user_data["user_id"],
+            file_path=f"/some_way/uploads/{user_data['user_id']}/example.txt",
+            blob_sha256=sha256
+        )
+        users.append({"email": user_data["email"], "file_id": file_id})
+
+    response: Response = await async_client.delete(
+        url=f"/api/file/delete?file_id={users[0]['file_id']}",
+        headers=create_test_auth_headers_for_user(email=users[0]["email"])
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert get_blob_from_database(sha256)["ref_count"] == 2
+    assert await purge_deleted_files(configure_async_session) == 1
+    assert get_blob_from_database(sha256)["ref_count"] == 1
+    assert blob_path.exists()
+
+    response = await async_client.delete(
+        url=f"/api/file/delete?file_id={users[1]['file_id']}",
+        headers=create_test_auth_headers_for_user(email=users[1]["email"])
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert await purge_deleted_files(configure_async_session) == 1
+    assert get_blob_from_database(sha256) is None
+    assert not blob_path.exists()
+
+
+async def test_delete_files_batch(
+        async_client: AsyncClient,
+        configure_async_session: async_sessionmaker,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        get_file_from_database: Callable
+):
+    user_id: str = str(uuid4())
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+
+    file_ids: list[str] = []
+    for number in range(3):
+        file_id: str = str(uuid4())
+        file_path = Path("/some_way/uploads") / user_id / f"example{number}.txt"
+        os.makedirs(file_path.parent, exist_ok=True)
+        file_path.write_text("This is a test file content.")
+        create_file_in_database(
+            filename=file_path.name,
+            file_id=file_id,
+            user_id=user_id,
+            file_path=str(file_path)
+        )
+        file_ids.append(file_id)
+    missing_file_id: str = str(uuid4())
+
+    response: Response = await async_client.post(
+        url="/api/file/delete-batch",
+        json={"file_ids": file_ids[:2] + [missing_file_id]},
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert sorted(response.json()["deleted"]) == sorted(file_ids[:2])
+    assert response.json()["not_found"] == [missing_file_id]
+
+    assert await purge_deleted_files(configure_async_session) == 2
+    assert not get_file_from_database(filename="example0.txt", user_id=user_id)
+    assert not get_file_from_database(filename="example1.txt", user_id=user_id)
+    assert get_file_from_database(filename="example2.txt", user_id=user_id)
+    assert (Path("/some_way/uploads") / user_id / "example2.txt").exists()
+
@@ -0,0 +1,122 @@
+import io
+import zipfile
+import zlib
+from pathlib import Path
+from typing import Callable
+from uuid import uuid4
+
+from httpx import AsyncClient, Response
+from fastapi import status
+
+from src.services.blob_store import BlobStore
+from src.services.hashing import get_password_hash
+from tests.conftest import create_test_auth_headers_for_user
+
+USER_DATA: dict = {
+    "username": "some_username",
+    "email": "user@example.com",
+    "hashed_password": get_password_hash("1234"),
+    "phone_number": "+79208443222",
+    "birthdate": "2020-02-11"
+}
+
+
+async def test_download_archive_successfully(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        create_blob_in_database: Callable,
+        tmp_path: Path
+):
+    user_id: str = str(uuid4())
+    create_user_in_database(user_id=user_id, **USER_DATA)
+
+    first_file_path: Path = tmp_path / "first.txt"
+    first_file_path.write_bytes(b"first file content")
+    create_file_in_database(
+        file_id=str(uuid4()), filename="first.txt", file_path=str(first_file_path), user_id=user_id
+    )
+
+    blob_content: bytes = b"deduplicated file content"
+    sha256: str = "b" * 64
+    blob_path: Path = Path(BlobStore.get_blob_path(sha256=sha256))
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+    blob_path.write_bytes(blob_content)
+    create_blob_in_database(
+        sha256=sha256, size=len(blob_content), ref_count=1, crc32=zlib.crc32(blob_content)
+    )
+    create_file_in_database(
+        file_id=str(uuid4()),
+        filename="second.txt",
+        file_path=str(tmp_path / "second.txt"),
+        user_id=user_id,
+        blob_sha256=sha256,
+    )
+
+    create_file_in_database(
+        file_id=str(uuid4()),
+        filename="pending.txt",
+        file_path=str(tmp_path / "pending.txt"),
+        user_id=user_id,
+        status="pending",
+    )
+
+    response: Response = await async_client.get(
+        url="/api/file/download-archive",
+        headers=create_test_auth_headers_for_user(email=USER_DATA["email"])
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/zip"
+    assert response.headers["content-disposition"] == 'attachment; filename="files.zip"'
+
+    archive: zipfile.ZipFile = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["first.txt", "second.txt"]
+    assert archive.read("first.txt") == b"first file content"
+    assert archive.read("second.txt") == blob_content
+
+    blob_path.unlink()
+
+
+async def test_download_archive_selected_files(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        tmp_path: Path
+):
+    user_id: str = str(uuid4())
+    create_user_in_database(user_id=user_id, **USER_DATA)
+
+    file_ids: list[str] = []
+    for filename in ("first.txt", "second.txt", "third.txt"):
+        file_path: Path = tmp_path / filename
+        file_path.write_text(filename)
+        file_ids.append(str(uuid4()))
+        create_file_in_database(
+            file_id=file_ids[-1], filename=filename, file_path=str(file_path), user_id=user_id
+        )
+
+    response: Response = await async_client.get(
+        url="/api/file/download-archive",
+        params={"file_id": [file_ids[0], file_ids[2]]},
+        headers=create_test_auth_headers_for_user(email=USER_DATA["email"])
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    archive: zipfile.ZipFile = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.namelist() == ["first.txt", "third.txt"]
+
+
+async def test_download_archive_no_files(
+        async_client: AsyncClient,
+        create_user_in_database: Callable
+):
+    create_user_in_database(user_id=str(uuid4()), **USER_DATA)
+
+    response: Response = await async_client.get(
+        url="/api/file/download-archive",
+        headers=create_test_auth_headers_for_user(email=USER_DATA["email"])
+    )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
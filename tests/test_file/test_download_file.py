@@ -1,12 +1,16 @@
+import hashlib
 import os
 from pathlib import Path
 from typing import Callable
+from unittest.mock import patch
 from uuid import uuid4
 
 from httpx import AsyncClient, Response
 from fastapi import status
 
+from src.services.blob_store import BlobStore
 from src.services.hashing import get_password_hash
+from src.settings import project_settings
 from tests.conftest import create_test_auth_headers_for_user
 
 
@@ -127,3 +131,147 @@ async def test_download_file_belongs_to_another_user(
     )
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+async def test_download_file_from_blob_store(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        create_blob_in_database: Callable
+):
+    user_id: str = str(uuid4())
+    file_id: str = str(uuid4())
+    filename = "example.txt"
+    content: bytes = b"This is a deduplicated test file content."
+    sha256: str = hashlib.sha256(content).hexdigest()
+
+    blob_path = Path(BlobStore.get_blob_path(sha256=sha256))
+    os.makedirs(blob_path.parent, exist_ok=True)
+    blob_path.write_bytes(content)
+    create_blob_in_database(sha256=sha256, size=len(content), ref_count=1)
+
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    create_file_in_database(
+        filename=filename,
+        file_id=file_id,
+        user_id=user_id,
+        file_path=f"/some_way/uploads/{user_id}/{filename}",
+        blob_sha256=sha256
+    )
+
+    response: Response = await async_client.get(
+        url=f"/api/file/download?file_id={file_id}",
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers['content-disposition'] == f'attachment; filename="{filename}"'
+    assert response.content == content
+
+
+
+async def test_download_file_not_ready(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable
+):
+    user_id: str = str(uuid4())
+    file_id: str = str(uuid4())
+    filename = "example.txt"
+    file_path = Path("/some_way/uploads") / user_id / filename
+
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    create_file_in_database(
+        filename=filename,
+        file_id=file_id,
+        user_id=user_id,
+        file_path=str(file_path),
+        status="downloading"
+    )
+
+    os.makedirs(file_path.parent, exist_ok=True)
+    with open(file_path, "w") as f:
+        f.write("This is a half-written")
+
+    response: Response = await async_client.get(
+        url=f"/api/file/download?file_id={file_id}",
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+
+
+async def test_download_file_offloaded_to_proxy(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        tmp_path: Path
+):
+    user_id: str = str(uuid4())
+    file_id: str = str(uuid4())
+    filename = "example.txt"
+    file_path = tmp_path / user_id / filename
+
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    create_file_in_database(
+        filename=filename,
+        file_id=file_id,
+        user_id=user_id,
+        file_path=str(file_path)
+    )
+
+    os.makedirs(file_path.parent, exist_ok=True)
+    with open(file_path, "w") as f:
+        f.write("This is a test file content.")
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)), \
+            patch.object(project_settings, "FILE_DOWNLOAD_MODE", "x-accel-redirect"), \
+            patch.object(project_settings, "FILE_DOWNLOAD_ACCEL_PREFIX", "/internal-uploads/"):
+        response: Response = await async_client.get(
+            url=f"/api/file/download?file_id={file_id}",
+            headers=create_test_auth_headers_for_user(email=user_data["email"])
+        )
+        foreign_response: Response = await async_client.get(
+            url=f"/api/file/download?file_id={uuid4()}",
+            headers=create_test_auth_headers_for_user(email=user_data["email"])
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["x-accel-redirect"] == f"/internal-uploads/{user_id}/{filename}"
+    assert response.headers["content-disposition"] == f'attachment; filename="{filename}"'
+    assert response.content == b""
+    assert foreign_response.status_code == status.HTTP_404_NOT_FOUND
+    assert "x-accel-redirect" not in foreign_response.headers
+
+    with patch.object(project_settings, "FILE_DOWNLOAD_MODE", "x-sendfile"):
+        response = await async_client.get(
+            url=f"/api/file/download?file_id={file_id}",
+            headers=create_test_auth_headers_for_user(email=user_data["email"])
+        )
+
+    assert response.headers["x-sendfile"] == str(file_path)
+    assert response.content == b""
@@ -0,0 +1,71 @@
+import os
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient, Response
+from fastapi import status
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+
+from src.api.responses import RangeFileResponse
+from src.services.cache import FileContentCache
+
+
+def _create_client(file_path: Path, cache: FileContentCache) -> AsyncClient:
+    async def download(request: Request) -> RangeFileResponse:
+        return RangeFileResponse(
+            path=str(file_path), filename="file.bin", content_cache=cache, cache_key="file"
+        )
+
+    app: Starlette = Starlette(routes=[Route("/download", download)])
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+def test_cache_evicts_least_recently_used_entries():
+    cache: FileContentCache = FileContentCache(max_bytes=10, max_file_size=8)
+
+    cache.set(key="first", version=(1,), content=b"1234")
+    cache.set(key="second", version=(1,), content=b"5678")
+    assert cache.get(key="first", version=(1,)) == b"1234"
+    cache.set(key="third", version=(1,), content=b"90")
+    cache.set(key="fourth", version=(1,), content=b"ab")
+    cache.set(key="too_large", version=(1,), content=b"123456789")
+
+    assert cache.get(key="second", version=(1,)) is None
+    assert cache.get(key="first", version=(1,)) == b"1234"
+    assert cache.get(key="too_large", version=(1,)) is None
+    assert cache.size_bytes == 8
+    assert cache.evictions == 1
+
+
+def test_cache_ignores_outdated_version_and_invalidated_entries():
+    cache: FileContentCache = FileContentCache(max_bytes=100, max_file_size=100)
+
+    cache.set(key="file", version=(4, 1), content=b"1234")
+    assert cache.get(key="file", version=(4, 2)) is None
+
+    cache.invalidate(key="file")
+    assert cache.get(key="file", version=(4, 1)) is None
+    assert cache.size_bytes == 0
+    assert cache.stats["hit_rate"] == 0
+
+
+async def test_response_is_served_from_cache(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(b"first version")
+    cache: FileContentCache = FileContentCache(max_bytes=1024, max_file_size=1024)
+
+    async with _create_client(file_path, cache) as client:
+        first: Response = await client.get("/download")
+        second: Response = await client.get("/download", headers={"Range": "bytes=6-"})
+
+        file_path.write_bytes(b"second version")
+        os.utime(file_path, ns=(0, 10 ** 18))
+        third: Response = await client.get("/download")
+
+    assert first.content == b"first version"
+    assert second.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert second.content == b"version"
+    assert third.content == b"second version"
+    assert cache.hits == 1
+    assert cache.misses == 2
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from src.services import file_ops
+from src.services.executors import BoundedExecutor, ExecutorOverloadedError
+from src.services.storage import LocalStorageBackend
+
+
+async def test_file_ops_do_not_block_event_loop(tmp_path: Path):
+    ticks: int = 0
+
+    async def tick() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    ticker: asyncio.Task = asyncio.create_task(tick())
+    await file_ops.run(time.sleep, 0.1)
+    ticker.cancel()
+
+    assert ticks > 10
+
+
+async def test_file_ops_helpers(tmp_path: Path):
+    file_path: Path = tmp_path / "a" / "b" / "file.txt"
+
+    await file_ops.make_dirs([str(file_path.parent)])
+    file_path.write_text("content")
+
+    assert (await file_ops.stat(str(file_path))).st_size == 7
+    assert await file_ops.remove_if_exists(str(file_path)) is True
+    assert await file_ops.remove_if_exists(str(file_path)) is False
+    assert await file_ops.stat(str(file_path)) is None
+
+
+async def test_file_streams_wait_when_executor_is_overloaded(tmp_path: Path):
+    (tmp_path / "file.bin").write_bytes(b"0123456789")
+    executor: BoundedExecutor = BoundedExecutor(max_workers=1, max_queue=0, name="test")
+    released: threading.Event = threading.Event()
+
+    with patch.object(file_ops, "file_ops_executor", executor):
+        blocker: asyncio.Task = asyncio.create_task(executor.run(released.wait))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ExecutorOverloadedError):
+            await file_ops.stat(str(tmp_path / "file.bin"))
+
+        stream = LocalStorageBackend(root=str(tmp_path), chunk_size=4).get_stream("file.bin")
+        first_chunk: asyncio.Task = asyncio.create_task(anext(stream))
+        await asyncio.sleep(0.01)
+        released.set()
+
+        assert await first_chunk == b"0123"
+        assert b"".join([chunk async for chunk in stream]) == b"456789"
+        await blocker
+    executor.shutdown()
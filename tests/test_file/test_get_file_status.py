@@ -0,0 +1,105 @@
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+from httpx import AsyncClient, Response
+from fastapi import status
+
+from src.services.hashing import get_password_hash
+from tests.conftest import create_test_auth_headers_for_user
+
+
+def _create_user(create_user_in_database: Callable, user_id: str) -> dict:
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    return user_data
+
+
+async def test_get_file_status_from_progress_store(
+        async_client: AsyncClient,
+        create_user_in_database: Callable
+):
+    user_id: str = str(uuid4())
+    file_id: str = str(uuid4())
+    user_data: dict = _create_user(create_user_in_database, user_id)
+
+    progress: dict = {
+        "user_id": user_id,
+        "status": "downloading",
+        "bytes_received": 512,
+        "total_bytes": 2048,
+        "rate": 256.0,
+    }
+    with patch("src.services.services.progress_store.get", return_value=progress), \
+            patch("src.services.services.FileDAL.get_file_by_id") as mock_get_file_by_id:
+        response: Response = await async_client.get(
+            url=f"/api/file/status?file_id={file_id}",
+            headers=create_test_auth_headers_for_user(email=user_data["email"])
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "file_id": file_id,
+        "status": "downloading",
+        "bytes_received": 512,
+        "total_bytes": 2048,
+        "rate": 256.0,
+    }
+    mock_get_file_by_id.assert_not_awaited()
+
+
+async def test_get_file_status_falls_back_to_database(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable
+):
+    user_id: str = str(uuid4())
+    file_id: str = str(uuid4())
+    user_data: dict = _create_user(create_user_in_database, user_id)
+    create_file_in_database(
+        filename="example.txt",
+        file_id=file_id,
+        user_id=user_id,
+        file_path=f"/some_way/uploads/{user_id}/example.txt",
+        status="failed"
+    )
+
+    with patch("src.services.services.progress_store.get", return_value=None):
+        response: Response = await async_client.get(
+            url=f"/api/file/status?file_id={file_id}",
+            headers=create_test_auth_headers_for_user(email=user_data["email"])
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "failed"
+
+
+async def test_get_file_status_of_another_user(
+        async_client: AsyncClient,
+        create_user_in_database: Callable
+):
+    user_id: str = str(uuid4())
+    file_id: str = str(uuid4())
+    user_data: dict = _create_user(create_user_in_database, user_id)
+
+    progress: dict = {
+        "user_id": str(uuid4()),
+        "status": "downloading",
+        "bytes_received": 512,
+        "total_bytes": None,
+        "rate": 0.0,
+    }
+    with patch("src.services.services.progress_store.get", return_value=progress):
+        response: Response = await async_client.get(
+            url=f"/api/file/status?file_id={file_id}",
+            headers=create_test_auth_headers_for_user(email=user_data["email"])
+        )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
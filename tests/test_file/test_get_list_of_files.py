@@ -40,7 +40,83 @@ async def test_get_list_of_files_successfully(
         headers=create_test_auth_headers_for_user(email=user_data["email"])
     )
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == [{"file_id": file_id, "filename": filename}, ]
+    assert response.json() == {
+        "files": [{"file_id": file_id, "filename": filename}, ],
+        "next_cursor": None
+    }
+
+
+async def test_get_list_of_files_paginated(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable
+):
+    user_id: str = str(uuid4())
+
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+
+    file_ids: set[str] = set()
+    for number in range(3):
+        file_id: str = str(uuid4())
+        file_ids.add(file_id)
+        create_file_in_database(
+            filename=f"example{number}.txt",
+            file_id=file_id,
+            user_id=user_id,
+            file_path=f"/some_way/uploads/{user_id}/example{number}.txt"
+        )
+
+    first_page: Response = await async_client.get(
+        url="/api/file/list-of-files?limit=2",
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+    assert first_page.status_code == status.HTTP_200_OK
+    first_page_data: dict = first_page.json()
+    assert len(first_page_data["files"]) == 2
+    assert first_page_data["next_cursor"] is not None
+
+    second_page: Response = await async_client.get(
+        url="/api/file/list-of-files",
+        params={"limit": 2, "cursor": first_page_data["next_cursor"]},
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+    assert second_page.status_code == status.HTTP_200_OK
+    second_page_data: dict = second_page.json()
+    assert len(second_page_data["files"]) == 1
+    assert second_page_data["next_cursor"] is None
+
+    returned_ids: set[str] = {
+        file["file_id"] for file in first_page_data["files"] + second_page_data["files"]
+    }
+    assert returned_ids == file_ids
+
+
+async def test_get_list_of_files_invalid_cursor(
+        async_client: AsyncClient,
+        create_user_in_database: Callable
+):
+    user_data: dict = {
+        "user_id": str(uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    response: Response = await async_client.get(
+        url="/api/file/list-of-files?cursor=invalid",
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
 async def test_get_list_of_files_no_files(
@@ -0,0 +1,161 @@
+from pathlib import Path
+from typing import Optional
+
+from httpx import ASGITransport, AsyncClient, Response
+from fastapi import status
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+
+from src.api.responses import RangeFileResponse
+
+CONTENT: bytes = bytes(range(256)) * 4
+
+
+def _create_client(file_path: Path, content_hash: Optional[str] = None) -> AsyncClient:
+    async def download(request: Request) -> RangeFileResponse:
+        return RangeFileResponse(
+            path=str(file_path),
+            filename="file.bin",
+            content_hash=content_hash,
+            cache_control="private, max-age=60",
+        )
+
+    app: Starlette = Starlette(routes=[Route("/download", download, methods=["GET", "HEAD"])])
+    return AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+async def test_full_download(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+
+    async with _create_client(file_path, content_hash="abc") as client:
+        response: Response = await client.get("/download")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == CONTENT
+    assert response.headers["etag"] == '"abc"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["cache-control"] == "private, max-age=60"
+
+
+async def test_single_range(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+
+    async with _create_client(file_path) as client:
+        first: Response = await client.get("/download", headers={"Range": "bytes=10-19"})
+        suffix: Response = await client.get("/download", headers={"Range": "bytes=-5"})
+        open_ended: Response = await client.get("/download", headers={"Range": "bytes=1020-"})
+
+    assert first.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert first.content == CONTENT[10:20]
+    assert first.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+    assert suffix.content == CONTENT[-5:]
+    assert open_ended.content == CONTENT[1020:]
+
+
+async def test_multiple_ranges(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+
+    async with _create_client(file_path) as client:
+        response: Response = await client.get("/download", headers={"Range": "bytes=0-3,100-103,2-5"})
+
+    assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+    content_type: str = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary: str = content_type.split("boundary=")[1]
+    assert int(response.headers["content-length"]) == len(response.content)
+
+    parts: list[bytes] = response.content.split(f"--{boundary}".encode())[1:-1]
+    assert len(parts) == 2
+    assert parts[0].endswith(b"\r\n\r\n" + CONTENT[0:6] + b"\r\n")
+    assert b"Content-Range: bytes 100-103/" in parts[1]
+    assert parts[1].endswith(CONTENT[100:104] + b"\r\n")
+
+
+async def test_unsatisfiable_range(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+
+    async with _create_client(file_path) as client:
+        response: Response = await client.get("/download", headers={"Range": "bytes=5000-"})
+
+    assert response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+async def test_malformed_range_is_ignored(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+
+    async with _create_client(file_path) as client:
+        for range_header in ("bytes=abc-5", "bytes=5-abc", "bytes=1-2-3", "bytes=0-1,abc-2", "bytes=-"):
+            response: Response = await client.get("/download", headers={"Range": range_header})
+
+            assert response.status_code == status.HTTP_200_OK, range_header
+            assert response.content == CONTENT
+
+
+async def test_conditional_requests(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+
+    async with _create_client(file_path) as client:
+        response: Response = await client.get("/download")
+        etag: str = response.headers["etag"]
+        last_modified: str = response.headers["last-modified"]
+
+        not_modified: Response = await client.get("/download", headers={"If-None-Match": etag})
+        not_modified_since: Response = await client.get(
+            "/download", headers={"If-Modified-Since": last_modified}
+        )
+        modified: Response = await client.get("/download", headers={"If-None-Match": '"other"'})
+        stale_range: Response = await client.get(
+            "/download", headers={"Range": "bytes=0-9", "If-Range": '"other"'}
+        )
+        fresh_range: Response = await client.get(
+            "/download", headers={"Range": "bytes=0-9", "If-Range": etag}
+        )
+
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+    assert not_modified_since.status_code == status.HTTP_304_NOT_MODIFIED
+    assert modified.status_code == status.HTTP_200_OK
+    assert stale_range.status_code == status.HTTP_200_OK
+    assert stale_range.content == CONTENT
+    assert fresh_range.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert fresh_range.content == CONTENT[:10]
+
+
+async def test_zero_copy_send_is_used_when_supported(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(CONTENT)
+    messages: list[dict] = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        if message["type"] == "http.response.zerocopysend":
+            message = {**message, "file": message["file"].name}
+        messages.append(message)
+
+    scope: dict = {
+        "type": "http",
+        "method": "GET",
+        "headers": [(b"range", b"bytes=10-19")],
+        "extensions": {"http.response.zerocopysend": {}},
+    }
+    await RangeFileResponse(path=str(file_path), filename="file.bin")(scope, receive, send)
+
+    assert messages[0]["status"] == status.HTTP_206_PARTIAL_CONTENT
+    assert messages[1] == {
+        "type": "http.response.zerocopysend",
+        "file": str(file_path),
+        "offset": 10,
+        "count": 10,
+        "more_body": False,
+    }
@@ -0,0 +1,47 @@
+import hashlib
+from pathlib import Path
+from typing import Callable, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.services.blob_store import BlobStore, rebalance_blobs
+from src.services.volumes import VolumeSet, VolumeUsage
+
+
+async def test_rebalance_moves_blob_to_chosen_volume(
+        configure_async_session: async_sessionmaker,
+        create_blob_in_database: Callable,
+        get_blob_from_database: Callable,
+        tmp_path: Path
+):
+    volume_set: VolumeSet = VolumeSet(volumes={"a": str(tmp_path / "a"), "b": str(tmp_path / "b")})
+    volume_set.get_usage = lambda: {
+        "a": VolumeUsage(free=100, total=1000),
+        "b": VolumeUsage(free=100, total=1000),
+    }
+
+    content: bytes = b"some content"
+    sha256: str = hashlib.sha256(content).hexdigest()
+    target: str = volume_set.choose(BlobStore.get_blob_key(sha256))
+    source: str = "b" if target == "a" else "a"
+    source_path: Path = Path(volume_set.backends[source].get_local_path(BlobStore.get_blob_key(sha256)))
+    source_path.parent.mkdir(parents=True)
+    source_path.write_bytes(content)
+    create_blob_in_database(sha256=sha256, size=len(content), ref_count=1, volume=source)
+
+    moved, after = await rebalance_blobs(
+        session_factory=configure_async_session, volumes=volume_set, batch_size=10, threshold=0.05
+    )
+    # Одинаковое свободное место на томах: перенос не нужен
+    assert (moved, after) == (0, None)
+
+    volume_set.draining = {source}
+    moved, after = await rebalance_blobs(
+        session_factory=configure_async_session, volumes=volume_set, batch_size=10, threshold=0.05
+    )
+    target_path: Optional[str] = volume_set.backends[target].get_local_path(BlobStore.get_blob_key(sha256))
+
+    assert (moved, after) == (1, None)
+    assert get_blob_from_database(sha256=sha256)["volume"] == target
+    assert Path(target_path).read_bytes() == content
+    assert not source_path.exists()
@@ -0,0 +1,141 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from httpx import AsyncClient, Response
+from fastapi import status
+
+from src.services.hashing import get_password_hash
+from src.services.security import (
+    InvalidDownloadTokenError,
+    create_download_token,
+    verify_download_token,
+)
+from src.settings import project_settings
+from tests.conftest import create_test_auth_headers_for_user
+
+
+def test_download_token_round_trip():
+    token: str = create_download_token(
+        file_id="file",
+        storage_key="blobs/ab/cd/abcd",
+        filename="example.txt",
+        content_hash="abcd",
+        expires_at=int(time.time()) + 60,
+    )
+    assert verify_download_token(token=token) == {
+        "file_id": "file",
+        "storage_key": "blobs/ab/cd/abcd",
+        "filename": "example.txt",
+        "content_hash": "abcd",
+        "volume": None,
+    }
+
+    volume_token: str = create_download_token(
+        file_id="file",
+        storage_key="blobs/ab/cd/abcd",
+        filename="example.txt",
+        content_hash="abcd",
+        expires_at=int(time.time()) + 60,
+        volume="disk1",
+    )
+    assert verify_download_token(token=volume_token)["volume"] == "disk1"
+
+    payload, _, signature = token.partition(".")
+    with pytest.raises(InvalidDownloadTokenError):
+        verify_download_token(token=f"{payload}x.{signature}")
+
+    expired_token: str = create_download_token(
+        file_id="file",
+        storage_key="user/example.txt",
+        filename="example.txt",
+        content_hash=None,
+        expires_at=int(time.time()) - 1,
+    )
+    with pytest.raises(InvalidDownloadTokenError):
+        verify_download_token(token=expired_token)
+
+    for storage_key in ("/etc/passwd", "../etc/passwd"):
+        outside_token: str = create_download_token(
+            file_id="file",
+            storage_key=storage_key,
+            filename="passwd",
+            content_hash=None,
+            expires_at=int(time.time()) + 60,
+        )
+        with pytest.raises(InvalidDownloadTokenError):
+            verify_download_token(token=outside_token)
+
+
+async def test_download_file_by_signed_url(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        tmp_path: Path
+):
+    user_id: str = str(uuid4())
+    file_id: str = str(uuid4())
+    filename = "example.txt"
+    file_path = tmp_path / user_id / filename
+
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    create_file_in_database(
+        filename=filename,
+        file_id=file_id,
+        user_id=user_id,
+        file_path=str(file_path)
+    )
+
+    os.makedirs(file_path.parent, exist_ok=True)
+    with open(file_path, "w") as f:
+        f.write("This is a test file content.")
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        response: Response = await async_client.post(
+            url=f"/api/file/download-url?file_id={file_id}&expires_in=60",
+            headers=create_test_auth_headers_for_user(email=user_data["email"])
+        )
+        assert response.status_code == status.HTTP_200_OK
+        url: str = response.json()["url"]
+
+        download_response: Response = await async_client.get(url)
+        tampered_response: Response = await async_client.get(url.replace("token=", "token=A"))
+
+    assert download_response.status_code == status.HTTP_200_OK
+    assert download_response.content == b"This is a test file content."
+    assert download_response.headers["content-disposition"] == f'attachment; filename="{filename}"'
+    assert tampered_response.status_code == status.HTTP_403_FORBIDDEN
+
+
+async def test_create_download_url_for_foreign_file(
+        async_client: AsyncClient,
+        create_user_in_database: Callable
+):
+    user_data: dict = {
+        "user_id": str(uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+
+    response: Response = await async_client.post(
+        url=f"/api/file/download-url?file_id={uuid4()}",
+        headers=create_test_auth_headers_for_user(email=user_data["email"])
+    )
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,188 @@
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from email.utils import formatdate
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import httpx
+from fastapi import status
+from httpx import ASGITransport, AsyncClient, Response
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.routing import Route
+
+from src.api.responses import StorageFileResponse
+from src.services.storage import LocalStorageBackend, ObjectStat, S3StorageBackend
+
+PART_SIZE: int = S3StorageBackend.MIN_PART_SIZE
+
+
+class FakeS3:
+    """Хранилище объектов в памяти, реализующее используемую часть API S3"""
+
+    def __init__(self) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.uploads: dict[str, dict[int, bytes]] = {}
+        self.requests: list[httpx.Request] = []
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        assert request.headers["authorization"].startswith("AWS4-HMAC-SHA256 Credential=key/")
+        assert request.url.path.startswith("/bucket/")
+        key: str = request.url.path.removeprefix("/bucket/")
+        params: httpx.QueryParams = request.url.params
+
+        if request.method == "POST" and "uploads" in params:
+            upload_id: str = f"upload-{len(self.uploads)}"
+            self.uploads[upload_id] = {}
+            return httpx.Response(200, content=(
+                '<InitiateMultipartUploadResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+                f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            ).encode())
+        if request.method == "PUT" and "partNumber" in params:
+            self.uploads[params["uploadId"]][int(params["partNumber"])] = request.content
+            return httpx.Response(200, headers={"ETag": f'"part-{params["partNumber"]}"'})
+        if request.method == "POST" and "uploadId" in params:
+            parts: dict[int, bytes] = self.uploads.pop(params["uploadId"])
+            part_numbers: list[int] = [
+                int(element.text) for element in ElementTree.fromstring(request.content).iter("PartNumber")
+            ]
+            self.objects[key] = b"".join(parts[part_number] for part_number in part_numbers)
+            return httpx.Response(200, content=b"<CompleteMultipartUploadResult/>")
+        if request.method == "DELETE" and "uploadId" in params:
+            self.uploads.pop(params["uploadId"], None)
+            return httpx.Response(204)
+        if request.method == "PUT":
+            self.objects[key] = request.content
+            return httpx.Response(200)
+
+        content: Optional[bytes] = self.objects.get(key)
+        if request.method == "DELETE":
+            self.objects.pop(key, None)
+            return httpx.Response(204)
+        if content is None:
+            return httpx.Response(404)
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={
+                "Content-Length": str(len(content)),
+                "Last-Modified": formatdate(1700000000, usegmt=True),
+            })
+
+        range_match: Optional[re.Match] = re.fullmatch(r"bytes=(\d+)-(\d*)", request.headers.get("range", ""))
+        if range_match is None:
+            return httpx.Response(200, content=content)
+        start: int = int(range_match.group(1))
+        end: int = int(range_match.group(2)) if range_match.group(2) else len(content) - 1
+        return httpx.Response(206, content=content[start:end + 1])
+
+
+def _create_s3_backend(fake_s3: FakeS3) -> S3StorageBackend:
+    return S3StorageBackend(
+        endpoint_url="http://s3.test",
+        bucket="bucket",
+        access_key_id="key",
+        secret_access_key="secret",
+        region="us-east-1",
+        part_size=PART_SIZE,
+        transport=httpx.MockTransport(fake_s3.handle),
+    )
+
+
+async def _read(stream: AsyncIterator[bytes]) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+async def test_s3_small_object_round_trip():
+    fake_s3: FakeS3 = FakeS3()
+    storage: S3StorageBackend = _create_s3_backend(fake_s3)
+
+    async def chunks() -> AsyncIterator[bytes]:
+        yield b"hello, "
+        yield b"world"
+
+    await storage.put_stream("blobs/ab/cd/abcd", chunks())
+
+    assert fake_s3.objects == {"blobs/ab/cd/abcd": b"hello, world"}
+    assert await storage.stat("blobs/ab/cd/abcd") == ObjectStat(size=12, modified_at=1700000000)
+    assert await _read(storage.get_stream("blobs/ab/cd/abcd")) == b"hello, world"
+    assert await _read(storage.get_stream("blobs/ab/cd/abcd", start=7, end=10)) == b"worl"
+
+    await storage.delete("blobs/ab/cd/abcd")
+    assert await storage.stat("blobs/ab/cd/abcd") is None
+    await storage.close()
+
+
+async def test_s3_put_file_uses_multipart_upload(tmp_path: Path):
+    fake_s3: FakeS3 = FakeS3()
+    storage: S3StorageBackend = _create_s3_backend(fake_s3)
+    content: bytes = os.urandom(2 * PART_SIZE + 100)
+    file_path: Path = tmp_path / "staging"
+    file_path.write_bytes(content)
+
+    await storage.put_file("blobs/large", str(file_path))
+
+    assert fake_s3.objects["blobs/large"] == content
+    assert not fake_s3.uploads
+    assert not file_path.exists()
+    part_requests: list[httpx.Request] = [
+        request for request in fake_s3.requests if "partNumber" in request.url.params
+    ]
+    assert [len(request.content) for request in part_requests] == [PART_SIZE, PART_SIZE, 100]
+    await storage.close()
+
+
+async def test_local_storage_round_trip(tmp_path: Path):
+    storage: LocalStorageBackend = LocalStorageBackend(root=str(tmp_path), chunk_size=4)
+    staging_path: Path = tmp_path / "staging"
+    staging_path.write_bytes(b"0123456789")
+
+    await storage.put_file("blobs/ab/file", str(staging_path))
+
+    assert not staging_path.exists()
+    assert (await storage.stat("blobs/ab/file")).size == 10
+    assert await _read(storage.get_stream("blobs/ab/file", start=3, end=8)) == b"345678"
+    await storage.delete("blobs/ab/file")
+    assert await storage.stat("blobs/ab/file") is None
+
+
+async def test_put_file_keeps_source(tmp_path: Path):
+    local_storage: LocalStorageBackend = LocalStorageBackend(root=str(tmp_path / "storage"))
+    s3_storage: S3StorageBackend = _create_s3_backend(FakeS3())
+    staging_path: Path = tmp_path / "staging"
+    staging_path.write_bytes(b"0123456789")
+
+    await local_storage.put_file("blobs/ab/file", str(staging_path), keep_source=True)
+    await local_storage.put_file("blobs/ab/file", str(staging_path), keep_source=True)
+    await s3_storage.put_file("blobs/ab/file", str(staging_path), keep_source=True)
+
+    assert staging_path.read_bytes() == b"0123456789"
+    assert await _read(local_storage.get_stream("blobs/ab/file")) == b"0123456789"
+    assert await _read(s3_storage.get_stream("blobs/ab/file")) == b"0123456789"
+    assert os.listdir(tmp_path / "storage" / "blobs" / "ab") == ["file"]
+    await s3_storage.close()
+
+
+async def test_storage_file_response_serves_ranges():
+    fake_s3: FakeS3 = FakeS3()
+    fake_s3.objects["blobs/file"] = bytes(range(256))
+    storage: S3StorageBackend = _create_s3_backend(fake_s3)
+
+    async def download(request: Request) -> StorageFileResponse:
+        return StorageFileResponse(
+            storage=storage, key="blobs/file", filename="file.bin", content_hash="abc"
+        )
+
+    app: Starlette = Starlette(routes=[Route("/download", download)])
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        full: Response = await client.get("/download")
+        partial: Response = await client.get("/download", headers={"Range": "bytes=10-19"})
+        not_modified: Response = await client.get("/download", headers={"If-None-Match": '"abc"'})
+
+    assert full.status_code == status.HTTP_200_OK
+    assert full.content == bytes(range(256))
+    assert full.headers["content-length"] == "256"
+    assert partial.status_code == status.HTTP_206_PARTIAL_CONTENT
+    assert partial.content == bytes(range(10, 20))
+    assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+    await storage.close()
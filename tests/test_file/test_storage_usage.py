@@ -0,0 +1,103 @@
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+from httpx import AsyncClient, Response
+from fastapi import status
+
+from src.services.hashing import get_password_hash
+from src.settings import project_settings
+from tests.conftest import create_test_auth_headers_for_user
+
+
+def _create_user(create_user_in_database: Callable) -> dict:
+    user_data: dict = {
+        "user_id": str(uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    return user_data
+
+
+async def _get_usage(async_client: AsyncClient, email: str) -> dict:
+    response: Response = await async_client.get(
+        url="/api/file/usage",
+        headers=create_test_auth_headers_for_user(email),
+    )
+    assert response.status_code == status.HTTP_200_OK
+    return response.json()
+
+
+async def test_storage_usage_follows_uploads_and_deletes(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        tmp_path: Path
+):
+    user_data: dict = _create_user(create_user_in_database)
+    headers: dict = create_test_auth_headers_for_user(user_data["email"])
+
+    assert await _get_usage(async_client, user_data["email"]) == {
+        "file_count": 0, "total_bytes": 0, "quota_bytes": None, "file_count_quota": None
+    }
+
+    file_ids: list[str] = []
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        for filename, content in (("first.bin", b"0123456789"), ("second.bin", b"01234")):
+            response: Response = await async_client.put(
+                url=f"/api/file/upload-stream?filename={filename}",
+                content=content,
+                headers=headers,
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+            file_ids.append(response.json()["file_id"])
+
+    usage: dict = await _get_usage(async_client, user_data["email"])
+    assert (usage["file_count"], usage["total_bytes"]) == (2, 15)
+
+    response = await async_client.delete(url=f"/api/file/delete?file_id={file_ids[0]}", headers=headers)
+    assert response.status_code == status.HTTP_200_OK
+
+    usage = await _get_usage(async_client, user_data["email"])
+    assert (usage["file_count"], usage["total_bytes"]) == (1, 5)
+
+
+async def test_upload_over_storage_quota(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        get_file_from_database: Callable,
+        tmp_path: Path
+):
+    user_data: dict = _create_user(create_user_in_database)
+    headers: dict = create_test_auth_headers_for_user(user_data["email"])
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)), \
+            patch.object(project_settings, "USER_STORAGE_QUOTA_BYTES", 15):
+        response: Response = await async_client.put(
+            url="/api/file/upload-stream?filename=first.bin",
+            content=b"0123456789",
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        response = await async_client.put(
+            url="/api/file/upload-stream?filename=second.bin",
+            content=b"0123456789",
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert not get_file_from_database(filename="second.bin", user_id=user_data["user_id"])
+
+        response = await async_client.post(
+            url="/api/file/uploads",
+            json={"filename": "third.bin", "size": 5},
+            headers=headers,
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+        usage: dict = await _get_usage(async_client, user_data["email"])
+    assert usage["quota_bytes"] == 15
@@ -36,7 +36,7 @@ async def test_upload_file_successfully(
         added_file_data: dict = get_file_from_database(filename="example.txt", user_id=user_data["user_id"])
         assert added_file_data["filename"] == "example.txt"
         path = Path(added_file_data["file_path"])
-        assert list(path.parts[-3:]) == ["uploads", user_data["user_id"], "example.txt"]
+        assert list(path.parts[-5:]) == ["uploads", user_data["user_id"], "e7", "cb", "example.txt"]
 
         assert mock_apply_async.call_count == 1
 
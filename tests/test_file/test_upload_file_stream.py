@@ -0,0 +1,95 @@
+import hashlib
+from pathlib import Path
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+from httpx import AsyncClient, Response
+from fastapi import status
+
+from src.services.blob_store import BlobStore
+from src.services.hashing import get_password_hash
+from src.settings import project_settings
+from tests.conftest import create_test_auth_headers_for_user
+
+
+def _create_user(create_user_in_database: Callable) -> dict:
+    user_data: dict = {
+        "user_id": str(uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    return user_data
+
+
+async def test_upload_file_stream_successfully(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        get_file_from_database: Callable,
+        get_blob_from_database: Callable,
+        tmp_path: Path
+):
+    user_data: dict = _create_user(create_user_in_database)
+    content: bytes = b"0123456789" * 1000
+
+    async def body():
+        for start in range(0, len(content), 1000):
+            yield content[start:start + 1000]
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)), \
+            patch.object(project_settings, "STREAM_UPLOAD_BUFFER_SIZE", 4096):
+        response: Response = await async_client.put(
+            url="/api/file/upload-stream?filename=example.bin",
+            content=body(),
+            headers=create_test_auth_headers_for_user(user_data["email"]),
+        )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["size"] == len(content)
+
+    added_file_data: dict = get_file_from_database(filename="example.bin", user_id=user_data["user_id"])
+    assert added_file_data["size"] == len(content)
+    assert not Path(added_file_data["file_path"]).exists()
+
+    sha256: str = hashlib.sha256(content).hexdigest()
+    assert get_blob_from_database(sha256=sha256) == {"size": len(content), "ref_count": 1, "volume": None}
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        assert Path(BlobStore.get_blob_path(sha256)).read_bytes() == content
+
+
+async def test_upload_file_stream_duplicate(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        tmp_path: Path
+):
+    user_data: dict = _create_user(create_user_in_database)
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        for expected_status in (status.HTTP_201_CREATED, status.HTTP_409_CONFLICT):
+            response: Response = await async_client.put(
+                url="/api/file/upload-stream?filename=example.txt",
+                content=b"test data",
+                headers=create_test_auth_headers_for_user(user_data["email"]),
+            )
+            assert response.status_code == expected_status
+
+
+async def test_upload_file_stream_invalid_filename(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        tmp_path: Path
+):
+    user_data: dict = _create_user(create_user_in_database)
+
+    with patch.object(project_settings, "UPLOADS_DIR", str(tmp_path)):
+        response: Response = await async_client.put(
+            url="/api/file/upload-stream?filename=../example.txt",
+            content=b"test data",
+            headers=create_test_auth_headers_for_user(user_data["email"]),
+        )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,89 @@
+from typing import Callable
+from unittest.mock import patch
+from uuid import uuid4
+
+from httpx import AsyncClient, Response
+from fastapi import status
+
+from src.services.hashing import get_password_hash
+from src.services.services import FileService
+from tests.conftest import create_test_auth_headers_for_user
+
+
+async def test_upload_files_successfully(
+        async_client: AsyncClient,
+        create_user_in_database: Callable,
+        create_file_in_database: Callable,
+        get_file_from_database: Callable
+):
+    user_id: str = str(uuid4())
+    user_data: dict = {
+        "user_id": user_id,
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+    create_file_in_database(
+        file_id=str(uuid4()),
+        filename="existing.txt",
+        file_path=FileService.build_file_path(user_id, "existing.txt"),
+        user_id=user_id
+    )
+
+    file_urls: list[str] = [
+        "https://example.com/first.txt",
+        "https://example.com/existing.txt",
+        "https://example.com/second.txt",
+        "https://mirror.example.com/first.txt",
+    ]
+    with patch("src.services.services.download_files_to_server.apply_async") as mock_apply_async:
+        response: Response = await async_client.post(
+            url="/api/file/upload-batch",
+            json={"file_urls": file_urls},
+            headers=create_test_auth_headers_for_user(user_data["email"]),
+        )
+
+    assert response.status_code == status.HTTP_200_OK
+    response_data: dict = response.json()
+    assert response_data["started"] == 2
+    assert response_data["conflicts"] == 2
+    assert [file["file_url"] for file in response_data["files"]] == file_urls
+    assert [file["error"] is None for file in response_data["files"]] == [True, False, True, False]
+
+    assert get_file_from_database(filename="first.txt", user_id=user_id)["filename"] == "first.txt"
+    assert get_file_from_database(filename="second.txt", user_id=user_id)["filename"] == "second.txt"
+
+    mock_apply_async.assert_called_once()
+    downloads: list[dict] = mock_apply_async.call_args.kwargs["kwargs"]["downloads"]
+    assert [download["file_url"] for download in downloads] == [file_urls[0], file_urls[2]]
+    assert [download["file_id"] for download in downloads] == [
+        response_data["files"][0]["file_id"], response_data["files"][2]["file_id"]
+    ]
+
+
+async def test_upload_files_empty_batch(
+        async_client: AsyncClient,
+        create_user_in_database: Callable
+):
+    user_data: dict = {
+        "user_id": str(uuid4()),
+        "username": "some_username",
+        "email": "user@example.com",
+        "hashed_password": get_password_hash("1234"),
+        "phone_number": "+79208443222",
+        "birthdate": "2020-02-11"
+    }
+    create_user_in_database(**user_data)
+
+    with patch("src.services.services.download_files_to_server.apply_async") as mock_apply_async:
+        response: Response = await async_client.post(
+            url="/api/file/upload-batch",
+            json={"file_urls": []},
+            headers=create_test_auth_headers_for_user(user_data["email"]),
+        )
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    mock_apply_async.assert_not_called()
@@ -0,0 +1,112 @@
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+from unittest.mock import patch
+
+from starlette.responses import Response
+
+from src.api.responses import create_file_response
+from src.services.storage import ObjectStat
+from src.services.volumes import VolumeSet, VolumeStorageBackend, VolumeUsage
+from src.settings import project_settings
+
+KEYS: list[str] = [f"blobs/{number:064x}" for number in range(3000)]
+
+
+def create_volume_set(tmp_path: Path, usage: dict[str, VolumeUsage], **kwargs) -> VolumeSet:
+    volume_set: VolumeSet = VolumeSet(
+        volumes={name: str(tmp_path / name) for name in usage}, **kwargs
+    )
+    volume_set.get_usage = lambda: usage
+    return volume_set
+
+
+async def test_choose_is_weighted_by_free_space(tmp_path: Path):
+    volume_set: VolumeSet = create_volume_set(tmp_path, {
+        "a": VolumeUsage(free=100, total=1000),
+        "b": VolumeUsage(free=300, total=1000),
+    })
+
+    placement: Counter = Counter(volume_set.choose(key) for key in KEYS)
+
+    assert volume_set.choose(KEYS[0]) == volume_set.choose(KEYS[0])
+    assert 0.2 < placement["a"] / len(KEYS) < 0.3
+
+
+async def test_adding_volume_moves_only_its_share_of_keys(tmp_path: Path):
+    usage: dict[str, VolumeUsage] = {
+        "a": VolumeUsage(free=100, total=1000),
+        "b": VolumeUsage(free=100, total=1000),
+    }
+    before: dict[str, str] = {key: create_volume_set(tmp_path, usage).choose(key) for key in KEYS}
+    usage["c"] = VolumeUsage(free=100, total=1000)
+    after: dict[str, str] = {key: create_volume_set(tmp_path, usage).choose(key) for key in KEYS}
+
+    moved: list[str] = [key for key in KEYS if before[key] != after[key]]
+
+    assert all(after[key] == "c" for key in moved)
+    assert 0.28 < len(moved) / len(KEYS) < 0.38
+
+
+async def test_rebalance_target(tmp_path: Path):
+    usage: dict[str, VolumeUsage] = {
+        "a": VolumeUsage(free=500, total=1000),
+        "b": VolumeUsage(free=520, total=1000),
+    }
+    volume_set: VolumeSet = create_volume_set(tmp_path, usage, draining=["old"])
+    key: str = next(key for key in KEYS if volume_set.choose(key) == "b")
+
+    assert volume_set.get_rebalance_target(key, volume="b", threshold=0.05) is None
+    assert volume_set.get_rebalance_target(key, volume="a", threshold=0.05) is None
+    assert volume_set.get_rebalance_target(key, volume="a", threshold=0.01) == "b"
+    assert volume_set.get_rebalance_target(key, volume="removed", threshold=0.05) == "b"
+    assert volume_set.get_rebalance_target(key, volume=None, threshold=0.05) == "b"
+
+
+async def test_volume_storage_finds_object_moved_to_other_volume(tmp_path: Path):
+    usage: dict[str, VolumeUsage] = {
+        "a": VolumeUsage(free=100, total=1000),
+        "b": VolumeUsage(free=100, total=1000),
+    }
+    volume_set: VolumeSet = create_volume_set(tmp_path, usage)
+    staging_path: Path = tmp_path / "staging"
+    staging_path.write_bytes(b"0123456789")
+    await volume_set.get_storage("b").put_file("blobs/object", str(staging_path))
+
+    storage: VolumeStorageBackend = volume_set.get_storage("a")
+    chunks: list[bytes] = [chunk async for chunk in storage.get_stream("blobs/object", 2, 5)]
+    object_stat: Optional[ObjectStat] = await volume_set.get_storage("a").stat("blobs/object")
+
+    assert b"".join(chunks) == b"2345"
+    assert storage.volume == "b"
+    assert object_stat.size == 10
+
+    await volume_set.get_storage("a").delete("blobs/object")
+
+    assert not (tmp_path / "b" / "blobs" / "object").exists()
+    assert await storage.stat("blobs/object") is None
+
+
+async def test_refresh_usage_reads_free_space(tmp_path: Path):
+    (tmp_path / "a").mkdir()
+    volume_set: VolumeSet = VolumeSet(volumes={"a": str(tmp_path / "a"), "missing": str(tmp_path / "missing")})
+
+    assert volume_set.get_usage() == {}
+    assert volume_set.choose(KEYS[0]) in ("a", "missing")
+
+    await volume_set.refresh_usage()
+
+    assert volume_set.get_usage()["a"].total > 0
+    assert volume_set.get_usage()["missing"] == VolumeUsage(free=0, total=0)
+    assert volume_set.choose(KEYS[0]) == "a"
+
+
+async def test_accel_redirect_for_object_on_volume(tmp_path: Path):
+    volume_set: VolumeSet = create_volume_set(tmp_path, {"disk1": VolumeUsage(free=100, total=1000)})
+
+    with patch.object(project_settings, "FILE_DOWNLOAD_MODE", "x-accel-redirect"):
+        response: Response = create_file_response(
+            storage=volume_set.get_storage("disk1"), key="blobs/ab/cd/abcd", filename="file.txt"
+        )
+
+    assert response.headers["x-accel-redirect"] == "/internal-volumes/disk1/blobs/ab/cd/abcd"
@@ -0,0 +1,59 @@
+import io
+import zipfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from src.services.storage import LocalStorageBackend
+from src.services.zip_stream import ZipEntry, stream_zip
+
+
+async def _build_archive(entries: list[ZipEntry]) -> bytes:
+    return b"".join([chunk async for chunk in stream_zip(entries=entries)])
+
+
+async def test_stream_zip_with_known_and_unknown_crc32(tmp_path: Path):
+    contents: dict[str, bytes] = {
+        "example.txt": b"This is a test file content.",
+        "данные.bin": bytes(range(256)) * 20,
+        "empty.txt": b"",
+    }
+    storage: LocalStorageBackend = LocalStorageBackend(root=str(tmp_path), chunk_size=1000)
+    entries: list[ZipEntry] = []
+    for index, (name, content) in enumerate(contents.items()):
+        file_path: Path = tmp_path / str(index)
+        file_path.write_bytes(content)
+        entries.append(ZipEntry(
+            name=name,
+            storage=storage,
+            key=str(index),
+            size=len(content),
+            modified_at=datetime(2024, 5, 6, 7, 8, 10),
+            crc32=zlib.crc32(content) if index == 0 else None,
+        ))
+
+    archive: zipfile.ZipFile = zipfile.ZipFile(io.BytesIO(await _build_archive(entries)))
+
+    assert archive.testzip() is None
+    assert archive.namelist() == list(contents)
+    for name, content in contents.items():
+        assert archive.read(name) == content
+        assert archive.getinfo(name).date_time == (2024, 5, 6, 7, 8, 10)
+        assert archive.getinfo(name).compress_type == zipfile.ZIP_STORED
+
+
+async def test_stream_zip_truncated_file(tmp_path: Path):
+    file_path: Path = tmp_path / "file.bin"
+    file_path.write_bytes(b"short")
+    entry: ZipEntry = ZipEntry(
+        name="file.bin",
+        storage=LocalStorageBackend(root=str(tmp_path)),
+        key="file.bin",
+        size=100,
+        modified_at=datetime(2024, 1, 1),
+    )
+
+    with pytest.raises(RuntimeError):
+        await _build_archive([entry])
@@ -1,61 +1,359 @@
-from unittest.mock import patch, mock_open, MagicMock
-from requests.exceptions import HTTPError
+import asyncio
+import hashlib
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
 
-from src.worker import download_file_to_server
+import httpx
+import pytest
 
+from src.database.models import FileStatus
+from src.services.downloader import Downloader, DownloadState
+from src.services.progress import ProgressReporter
+from src.services.upload_sessions import UploadSession
+from src.worker import (
+    _download_file_to_server,
+    download_file_to_server,
+    reap_upload_sessions,
+    worker_loop,
+)
 
-@patch("src.worker.requests.get")
-@patch("src.worker.open", new_callable=mock_open)
-@patch("src.worker.os.path.getsize")
-@patch("src.worker._get_db_session_for_task")
-@patch("src.worker._update_file_size")
+
+@pytest.fixture(autouse=True)
+def mock_progress_store():
+    with patch("src.worker.progress_store") as mock_progress_store:
+        mock_progress_store.update = AsyncMock()
+        yield mock_progress_store
+
+
+def _create_test_downloader(handler, **kwargs) -> Downloader:
+    return Downloader(
+        max_concurrency=4,
+        chunk_size=4,
+        client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        **kwargs
+    )
+
+
+def _range_handler(content: bytes, etag: str, requests: list[httpx.Request]):
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        range_header: str = request.headers.get("Range", "")
+        if range_header and request.headers.get("If-Range") == etag:
+            start: int = int(range_header.removeprefix("bytes=").rstrip("-"))
+            return httpx.Response(
+                206,
+                content=content[start:],
+                headers={
+                    "ETag": etag,
+                    "Content-Range": f"bytes {start}-{len(content) - 1}/{len(content)}",
+                },
+            )
+        return httpx.Response(200, content=content, headers={"ETag": etag})
+
+    return handler
+
+
+@patch("src.worker._save_download_checkpoint")
+@patch("src.worker._get_download_state", return_value=DownloadState())
+@patch("src.worker._mark_download_failed")
+@patch("src.worker._store_downloaded_file")
 def test_download_file_successfully(
-        mock_update_file_size,
-        mock_get_db_session_for_task,
-        mock_getsize,
-        mock_open_file,
-        mock_requests_get
+        mock_store_downloaded_file,
+        mock_mark_download_failed,
+        mock_get_download_state,
+        mock_save_download_checkpoint,
+        mock_progress_store,
+        tmp_path: Path
 ):
     file_url = "https://example.com/file.txt"
     file_id = "1234"
-    file_path = "/some_way/uploads/file.txt"
-    file_size = 1024
+    file_path = tmp_path / "file.txt"
+    requested_urls: list[str] = []
 
-    mock_response = MagicMock()
-    mock_response.iter_content.return_value = [b'test data']
-    mock_requests_get.return_value = mock_response
-    mock_getsize.return_value = file_size
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested_urls.append(str(request.url))
+        return httpx.Response(200, content=b"test data")
 
-    download_file_to_server(file_url=file_url, file_id=file_id, file_path=file_path)
+    with patch.object(worker_loop, "downloader", _create_test_downloader(handler)):
+        download_file_to_server(file_url=file_url, file_id=file_id, file_path=str(file_path))
 
-    mock_requests_get.assert_called_once_with(file_url, stream=True)
-    mock_open_file.assert_called_once_with(file_path, 'wb')
-    mock_getsize.assert_called_once_with(file_path)
-    mock_update_file_size.assert_called_once_with(
-        mock_get_db_session_for_task.return_value, file_id, file_size
-    )
+    assert requested_urls == [file_url]
+    assert file_path.read_bytes() == b"test data"
+    mock_store_downloaded_file.assert_awaited_once()
+    stored_file_id, stored_path, stored_state = mock_store_downloaded_file.await_args.args
+    assert (stored_file_id, stored_path) == (file_id, str(file_path))
+    assert stored_state.downloaded_bytes == len(b"test data")
+    assert stored_state.sha256 == hashlib.sha256(b"test data").hexdigest()
+    mock_mark_download_failed.assert_not_awaited()
+    assert mock_progress_store.update.await_args.kwargs == {
+        "status": FileStatus.COMPLETED,
+        "bytes_received": len(b"test data"),
+        "total_bytes": len(b"test data"),
+    }
 
 
-@patch("src.worker.requests.get")
-@patch("src.worker._get_db_session_for_task")
-@patch("src.worker._delete_nonexistent_file_from_db")
+@patch("src.worker._save_download_checkpoint")
+@patch("src.worker._get_download_state", return_value=DownloadState())
+@patch("src.worker._mark_download_failed")
+@patch("src.worker._store_downloaded_file")
 def test_download_file_not_found(
-        mock_delete_nonexistent_file_from_db,
-        mock_get_db_session_for_task,
-        mock_requests_get
+        mock_store_downloaded_file,
+        mock_mark_download_failed,
+        mock_get_download_state,
+        mock_save_download_checkpoint,
+        tmp_path: Path
 ):
     file_url = "https://example.com/nonexistent-file.txt"
     file_id = "1234"
-    file_path = "/some_way/uploads/nonexistent-file.txt"
+    file_path = tmp_path / "nonexistent-file.txt"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(404)
+
+    with patch.object(worker_loop, "downloader", _create_test_downloader(handler)):
+        download_file_to_server(file_url=file_url, file_id=file_id, file_path=str(file_path))
+
+    mock_mark_download_failed.assert_awaited_once_with(file_id, str(file_path))
+    mock_store_downloaded_file.assert_not_awaited()
+    assert not file_path.exists()
+
+
+@patch("src.worker._get_download_state", return_value=None)
+@patch("src.worker._store_downloaded_file")
+def test_download_skipped_when_file_was_deleted(
+        mock_store_downloaded_file,
+        mock_get_download_state,
+        tmp_path: Path
+):
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise AssertionError("Source must not be requested")
+
+    with patch.object(worker_loop, "downloader", _create_test_downloader(handler)):
+        download_file_to_server(
+            file_url="https://example.com/file.txt",
+            file_id="1234",
+            file_path=str(tmp_path / "file.txt")
+        )
+
+    mock_store_downloaded_file.assert_not_awaited()
+
+
+@patch("src.worker._save_download_checkpoint")
+@patch("src.worker._store_downloaded_file")
+def test_download_resumes_from_checkpoint(
+        mock_store_downloaded_file,
+        mock_save_download_checkpoint,
+        tmp_path: Path
+):
+    content: bytes = b"0123456789abcdef"
+    file_path = tmp_path / "file.txt"
+    file_path.write_bytes(content[:6] + b"garbage")
+    requests: list[httpx.Request] = []
+
+    with patch("src.worker._get_download_state",
+               return_value=DownloadState(downloaded_bytes=6, etag='"v1"')), \
+            patch.object(worker_loop, "downloader",
+                         _create_test_downloader(_range_handler(content, '"v1"', requests))):
+        download_file_to_server(
+            file_url="https://example.com/file.txt", file_id="1234", file_path=str(file_path)
+        )
+
+    assert len(requests) == 1
+    assert requests[0].headers["Range"] == "bytes=6-"
+    assert requests[0].headers["If-Range"] == '"v1"'
+    assert file_path.read_bytes() == content
+    stored_state: DownloadState = mock_store_downloaded_file.await_args.args[2]
+    assert stored_state.downloaded_bytes == len(content)
+    assert stored_state.sha256 is None
+
+
+@patch("src.worker._save_download_checkpoint")
+@patch("src.worker._store_downloaded_file")
+def test_download_restarts_when_validator_changed(
+        mock_store_downloaded_file,
+        mock_save_download_checkpoint,
+        tmp_path: Path
+):
+    content: bytes = b"new content of the file"
+    file_path = tmp_path / "file.txt"
+    file_path.write_bytes(b"old content")
+    requests: list[httpx.Request] = []
+
+    with patch("src.worker._get_download_state",
+               return_value=DownloadState(downloaded_bytes=11, etag='"v1"')), \
+            patch.object(worker_loop, "downloader",
+                         _create_test_downloader(_range_handler(content, '"v2"', requests))):
+        download_file_to_server(
+            file_url="https://example.com/file.txt", file_id="1234", file_path=str(file_path)
+        )
+
+    assert file_path.read_bytes() == content
+    stored_state: DownloadState = mock_store_downloaded_file.await_args.args[2]
+    assert stored_state.downloaded_bytes == len(content)
+    assert stored_state.sha256 == hashlib.sha256(content).hexdigest()
+    saved_state: DownloadState = mock_save_download_checkpoint.await_args.args[1]
+    assert saved_state.etag == '"v2"'
+
+
+def test_checkpoint_is_saved_when_connection_drops(tmp_path: Path):
+    file_path = tmp_path / "file.txt"
+    checkpoints: list[int] = []
+
+    class DroppingStream(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            yield b"01234567"
+            raise httpx.ReadError("connection dropped")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, stream=DroppingStream(), headers={"ETag": '"v1"'})
+
+    async def on_checkpoint(state: DownloadState) -> None:
+        checkpoints.append(state.downloaded_bytes)
 
-    mock_response = MagicMock()
-    mock_response.raise_for_status.side_effect = HTTPError("File not found")
-    mock_requests_get.return_value = mock_response
+    async def download() -> None:
+        await _create_test_downloader(handler).download(
+            file_url="https://example.com/file.txt",
+            file_path=str(file_path),
+            on_checkpoint=on_checkpoint,
+        )
 
-    download_file_to_server(file_url=file_url, file_id=file_id, file_path=file_path)
+    try:
+        worker_loop.run(download())
+    except httpx.ReadError:
+        pass
+    else:
+        raise AssertionError("ReadError must be propagated for the task to be retried")
 
-    mock_requests_get.assert_called_once_with(file_url, stream=True)
-    mock_delete_nonexistent_file_from_db.assert_called_once_with(
-        mock_get_db_session_for_task.return_value, file_id
+    assert checkpoints[-1] == 8
+    assert file_path.read_bytes() == b"01234567"
+
+
+@patch("src.worker._save_download_checkpoint")
+@patch("src.worker._get_download_state", return_value=DownloadState())
+@patch("src.worker._store_downloaded_file")
+def test_downloads_run_concurrently_in_one_process(
+        mock_store_downloaded_file,
+        mock_get_download_state,
+        mock_save_download_checkpoint,
+        tmp_path: Path
+):
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+        return httpx.Response(200, content=b"data")
+
+    async def download_many() -> None:
+        await asyncio.gather(*(
+            _download_file_to_server(
+                f"https://example.com/{number}.txt", str(number), str(tmp_path / f"{number}.txt")
+            )
+            for number in range(8)
+        ))
+
+    with patch.object(worker_loop, "downloader", _create_test_downloader(handler)):
+        worker_loop.run(download_many())
+
+    assert max_in_flight == 4
+    assert mock_store_downloaded_file.await_count == 8
+
+
+def test_large_file_is_downloaded_in_segments(tmp_path: Path):
+    content: bytes = bytes(range(256)) * 4
+    file_path = tmp_path / "file.bin"
+    requested_ranges: list[str] = []
+    failed_once: set[str] = set()
+
+    class DroppingStream(httpx.AsyncByteStream):
+        def __init__(self, data: bytes) -> None:
+            self.data = data
+
+        async def __aiter__(self):
+            yield self.data[:10]
+            raise httpx.ReadError("connection dropped")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        headers: dict[str, str] = {"Accept-Ranges": "bytes", "ETag": '"v1"'}
+        if request.method == "HEAD":
+            return httpx.Response(200, headers={**headers, "Content-Length": str(len(content))})
+
+        range_header: str = request.headers["Range"]
+        requested_ranges.append(range_header)
+        start, end = (int(value) for value in range_header.removeprefix("bytes=").split("-"))
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+        if start == 256 and range_header not in failed_once:
+            failed_once.add(range_header)
+            return httpx.Response(206, headers=headers, stream=DroppingStream(content[start:end + 1]))
+        return httpx.Response(206, headers=headers, content=content[start:end + 1])
+
+    downloader: Downloader = _create_test_downloader(
+        handler, segments=4, segment_threshold=512, segment_retries=2
+    )
+    state: DownloadState = worker_loop.run(
+        downloader.download(file_url="https://example.com/file.bin", file_path=str(file_path))
+    )
+
+    assert state.downloaded_bytes == len(content)
+    assert state.etag == '"v1"'
+    assert file_path.read_bytes() == content
+    assert sorted(requested_ranges) == sorted([
+        "bytes=0-255", "bytes=256-511", "bytes=264-511", "bytes=512-767", "bytes=768-1023"
+    ])
+
+
+def test_segmented_download_falls_back_when_ranges_are_ignored(tmp_path: Path):
+    content: bytes = b"x" * 1024
+    file_path = tmp_path / "file.bin"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        headers: dict[str, str] = {"Accept-Ranges": "bytes", "Content-Length": str(len(content))}
+        if request.method == "HEAD":
+            return httpx.Response(200, headers=headers)
+        return httpx.Response(200, content=content)
+
+    downloader: Downloader = _create_test_downloader(handler, segments=4, segment_threshold=512)
+    state: DownloadState = worker_loop.run(
+        downloader.download(file_url="https://example.com/file.bin", file_path=str(file_path))
+    )
+
+    assert state.downloaded_bytes == len(content)
+    assert file_path.read_bytes() == content
+
+
+
+def test_progress_reporter_throttles_updates():
+    store = AsyncMock()
+    reporter: ProgressReporter = ProgressReporter(store=store, file_id="1234", interval=60)
+
+    async def report() -> None:
+        await reporter.start(bytes_received=0)
+        for bytes_received in range(0, 1024, 4):
+            await reporter.update(bytes_received=bytes_received, total_bytes=1024)
+        await reporter.finish(status=FileStatus.COMPLETED, bytes_received=1024)
+
+    worker_loop.run(report())
+
+    assert [call.kwargs["status"] for call in store.update.await_args_list] == [
+        FileStatus.DOWNLOADING, FileStatus.COMPLETED
+    ]
+    assert store.update.await_args.kwargs["bytes_received"] == 1024
+
+
+@patch("src.worker._mark_download_failed")
+def test_expired_upload_sessions_are_reaped(mock_mark_download_failed):
+    session: UploadSession = UploadSession(
+        file_id="1234", user_id="5678", file_path="/uploads/5678/file.bin", size=10, offset=4
     )
 
+    with patch("src.worker.upload_session_store") as mock_upload_session_store:
+        mock_upload_session_store.get_expired = AsyncMock(return_value=[session])
+        mock_upload_session_store.delete = AsyncMock()
+        reap_upload_sessions()
+
+    mock_mark_download_failed.assert_awaited_once_with("1234", "/uploads/5678/file.bin")
+    mock_upload_session_store.delete.assert_awaited_once_with("1234")